@@ -0,0 +1,68 @@
+# cost of sending one emit to every session of a room, once through broadcast
+# and once as a separate emit per session. run with
+# `python benchmarks/bench_broadcast.py`
+import asyncio
+from dataclasses import dataclass
+import time
+from uuid import UUID, uuid4
+
+from tsocket.server import Server, emit
+from tsocket.shared import ProtocolVersion, Session
+
+ROUNDS = 200
+
+
+@dataclass
+class Move:
+    room: UUID
+    players: list[UUID]
+
+
+@dataclass
+class RoomServer(Server):
+    @emit
+    async def on_room_move(self, _session: Session, args: Move) -> None:
+        raise NotImplementedError()
+
+
+class NullWriter:
+    def writelines(self, _data):
+        pass
+
+    async def drain(self):
+        pass
+
+
+async def run(size: int):
+    server = RoomServer()
+    sessions = []
+    for _ in range(size):
+        session = Session(uuid4(), None, NullWriter())
+        session.upgrade(ProtocolVersion.V2, False, [*server.emits], 0)
+        sessions.append(session)
+    move = Move(uuid4(), [uuid4() for _ in range(8)])
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await server.broadcast("on_room_move", sessions, move)
+    broadcast = (time.perf_counter() - start) / ROUNDS
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for session in sessions:
+            await server.on_room_move(session, move)
+    each = (time.perf_counter() - start) / ROUNDS
+
+    print(
+        f"{size:4} sessions broadcast {broadcast * 1e6:8.1f}us "
+        f"emit each {each * 1e6:8.1f}us"
+    )
+
+
+def main():
+    for size in [2, 8, 32, 128, 512]:
+        asyncio.run(run(size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# bytes per frame for each wire version, then messages per second through
+# Channel.write and how many writer calls each one takes, against the eight
+# write() calls per message it replaced. run with
+# `python benchmarks/bench_frames.py`
+import asyncio
+import time
+from uuid import uuid4
+
+from tsocket.shared import (
+    PROTOCOL_NAME,
+    PROTOCOL_VER,
+    Message,
+    MessageFlag,
+    Session,
+    encode_frame,
+    encode_frame_v2,
+)
+
+MESSAGES = 200000
+CONTENT = b"x" * 64
+
+
+class CountingWriter:
+    def __init__(self, writer: asyncio.StreamWriter | None = None):
+        self.writer = writer
+        self.calls = 0
+
+    def write(self, data: bytes):
+        self.calls += 1
+        if self.writer is not None:
+            self.writer.write(data)
+
+    def writelines(self, data: list[bytes]):
+        self.calls += 1
+        if self.writer is not None:
+            self.writer.writelines(data)
+
+    async def drain(self):
+        if self.writer is not None:
+            await self.writer.drain()
+
+
+async def write_inline(session: Session, channel_id, msg: Message):
+    # Channel.write before frames were encoded in one piece
+    writer = session.writer
+    msg_method_bytes = msg.method.encode()
+    writer.write(PROTOCOL_NAME)
+    writer.write(PROTOCOL_VER)
+    writer.write(channel_id.bytes)
+    writer.write(msg.flag.to_bytes(8))
+    writer.write(len(msg_method_bytes).to_bytes(8))
+    writer.write(len(msg.content).to_bytes(8))
+    writer.write(msg_method_bytes)
+    writer.write(msg.content)
+    await writer.drain()
+
+
+async def run(label: str, writer: CountingWriter):
+    session = Session(uuid4(), None, writer)
+    msg = Message("player_get", CONTENT, MessageFlag.NONE)
+    results = {}
+    with session.create_channel() as channel:
+        for name, write in [
+            ("inline", lambda: write_inline(session, channel.id, msg)),
+            ("channel", lambda: channel.write(msg)),
+        ]:
+            writer.calls = 0
+            start = time.perf_counter()
+            for _ in range(MESSAGES):
+                await write()
+            results[name] = (time.perf_counter() - start, writer.calls)
+    for name, (seconds, calls) in results.items():
+        print(
+            f"{label:8} {name:8} {MESSAGES / seconds:10.0f} msgs/s "
+            f"{calls / MESSAGES:4.1f} writes/msg"
+        )
+
+
+async def main_async():
+    await run("memory", CountingWriter())
+
+    # the same over a localhost socket to a reader that throws it away
+    discarded = asyncio.Event()
+
+    async def discard(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while await reader.read(1 << 16):
+            pass
+        writer.close()
+        discarded.set()
+
+    server = await asyncio.start_server(discard, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    await run("socket", CountingWriter(writer))
+    writer.close()
+    await writer.wait_closed()
+    await discarded.wait()
+    server.close()
+    await server.wait_closed()
+
+
+def bandwidth():
+    # a request, its response and a window grant as a game sends them
+    msgs = [
+        ("request", Message("shot_submit", b"x" * 60, MessageFlag.END)),
+        ("response", Message("", b"x" * 120, MessageFlag.RESPONSE | MessageFlag.END)),
+        ("window", Message("", (16).to_bytes(1), MessageFlag.WINDOW)),
+    ]
+    for label, msg in msgs:
+        v1 = len(b"".join(encode_frame(uuid4(), msg)))
+        v2 = len(b"".join(encode_frame_v2(5, msg, {})))
+        interned = len(b"".join(encode_frame_v2(5, msg, {"shot_submit": 7})))
+        print(
+            f"{label:8} v1 {v1:4}B v2 {v2:4}B ({v2 / v1:.0%}) "
+            f"v2 interned {interned:4}B ({interned / v1:.0%})"
+        )
+
+
+def main():
+    bandwidth()
+    asyncio.run(main_async())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# latency of fast calls on one connection while slow calls share it. run with
+# `python benchmarks/bench_latency.py`
+import asyncio
+from dataclasses import dataclass
+import statistics
+import time
+
+from tsocket.client import Client, Route as ClientRoute
+from tsocket.server import Route, Server
+from tsocket.shared import Session
+
+FAST_CALLS = 2000
+SLOW_DELAY = 0.05
+
+
+@dataclass
+class SleepServer(Server):
+    @Route.simple
+    async def sleep(self, _session: Session, args: float) -> float:
+        if args:
+            await asyncio.sleep(args)
+        return args
+
+
+@dataclass
+class SleepClient(Client):
+    @ClientRoute.simple
+    async def sleep(self, args: float) -> float:
+        raise NotImplementedError()
+
+
+async def fast_latencies(client: SleepClient, concurrency: int) -> list[float]:
+    latencies = []
+
+    async def worker(calls: int):
+        for _ in range(calls):
+            start = time.perf_counter()
+            await client.sleep(0)
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(
+        *(worker(FAST_CALLS // concurrency) for _ in range(concurrency))
+    )
+    return latencies
+
+
+async def slow_load(client: SleepClient, concurrency: int, stop: asyncio.Event):
+    async def worker():
+        while not stop.is_set():
+            await client.sleep(SLOW_DELAY)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+def report(label: str, latencies: list[float]):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{label:24} p50 {p50 * 1e6:8.1f}us p99 {p99 * 1e6:8.1f}us")
+
+
+async def run(buffered: bool):
+    server = SleepServer()
+    listener = await server.listen("127.0.0.1", 0, None, buffered=buffered)
+    port = listener.sockets[0].getsockname()[1]
+    serve_task = asyncio.create_task(server.serve(listener))
+    client = SleepClient()
+    await client.connect("127.0.0.1", port, buffered=buffered)
+    try:
+        report(
+            f"fast only{' buffered' if buffered else ''}",
+            await fast_latencies(client, 8),
+        )
+        for slow in [4, 12]:
+            stop = asyncio.Event()
+            load = asyncio.create_task(slow_load(client, slow, stop))
+            await asyncio.sleep(SLOW_DELAY)
+            latencies = await fast_latencies(client, 8)
+            stop.set()
+            await load
+            report(f"with {slow} slow{' buffered' if buffered else ''}", latencies)
+    finally:
+        await client.disconnect()
+        serve_task.cancel()
+
+
+def main():
+    for buffered in [False, True]:
+        asyncio.run(run(buffered))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# frames per second from a socket into the session, parsed in place by
+# FrameProtocol against Session.read pulling each field off a StreamReader.
+# run with `python benchmarks/bench_reader.py`
+import asyncio
+import time
+from uuid import uuid4
+
+from tsocket.shared import Message, MessageFlag, Session, encode_frame_v2
+from tsocket.transport import FrameProtocol
+
+FRAMES = 100000
+CONTENT_SIZES = [16, 256, 4096]
+
+
+def frames(content_size: int) -> bytes:
+    content = b"x" * content_size
+    return b"".join(
+        b"".join(
+            encode_frame_v2(
+                2 * index + 1, Message("echo", content, MessageFlag.END), {}
+            )
+        )
+        for index in range(FRAMES)
+    )
+
+
+async def consume(session: Session, done: asyncio.Future[float]):
+    for _ in range(FRAMES):
+        channel, _ = await session.read()
+        await channel.queue.get()
+        session.destroy_channel(channel)
+    done.set_result(time.perf_counter())
+
+
+async def send(port: int, data: bytes) -> float:
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    start = time.perf_counter()
+    writer.write(data)
+    await writer.drain()
+    writer.close()
+    return start
+
+
+async def run_streams(data: bytes) -> float:
+    done = asyncio.get_running_loop().create_future()
+
+    async def accept(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await consume(Session(uuid4(), reader, writer), done)
+
+    server = await asyncio.start_server(accept, "127.0.0.1", 0)
+    start = await send(server.sockets[0].getsockname()[1], data)
+    end = await done
+    server.close()
+    return end - start
+
+
+async def run_protocol(data: bytes) -> float:
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    def on_session(session: Session):
+        loop.create_task(consume(session, done))
+
+    server = await loop.create_server(lambda: FrameProtocol(on_session), "127.0.0.1", 0)
+    start = await send(server.sockets[0].getsockname()[1], data)
+    end = await done
+    server.close()
+    return end - start
+
+
+async def main():
+    for content_size in CONTENT_SIZES:
+        data = frames(content_size)
+        for label, run in [
+            ("StreamReader", run_streams),
+            ("FrameProtocol", run_protocol),
+        ]:
+            elapsed = await run(data)
+            print(
+                f"{label:>13} {content_size:>5}B: {FRAMES / elapsed:>10.0f} frames/s"
+                f" {len(data) / elapsed / 1e6:>8.1f} MB/s"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+# items per second through streaming routes for several channel windows, the
+# window bounds how much a slow reader can have queued. run with
+# `python benchmarks/bench_stream.py`
+import asyncio
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+import time
+
+from tsocket.client import Client, Route as ClientRoute
+from tsocket.server import Route, Server
+from tsocket.shared import Session
+
+ITEMS = 20000
+
+
+@dataclass
+class StreamServer(Server):
+    @Route.stream_in
+    async def total(self, _session: Session, args: AsyncIterator[int]) -> int:
+        return sum([value async for value in args])
+
+    @Route.stream_out
+    async def count(self, _session: Session, args: int) -> AsyncIterator[int]:
+        for value in range(args):
+            yield value
+
+
+@dataclass
+class StreamClient(Client):
+    @ClientRoute.stream_in
+    async def total(self, args: AsyncIterator[int]) -> int:
+        raise NotImplementedError()
+
+    @ClientRoute.stream_out
+    async def count(self, args: int) -> AsyncIterator[int]:
+        raise NotImplementedError()
+        yield  # pylint: disable=W0101
+
+
+async def numbers(count: int) -> AsyncIterator[int]:
+    for value in range(count):
+        yield value
+
+
+async def run(window: int):
+    server = StreamServer(channel_window=window)
+    listener = await server.listen("127.0.0.1", 0, None)
+    port = listener.sockets[0].getsockname()[1]
+    serve_task = asyncio.create_task(server.serve(listener))
+    client = StreamClient()
+    await client.connect("127.0.0.1", port, window=window)
+    try:
+        start = time.perf_counter()
+        await client.total(numbers(ITEMS))
+        stream_in = time.perf_counter() - start
+        start = time.perf_counter()
+        async for _ in client.count(ITEMS):
+            pass
+        stream_out = time.perf_counter() - start
+        print(
+            f"window {window:4} stream_in {ITEMS / stream_in:9.0f} items/s "
+            f"stream_out {ITEMS / stream_out:9.0f} items/s"
+        )
+    finally:
+        await client.disconnect()
+        serve_task.cancel()
+
+
+def main():
+    for window in [2, 8, 32, 128]:
+        asyncio.run(run(window))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterable
+import contextlib
+from dataclasses import dataclass, field
+from uuid import UUID, uuid4
+
+from tsocket.client import Client, Route as ClientRoute, subscribe
+from tsocket.server import Route, Server, emit
+from tsocket.shared import Session
+
+
+@dataclass
+class Payload:
+    id: UUID  # pylint: disable=C0103
+    name: str
+    values: list[int] = field(default_factory=list)
+
+
+@dataclass
+class EchoServer(Server):
+    @Route.simple
+    async def echo(self, _session: Session, args: Payload) -> Payload:
+        return args
+
+    @Route.simple
+    async def sleep(self, _session: Session, args: float) -> float:
+        await asyncio.sleep(args)
+        return args
+
+    @Route.stream_in
+    async def total(self, _session: Session, args: AsyncIterator[int]) -> int:
+        return sum([value async for value in args])
+
+    @Route.stream_out
+    async def count(self, _session: Session, args: int) -> AsyncIterator[int]:
+        for value in range(args):
+            yield value
+
+    @emit
+    async def on_tick(self, _session: Session, args: Payload) -> None:
+        raise NotImplementedError()
+
+
+@dataclass
+class EchoClient(Client):
+    @ClientRoute.simple
+    async def echo(self, args: Payload) -> Payload:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def sleep(self, args: float) -> float:
+        raise NotImplementedError()
+
+    @ClientRoute.stream_in
+    async def total(self, args: AsyncIterator[int]) -> int:
+        raise NotImplementedError()
+
+    @ClientRoute.stream_out
+    async def count(self, args: int) -> AsyncIterator[int]:
+        raise NotImplementedError()
+        yield  # pylint: disable=W0101
+
+    @subscribe
+    async def on_tick(self) -> AsyncIterator[Payload]:
+        raise NotImplementedError()
+        yield  # pylint: disable=W0101
+
+
+@contextlib.asynccontextmanager
+async def serving(server: Server, buffered: bool = False) -> AsyncIterator[int]:
+    # serves on a free localhost port for the length of the block
+    listener = await server.listen("127.0.0.1", 0, None, buffered=buffered)
+    port = listener.sockets[0].getsockname()[1]
+    task = asyncio.create_task(server.serve(listener))
+    try:
+        yield port
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+def server_session(server: Server) -> Session:
+    (session,) = server.sessions.values()
+    return session
+
+
+@dataclass
+class RecordingWriter:
+    # stands in for a StreamWriter, keeping every call made on it
+    calls: list[list[bytes]] = field(default_factory=list)
+
+    def write(self, data: bytes):
+        self.calls.append([bytes(data)])
+
+    def writelines(self, data: Iterable[bytes]):
+        self.calls.append([bytes(part) for part in data])
+
+    async def drain(self):
+        pass
+
+    def data(self) -> bytes:
+        return b"".join(part for call in self.calls for part in call)
+
+
+def recording_session() -> tuple[Session, RecordingWriter]:
+    writer = RecordingWriter()
+    return Session(uuid4(), None, writer), writer
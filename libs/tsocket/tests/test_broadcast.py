@@ -0,0 +1,103 @@
+import asyncio
+from dataclasses import dataclass, field
+from uuid import uuid4
+
+from tsocket.codec import DEFAULT_CODEC
+from tsocket.server import BroadcastStream
+from tsocket.shared import ProtocolVersion, Session, decode_frame
+
+from support import (
+    EchoClient,
+    EchoServer,
+    Payload,
+    RecordingWriter,
+    recording_session,
+    serving,
+)
+
+
+def upgraded_session(server: EchoServer, version: ProtocolVersion):
+    session, writer = recording_session()
+    if version > ProtocolVersion.V1:
+        session.upgrade(version, False, [*server.routes, *server.emits], 0)
+    return session, writer
+
+
+async def test_broadcast_encodes_once_per_wire_format():
+    server = EchoServer()
+    emit = server.emits["on_tick"]
+    calls = 0
+    dumps = emit.dumps[DEFAULT_CODEC]
+
+    def counting_dumps(args):
+        nonlocal calls
+        calls += 1
+        return dumps(args)
+
+    emit.dumps = {**emit.dumps, DEFAULT_CODEC: counting_dumps}
+    try:
+        sessions = [upgraded_session(server, ProtocolVersion.V2) for _ in range(50)]
+        sessions += [upgraded_session(server, ProtocolVersion.V1) for _ in range(50)]
+        payload = Payload(uuid4(), "tick", [1])
+        await server.broadcast("on_tick", [session for session, _ in sessions], payload)
+    finally:
+        emit.dumps = {**emit.dumps, DEFAULT_CODEC: dumps}
+    assert calls == 1
+    # every session of a wire format is handed the very same buffers
+    v2_frames = {id(writer.calls[0][0]) for _, writer in sessions[:50]}
+    v1_frames = {id(writer.calls[0][0]) for _, writer in sessions[50:]}
+    assert len(v2_frames) == len(v1_frames) == 1
+    for session, writer in sessions:
+        frame = decode_frame(memoryview(writer.data()), session.protocol.methods)
+        assert frame[4] == "on_tick"
+
+
+async def test_broadcast_reaches_clients():
+    server = EchoServer()
+    async with serving(server) as port:
+        clients = [EchoClient() for _ in range(3)]
+        for client in clients:
+            await client.connect("127.0.0.1", port)
+        payload = Payload(uuid4(), "tick", [2])
+        await server.broadcast("on_tick", server.sessions.values(), payload)
+        for client in clients:
+            assert await asyncio.wait_for(anext(client.on_tick()), 1) == payload
+            await client.disconnect()
+
+
+@dataclass
+class StalledWriter(RecordingWriter):
+    # takes writes but never finishes draining them
+    stalled: asyncio.Event = field(default_factory=asyncio.Event)
+
+    async def drain(self):
+        await self.stalled.wait()
+
+
+async def test_stream_drops_subscribers_that_fall_behind():
+    server = EchoServer()
+    stream = BroadcastStream(max_pending=4)
+    fast, fast_writer = upgraded_session(server, ProtocolVersion.V2)
+    slow_writer = StalledWriter()
+    slow = Session(uuid4(), None, slow_writer)
+    dropped: list[Session] = []
+    stream.subscribe(fast, dropped.append)
+    stream.subscribe(slow, dropped.append)
+    await asyncio.sleep(0)
+
+    for value in range(10):
+        # publishing never waits, whatever the subscribers are doing
+        stream.publish(
+            server.broadcast_encoder("on_tick", Payload(uuid4(), "", [value]))
+        )
+        await asyncio.sleep(0)
+    assert dropped == [slow]
+    assert slow not in stream and fast in stream
+    assert len(fast_writer.calls) == 10
+    # the slow one took its first frame before stalling, the rest were dropped
+    assert len(slow_writer.calls) == 1
+
+    stream.publish(server.broadcast_encoder("on_tick", Payload(uuid4(), "", [])))
+    stream.close()
+    await asyncio.gather(*stream.closing_tasks)
+    assert len(fast_writer.calls) == 11
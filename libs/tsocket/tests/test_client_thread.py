@@ -0,0 +1,68 @@
+import asyncio
+from concurrent.futures import Future
+from dataclasses import dataclass
+from uuid import uuid4
+
+import pytest
+
+from tsocket.client_thread import ClientThread, Route as ThreadRoute
+from tsocket.server import Route, Server
+from tsocket.shared import ResponseError, Session
+
+from support import EchoClient, EchoServer, Payload, serving
+
+
+@dataclass
+class RedirectServer(Server):
+    # sends every echo on to another server, or refuses it without one
+    target: bytes = b""
+
+    @Route.simple
+    async def echo(self, _session: Session, args: Payload) -> Payload:
+        if not self.target:
+            raise ResponseError("not_found", b"")
+        raise ResponseError("redirect", self.target)
+
+
+@dataclass
+class EchoClientThread(ClientThread):
+    @ThreadRoute.simple
+    def echo(self, args: Payload) -> Future[Payload]:
+        raise NotImplementedError()
+
+
+async def test_client_follows_redirect():
+    async with serving(EchoServer()) as target_port:
+        redirect = RedirectServer(f":{target_port}".encode())
+        async with serving(redirect) as port:
+            client = EchoClient()
+            await client.connect("127.0.0.1", port)
+            payload = Payload(uuid4(), "redirected")
+            assert await client.echo(payload) == payload
+            # later calls go straight to the new server
+            assert await client.echo(payload) == payload
+            assert not redirect.sessions
+            await client.disconnect()
+
+
+async def test_client_thread_follows_redirect():
+    async with serving(EchoServer()) as target_port:
+        redirect = RedirectServer(f":{target_port}".encode())
+        async with serving(redirect) as port:
+            client = EchoClientThread()
+            client.connect("127.0.0.1", port)
+            payload = Payload(uuid4(), "redirected")
+            assert await asyncio.wrap_future(client.echo(payload)) == payload
+            assert await asyncio.wrap_future(client.echo(payload)) == payload
+            assert not redirect.sessions
+            await asyncio.to_thread(client.disconnect)
+
+
+async def test_client_thread_passes_other_errors_on():
+    async with serving(RedirectServer()) as port:
+        client = EchoClientThread()
+        client.connect("127.0.0.1", port)
+        with pytest.raises(ResponseError) as err:
+            await asyncio.wrap_future(client.echo(Payload(uuid4(), "missing")))
+        assert err.value.method == "not_found"
+        await asyncio.to_thread(client.disconnect)
@@ -0,0 +1,81 @@
+from dataclasses import dataclass
+from uuid import uuid4
+
+import pytest
+
+from tsocket.codec import CODECS, DEFAULT_CODEC, make_dumps, make_loads, negotiate
+
+from support import EchoClient, EchoServer, Payload, server_session, serving
+
+
+def test_negotiate_takes_first_offer_both_accept():
+    assert negotiate(["msgpack", "cbor2"], ["cbor2", "msgpack"]) == "msgpack"
+    assert negotiate(["orjson", "cbor2"], ["cbor2"]) == "cbor2"
+    assert negotiate([], ["msgpack"]) == DEFAULT_CODEC
+    assert negotiate(["missing"], ["missing"]) == DEFAULT_CODEC
+
+
+@pytest.mark.parametrize("name", [*CODECS])
+def test_roundtrip_from_memoryview(name: str):
+    payload = Payload(uuid4(), "board", [1, 2, 3])
+    data = make_dumps(Payload)[name](payload)
+    framed = bytearray(b"head" + data + b"tail")
+    view = memoryview(framed)[4 : 4 + len(data)]
+    assert make_loads(Payload)[name](view) == payload
+
+
+def test_unknown_codec_is_refused():
+    with pytest.raises(ValueError):
+        EchoServer(codecs=["missing"])
+
+
+async def test_sessions_use_cbor2_unless_both_ends_opt_in():
+    # every backend installed here must not change what a session picks
+    server = EchoServer()
+    async with serving(server) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        payload = Payload(uuid4(), "x", [7])
+        assert await client.echo(payload) == payload
+        assert client.session.session.protocol.codec == DEFAULT_CODEC
+        assert server_session(server).protocol.codec == DEFAULT_CODEC
+        await client.disconnect()
+
+
+@pytest.mark.parametrize("name", [name for name in CODECS if name != DEFAULT_CODEC])
+async def test_opt_in_codec_is_negotiated(name: str):
+    server = EchoServer(codecs=[name, DEFAULT_CODEC])
+    async with serving(server) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port, codecs=[name, DEFAULT_CODEC])
+        payload = Payload(uuid4(), "x", [7])
+        assert await client.echo(payload) == payload
+        assert client.session.session.protocol.codec == name
+        assert server_session(server).protocol.codec == name
+        await client.disconnect()
+
+        # a client that did not opt in stays on cbor2
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        assert await client.echo(payload) == payload
+        assert client.session.session.protocol.codec == DEFAULT_CODEC
+        await client.disconnect()
+
+
+@dataclass
+class Tagged(Payload):
+    tag: str = "sub"
+
+
+@pytest.mark.parametrize("name", [*CODECS])
+def test_prebuilt_functions_match_full_dispatch(name: str):
+    codec = CODECS[name]
+    dumps = make_dumps(Payload)[name]
+    loads = make_loads(Payload)[name]
+    payload = Payload(uuid4(), "exact", [1])
+    assert dumps(payload) == codec.dumps(payload)
+    assert loads(dumps(payload)) == codec.loads(codec.dumps(payload), Payload)
+    # a subclass sent where its base is declared keeps its own fields
+    tagged = Tagged(uuid4(), "sub", [2], "extra")
+    assert dumps(tagged) == codec.dumps(tagged)
+    assert loads(dumps(tagged)) == Payload(tagged.id, "sub", [2])
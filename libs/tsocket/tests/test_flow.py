@@ -0,0 +1,116 @@
+import asyncio
+from collections.abc import AsyncIterator
+import contextlib
+from uuid import uuid4
+
+import pytest
+
+from tsocket.shared import (
+    Message,
+    MessageFlag,
+    ProtocolError,
+    ProtocolVersion,
+    decode_frame,
+    encode_frame_v2,
+)
+
+from support import EchoClient, EchoServer, recording_session, serving
+
+
+def windowed_session(window: int):
+    session, writer = recording_session()
+    session.upgrade(ProtocolVersion.V2, True, [], window)
+    return session, writer
+
+
+def sent(writer) -> list[tuple[MessageFlag, bytes]]:
+    frames = []
+    for call in writer.calls:
+        _, _, _, flag, _, content = decode_frame(memoryview(b"".join(call)), [])
+        frames.append((flag, bytes(content)))
+    return frames
+
+
+async def test_reader_grants_credit_every_half_window():
+    session, writer = windowed_session(4)
+    with session.create_channel() as channel:
+        for _ in range(4):
+            session.receive(None, channel.index, MessageFlag.NONE, "", b"x")
+        for _ in range(3):
+            await channel.read()
+        session.receive(None, channel.index, MessageFlag.END, "", b"x")
+        for _ in range(2):
+            await channel.read()
+    grants = [
+        int.from_bytes(content)
+        for flag, content in sent(writer)
+        if MessageFlag.WINDOW in flag
+    ]
+    # the end of the stream needs no credit back
+    assert grants == [2, 2]
+
+
+async def test_writer_waits_for_credit():
+    session, writer = windowed_session(2)
+    with session.create_channel() as channel:
+        await channel.write(Message("", b"1", MessageFlag.NONE))
+        await channel.write(Message("", b"2", MessageFlag.NONE))
+        blocked = asyncio.create_task(
+            channel.write(Message("", b"3", MessageFlag.NONE))
+        )
+        await asyncio.sleep(0.01)
+        assert not blocked.done() and len(writer.calls) == 2
+        # window grants themselves never wait
+        await channel.write(Message("", (1).to_bytes(4), MessageFlag.WINDOW))
+        session.receive(None, channel.index, MessageFlag.WINDOW, "", (1).to_bytes(4))
+        await asyncio.wait_for(blocked, 1)
+        assert [content for _, content in sent(writer)][-1] == b"3"
+
+
+async def test_overflowing_the_window_is_a_protocol_error():
+    session, _ = windowed_session(3)
+    with session.create_channel() as channel:
+        for _ in range(3):
+            session.receive(None, channel.index, MessageFlag.NONE, "", b"x")
+        with pytest.raises(ProtocolError):
+            session.receive(None, channel.index, MessageFlag.NONE, "", b"x")
+        assert channel.queue.qsize() == 3
+
+
+async def numbers(count: int) -> AsyncIterator[int]:
+    for value in range(count):
+        yield value
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+async def test_streams_finish_under_a_small_window(buffered: bool):
+    async with serving(EchoServer(channel_window=2), buffered=buffered) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port, window=2, buffered=buffered)
+        assert await client.total(numbers(5000)) == sum(range(5000))
+        assert [value async for value in client.count(5000)] == list(range(5000))
+        await client.disconnect()
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+async def test_flooding_peer_is_disconnected(buffered: bool):
+    server = EchoServer(channel_window=4)
+    async with serving(server, buffered=buffered) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        session = client.session.session
+        channel = session.create_channel()
+        # ignores the credit it was given and keeps sending
+        msgs = [Message("total", b"", MessageFlag.NONE)]
+        msgs += [Message("", b"\x01", MessageFlag.NONE)] * 1000
+        for msg in msgs:
+            session.writer.writelines(
+                encode_frame_v2(channel.index, msg, session.protocol.method_ids)
+            )
+        await session.writer.drain()
+        # the server hangs up, which may reach the client as a reset
+        with contextlib.suppress(ConnectionError):
+            await asyncio.wait_for(client.session.read_task, 2)
+        await asyncio.sleep(0.05)
+        assert not server.sessions
+        client.session = None
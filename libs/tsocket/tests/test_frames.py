@@ -0,0 +1,178 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from tsocket.shared import (
+    PROTOCOL_NAME,
+    PROTOCOL_VER,
+    Message,
+    MessageFlag,
+    ProtocolError,
+    ProtocolVersion,
+    Session,
+    decode_frame,
+    decode_varint,
+    encode_frame,
+    encode_frame_v2,
+    encode_varint,
+)
+from tsocket.server import Server
+
+from support import (
+    EchoClient,
+    EchoServer,
+    Payload,
+    recording_session,
+    server_session,
+    serving,
+)
+
+
+def v1_frame(channel_id, msg: Message) -> bytes:
+    # the layout v1 peers expect, field by field
+    method = msg.method.encode()
+    return b"".join(
+        [
+            PROTOCOL_NAME,
+            PROTOCOL_VER,
+            channel_id.bytes,
+            int(msg.flag).to_bytes(8),
+            len(method).to_bytes(8),
+            len(msg.content).to_bytes(8),
+            method,
+            msg.content,
+        ]
+    )
+
+
+def test_encode_frame_keeps_v1_layout():
+    channel_id = uuid4()
+    msg = Message("player_get", b"\x01\x02\x03", MessageFlag.END)
+    assert b"".join(encode_frame(channel_id, msg)) == v1_frame(channel_id, msg)
+
+
+async def test_write_is_one_call_per_message():
+    session, writer = recording_session()
+    msgs = [
+        Message("ping", b"", MessageFlag.NONE),
+        Message("", b"x" * 1000, MessageFlag.RESPONSE),
+        Message("emote", bytes(range(256)), MessageFlag.END),
+    ]
+    with session.create_channel() as channel:
+        for msg in msgs:
+            await channel.write(msg)
+    assert len(writer.calls) == len(msgs)
+    assert writer.data() == b"".join(v1_frame(channel.id, msg) for msg in msgs)
+
+
+def test_v1_frame_decodes():
+    channel_id = uuid4()
+    msg = Message("room_match", b"content", MessageFlag.RESPONSE | MessageFlag.END)
+    data = v1_frame(channel_id, msg)
+    size, decoded_id, index, flag, method, content = decode_frame(
+        memoryview(data + b"next frame"), []
+    )
+    assert (size, decoded_id, index) == (len(data), channel_id, 0)
+    assert (flag, method, bytes(content)) == (msg.flag, msg.method, msg.content)
+    # nothing is returned until the whole frame is there
+    assert decode_frame(memoryview(data[:-1]), []) is None
+    assert decode_frame(memoryview(data[:40]), []) is None
+
+
+@pytest.mark.parametrize("value", [0, 1, 127, 128, 300, 16383, 16384, 2**32, 2**63])
+def test_varint_round_trip(value: int):
+    data = encode_varint(value)
+    assert len(data) == max(1, (value.bit_length() + 6) // 7)
+    assert decode_varint(memoryview(data + b"rest"), 0) == (value, len(data))
+    assert decode_varint(memoryview(data[:-1]), 0) is None
+
+
+@pytest.mark.parametrize("index", [1, 2, 127, 128, 100001])
+@pytest.mark.parametrize("size", [0, 1, 127, 128, 70000])
+def test_v2_frame_round_trip(index: int, size: int):
+    msg = Message("room_match", bytes(i % 251 for i in range(size)), MessageFlag.END)
+    data = b"".join(encode_frame_v2(index, msg, {}))
+    # the header is a flag byte and three varints instead of 64 fixed bytes
+    assert len(data) - size - len(msg.method) <= 1 + 3 + 3 + 3
+    frame_size, channel_id, decoded_index, flag, method, content = decode_frame(
+        memoryview(data), []
+    )
+    assert (frame_size, channel_id, decoded_index) == (len(data), None, index)
+    assert (flag, method, bytes(content)) == (msg.flag, msg.method, msg.content)
+    for cut in [1, 2, len(data) - 1]:
+        assert decode_frame(memoryview(data[:cut]), []) is None
+
+
+@pytest.mark.parametrize(
+    "client_version, server_version, expected",
+    [
+        (ProtocolVersion.V2, ProtocolVersion.V2, ProtocolVersion.V2),
+        (ProtocolVersion.V1, ProtocolVersion.V2, ProtocolVersion.V1),
+        (ProtocolVersion.V2, ProtocolVersion.V1, ProtocolVersion.V1),
+    ],
+)
+async def test_versions_interoperate(
+    client_version: ProtocolVersion,
+    server_version: ProtocolVersion,
+    expected: ProtocolVersion,
+):
+    server: Server = EchoServer(protocol_version=server_version)
+    async with serving(server) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port, version=client_version)
+        payload = Payload(uuid4(), "versioned", [1, 2])
+        for _ in range(3):
+            assert await client.echo(payload) == payload
+        assert client.session.session.protocol.version == expected
+        await client.disconnect()
+
+
+METHODS = ["echo", "room_match", "on_room_move"]
+METHOD_IDS = {method: i for i, method in enumerate(METHODS)}
+
+
+def test_interned_method_is_sent_as_id():
+    msg = Message("room_match", b"args", MessageFlag.NONE)
+    by_name = b"".join(encode_frame_v2(3, msg, {}))
+    by_id = b"".join(encode_frame_v2(3, msg, METHOD_IDS))
+    assert len(by_id) == len(by_name) - len("room_match")
+    _, _, index, flag, method, content = decode_frame(memoryview(by_id), METHODS)
+    assert (index, flag, method, bytes(content)) == (3, msg.flag, msg.method, b"args")
+    # methods outside the table still go by name
+    other = Message("close", b"", MessageFlag.NONE)
+    data = b"".join(encode_frame_v2(3, other, METHOD_IDS))
+    assert decode_frame(memoryview(data), METHODS)[4] == "close"
+
+
+def test_unknown_method_id_is_a_protocol_error():
+    msg = Message("on_room_move", b"", MessageFlag.NONE)
+    data = b"".join(encode_frame_v2(1, msg, METHOD_IDS))
+    with pytest.raises(ProtocolError):
+        decode_frame(memoryview(data), METHODS[:2])
+
+
+async def test_stream_session_stops_on_unknown_method_id():
+    reader = asyncio.StreamReader()
+    session = Session(uuid4(), reader, None)
+    session.upgrade(ProtocolVersion.V2, False, METHODS[:2], 0)
+    for method in ["room_match", "on_room_move"]:
+        msg = Message(method, b"", MessageFlag.NONE)
+        reader.feed_data(b"".join(encode_frame_v2(1, msg, METHOD_IDS)))
+    channel, method = await session.read()
+    assert (channel.index, method) == (1, "room_match")
+    assert await session.read() is None
+
+
+async def test_hello_interns_routes_both_ends_know():
+    server = EchoServer()
+    async with serving(server) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        protocol = client.session.session.protocol
+        assert protocol.methods == server_session(server).protocol.methods
+        assert {"echo", "sleep", "total", "count"} <= set(protocol.methods)
+        assert protocol.method_ids == {m: i for i, m in enumerate(protocol.methods)}
+        payload = Payload(uuid4(), "interned")
+        assert await client.echo(payload) == payload
+        await client.disconnect()
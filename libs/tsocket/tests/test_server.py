@@ -0,0 +1,101 @@
+import asyncio
+from collections.abc import AsyncIterator
+import inspect
+import time
+from uuid import uuid4
+
+import pytest
+
+from tsocket.shared import Message, ResponseError
+
+from support import EchoClient, EchoServer, Payload, serving
+
+
+async def test_slow_route_does_not_hold_back_fast_ones():
+    async with serving(EchoServer()) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        slow = asyncio.create_task(client.sleep(0.5))
+        start = time.perf_counter()
+        assert await client.sleep(0) == 0
+        assert time.perf_counter() - start < 0.25
+        assert not slow.done()
+        assert await slow == 0.5
+        await client.disconnect()
+
+
+async def test_close_lets_running_routes_finish():
+    async with serving(EchoServer()) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        slow = asyncio.create_task(client.sleep(0.2))
+        await asyncio.sleep(0.05)
+        await client.disconnect()
+        assert slow.done() and slow.result() == 0.2
+
+
+async def test_close_refuses_new_routes():
+    async with serving(EchoServer()) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        slow = asyncio.create_task(client.sleep(0.3))
+        await asyncio.sleep(0.05)
+        with client.session.create_channel() as channel:
+            await channel.write(Message("close", b""))
+            await asyncio.sleep(0.05)
+            with pytest.raises(ResponseError) as err:
+                await client.sleep(0)
+            assert err.value.content == b"session closing"
+            await channel.read()
+        assert await slow == 0.3
+
+
+async def never_ends() -> AsyncIterator[int]:
+    yield 1
+    await asyncio.Event().wait()
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+async def test_close_does_not_hang_on_waiting_routes(buffered: bool):
+    server = EchoServer(close_timeout=0.2, channel_window=4)
+    async with serving(server, buffered=buffered) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+        # one route waits for frames that never come, the other for window
+        # credit that is never given back
+        waiting = [
+            asyncio.create_task(client.total(never_ends())),
+            asyncio.create_task(anext(client.count(100))),
+        ]
+        await asyncio.sleep(0.05)
+        start = time.perf_counter()
+        await asyncio.wait_for(client.disconnect(), 2)
+        assert time.perf_counter() - start < 1
+        for task in waiting:
+            task.cancel()
+        await asyncio.gather(*waiting, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        assert not server.sessions
+
+
+async def test_calls_do_not_read_signatures(monkeypatch: pytest.MonkeyPatch):
+    # route types are resolved when the classes are made, not per call
+    async with serving(EchoServer()) as port:
+        client = EchoClient()
+        await client.connect("127.0.0.1", port)
+
+        def signature(*_args, **_kwargs):
+            raise AssertionError("signature read during a call")
+
+        monkeypatch.setattr(inspect, "signature", signature)
+        payload = Payload(uuid4(), "cached", [3])
+        assert await client.echo(payload) == payload
+        assert await client.total(numbers(3)) == 3
+        assert [value async for value in client.count(3)] == [0, 1, 2]
+        monkeypatch.undo()
+        await client.disconnect()
+
+
+async def numbers(count: int) -> AsyncIterator[int]:
+    for value in range(count):
+        yield value
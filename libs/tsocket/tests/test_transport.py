@@ -0,0 +1,123 @@
+import asyncio
+import random
+from uuid import uuid4
+
+import pytest
+
+from tsocket.shared import Message, MessageFlag, encode_frame, encode_frame_v2
+from tsocket.transport import BUFFER_SIZE, FrameProtocol
+
+
+class FakeTransport(asyncio.Transport):
+    def __init__(self):
+        super().__init__()
+        self.paused = False
+        self.closed = False
+
+    def pause_reading(self):
+        self.paused = True
+
+    def resume_reading(self):
+        self.paused = False
+
+    def is_closing(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+
+def connected(max_incoming: int = 1000) -> tuple[FrameProtocol, FakeTransport]:
+    protocol = FrameProtocol(max_incoming=max_incoming)
+    transport = FakeTransport()
+    protocol.connection_made(transport)
+    return protocol, transport
+
+
+def feed(protocol: FrameProtocol, data: bytes, chunks: list[int]):
+    # hands data over the way the event loop would, in pieces of these sizes
+    pos = 0
+    for size in chunks + [len(data)]:
+        while size and pos < len(data):
+            buffer = protocol.get_buffer(-1)
+            taken = min(size, len(buffer), len(data) - pos)
+            buffer[:taken] = data[pos : pos + taken]
+            protocol.buffer_updated(taken)
+            pos += taken
+            size -= taken
+
+
+def sample_frames(rng: random.Random, count: int) -> tuple[bytes, list[bytes]]:
+    contents = []
+    data = bytearray()
+    for index in range(count):
+        content = rng.randbytes(rng.choice([0, 1, 100, 5000, BUFFER_SIZE]))
+        msg = Message(f"method{index % 3}", content, MessageFlag.END)
+        contents.append(content)
+        data += b"".join(encode_frame_v2(2 * index + 1, msg, {}))
+    return bytes(data), contents
+
+
+def received(protocol: FrameProtocol) -> list[tuple[str, bytes]]:
+    messages = []
+    while not protocol.incoming.empty():
+        channel, method = protocol.incoming.get_nowait()
+        messages.append((method, bytes(channel.queue.get_nowait().content)))
+    return messages
+
+
+@pytest.mark.parametrize("seed", range(5))
+async def test_frames_split_anywhere_parse_the_same(seed: int):
+    rng = random.Random(seed)
+    data, contents = sample_frames(rng, 30)
+    expected = [(f"method{i % 3}", content) for i, content in enumerate(contents)]
+    for chunks in [
+        [1] * 200,
+        [rng.randrange(1, 300) for _ in range(500)],
+        [rng.randrange(1, 70000) for _ in range(20)],
+    ]:
+        protocol, _ = connected()
+        feed(protocol, data, chunks)
+        assert received(protocol) == expected
+
+
+async def test_views_survive_the_buffer_moving():
+    rng = random.Random(9)
+    data, contents = sample_frames(rng, 40)
+    protocol, _ = connected()
+    feed(protocol, data, [rng.randrange(1, 9000) for _ in range(100)])
+    # nothing was read until every frame was in, so earlier contents are views
+    # into buffers that have since been replaced
+    queued = []
+    while not protocol.incoming.empty():
+        channel, _ = protocol.incoming.get_nowait()
+        queued.append(channel.queue.get_nowait().content)
+    assert any(isinstance(content, memoryview) for content in queued)
+    assert [bytes(content) for content in queued] == contents
+
+
+async def test_v1_frames_parse():
+    protocol, _ = connected()
+    msgs = [Message("ping", b"x" * size, MessageFlag.END) for size in [0, 10, 9000]]
+    data = b"".join(b"".join(encode_frame(uuid4(), m)) for m in msgs)
+    feed(protocol, data, [7] * 2000)
+    assert received(protocol) == [(m.method, m.content) for m in msgs]
+
+
+async def test_reading_pauses_while_sessions_lag():
+    protocol, transport = connected(max_incoming=4)
+    data, _ = sample_frames(random.Random(1), 6)
+    feed(protocol, data, [])
+    assert transport.paused
+    # reading resumes once the queue is down to half
+    for _ in range(4):
+        await protocol.read_channel()
+    assert transport.paused
+    await protocol.read_channel()
+    assert not transport.paused
+
+
+async def test_garbage_closes_the_connection():
+    protocol, transport = connected()
+    feed(protocol, b"not a tsocket frame" * 10, [])
+    assert transport.closed
@@ -14,27 +14,32 @@ from typing import (
     get_args,
     runtime_checkable,
 )
-from uuid import UUID, uuid4
-
-from cattrs.preconf.cbor2 import Cbor2Converter
-
+from uuid import uuid4
+
+from .codec import (
+    DEFAULT_CODEC,
+    Buffer,
+    cbor2_codec,
+    make_dumps,
+    make_loads,
+    negotiate,
+    require,
+)
 from .shared import (
     Channel,
     ConnectedError,
     DisconnectedError,
+    Hello,
     Message,
     MessageFlag,
+    ProtocolVersion,
     ResponseError,
     Session,
 )
+from .transport import FrameProtocol
 
 log = logging.getLogger(__name__)
 
-converter = Cbor2Converter()
-
-converter.register_structure_hook(UUID, lambda d, t: UUID(bytes=d))
-converter.register_unstructure_hook(UUID, lambda u: u.bytes)
-
 ClientT_contra = TypeVar("ClientT_contra", bound="Client", contravariant=True)
 T = TypeVar("T")
 U = TypeVar("U")
@@ -46,16 +51,29 @@ class _Route(Protocol[ClientT_contra]):
         ...
 
 
-async def simple_writer(channel: Channel, name: str, data: T):
-    await channel.write(Message(name, converter.dumps(data)))
+def _route_types(func: Callable[..., Any]) -> tuple[Any, Any]:
+    signature = inspect.signature(func)
+    params = [*signature.parameters.values()]
+    return params[-1].annotation, signature.return_annotation
+
 
+async def simple_writer(
+    channel: Channel, name: str, data: T, dumps: dict[str, Callable[[T], bytes]]
+):
+    codec = channel.session.protocol.codec
+    await channel.write(Message(name, dumps[codec](data)))
 
-async def stream_writer(channel: Channel, name: str, data: AsyncIterator[T]):
+
+async def stream_writer(
+    channel: Channel,
+    name: str,
+    data: AsyncIterator[T],
+    dumps: dict[str, Callable[[T], bytes]],
+):
+    codec = channel.session.protocol.codec
     try:
         async for content in data:
-            await channel.write(
-                Message(name, converter.dumps(content), MessageFlag.NONE)
-            )
+            await channel.write(Message(name, dumps[codec](content), MessageFlag.NONE))
         await channel.write(Message(name, b""))
     except Exception:  # pylint: disable=W0718
         await channel.write(
@@ -63,17 +81,19 @@ async def stream_writer(channel: Channel, name: str, data: AsyncIterator[T]):
         )
 
 
-async def simple_reader(channel: Channel, cls: type[T]):
+async def simple_reader(channel: Channel, loads: dict[str, Callable[[Buffer], T]]):
+    codec = channel.session.protocol.codec
     msg = await channel.read()
-    return converter.loads(msg.to_content(), cls)
+    return loads[codec](msg.to_content())
 
 
-async def stream_reader(channel: Channel, cls: type[T]):
+async def stream_reader(channel: Channel, loads: dict[str, Callable[[Buffer], T]]):
+    codec = channel.session.protocol.codec
     while True:
         msg = await channel.read()
         content = msg.to_content()
         if content:
-            yield converter.loads(content, cls)
+            yield loads[codec](content)
         if MessageFlag.END in msg.flag:
             break
 
@@ -84,20 +104,28 @@ class _SimpleRoute(Generic[ClientT_contra, T, U]):
 
     def get_fake_route(self, name: str):
         func = self.func
+        arg_type, return_type = _route_types(func)
+        dumps = make_dumps(arg_type)
+        loads = make_loads(return_type)
 
         @wraps(func)
         async def fake_route(self: ClientT_contra, data: T) -> U:
-            with self.session.create_channel() as channel:
-                write_task = asyncio.create_task(simple_writer(channel, name, data))
-                try:
-                    content = await simple_reader(
-                        channel, inspect.signature(func).return_annotation
+            while True:
+                with self.session.create_channel() as channel:
+                    write_task = asyncio.create_task(
+                        simple_writer(channel, name, data, dumps)
                     )
-                    await write_task
-                    return content
-                except ResponseError as err:
-                    await write_task
-                    raise ResponseError(err.method, err.content) from None
+                    try:
+                        content = await simple_reader(channel, loads)
+                        await write_task
+                        return content
+                    except ResponseError as err:
+                        await write_task
+                        if err.method != "redirect":
+                            raise ResponseError(err.method, err.content) from None
+                        address = err.content
+                # the server wants this call made on another server instead
+                await self.redirect(address)
 
         return fake_route
 
@@ -112,15 +140,18 @@ class _StreamInRoute(Generic[ClientT_contra, T, U]):
 
     def get_fake_route(self, name: str):
         func = self.func
+        arg_type, return_type = _route_types(func)
+        dumps = make_dumps(get_args(arg_type)[0])
+        loads = make_loads(return_type)
 
         @wraps(func)
         async def fake_route(self: ClientT_contra, data: AsyncIterator[T]) -> U:
             with self.session.create_channel() as channel:
-                write_task = asyncio.create_task(stream_writer(channel, name, data))
+                write_task = asyncio.create_task(
+                    stream_writer(channel, name, data, dumps)
+                )
                 try:
-                    content = await simple_reader(
-                        channel, inspect.signature(func).return_annotation
-                    )
+                    content = await simple_reader(channel, loads)
                     await write_task
                     return content
                 except ResponseError as err:
@@ -140,15 +171,18 @@ class _StreamOutRoute(Generic[ClientT_contra, T, U]):
 
     def get_fake_route(self, name: str):
         func = self.func
+        arg_type, return_type = _route_types(func)
+        dumps = make_dumps(arg_type)
+        loads = make_loads(get_args(return_type)[0])
 
         @wraps(func)
         async def fake_route(self: ClientT_contra, data: T) -> AsyncIterator[U]:
             with self.session.create_channel() as channel:
-                write_task = asyncio.create_task(simple_writer(channel, name, data))
+                write_task = asyncio.create_task(
+                    simple_writer(channel, name, data, dumps)
+                )
                 try:
-                    async for content in stream_reader(
-                        channel, get_args(inspect.signature(func).return_annotation)[0]
-                    ):
+                    async for content in stream_reader(channel, loads):
                         yield content
                     await write_task
                 except ResponseError as err:
@@ -168,17 +202,20 @@ class _StreamInOutRoute(Generic[ClientT_contra, T, U]):
 
     def get_fake_route(self, name: str):
         func = self.func
+        arg_type, return_type = _route_types(func)
+        dumps = make_dumps(get_args(arg_type)[0])
+        loads = make_loads(get_args(return_type)[0])
 
         @wraps(func)
         async def fake_route(
             self: ClientT_contra, data: AsyncIterator[T]
         ) -> AsyncIterator[U]:
             with self.session.create_channel() as channel:
-                write_task = asyncio.create_task(stream_writer(channel, name, data))
+                write_task = asyncio.create_task(
+                    stream_writer(channel, name, data, dumps)
+                )
                 try:
-                    async for content in stream_reader(
-                        channel, get_args(inspect.signature(func).return_annotation)[0]
-                    ):
+                    async for content in stream_reader(channel, loads):
                         yield content
                     await write_task
                 except ResponseError as err:
@@ -220,16 +257,15 @@ class _Subscribe(Generic[ClientT_contra, T]):
 
     def get_fake_subscribe(self, name: str):
         func = self.func
+        loads = make_loads(get_args(inspect.signature(func).return_annotation)[0])
 
         @wraps(func)
         async def fake_subscribe(self: ClientT_contra):
             queue = self.cbs.get(name, asyncio.Queue())
             self.cbs[name] = queue
             while True:
-                yield converter.loads(
-                    await queue.get(),
-                    get_args(inspect.signature(func).return_annotation)[0],
-                )
+                content = await queue.get()
+                yield loads[self.session.session.protocol.codec](content)
 
         return fake_subscribe
 
@@ -269,6 +305,7 @@ class ClientSession:
                 await queue.put(msg.content)
             else:
                 break
+        self.session.close_channels()
 
 
 class ClientMeta(type):
@@ -308,24 +345,107 @@ class Client(metaclass=ClientMeta):
     ]
     session: ClientSession | None = field(init=False, default=None)
     cbs: dict[str, asyncio.Queue[bytes]] = field(init=False, default_factory=dict)
+    host: str | None = field(init=False, default=None)
+    connect_options: dict[str, Any] = field(init=False, default_factory=dict)
 
     async def connect(
         self,
         host: str | None,
         port: int | str | None,
         ssl: ssl.SSLContext | bool | None = None,  # pylint: disable=W0621
+        version: ProtocolVersion = ProtocolVersion.V2,
+        window: int = 32,
+        codecs: list[str] | None = None,
+        buffered: bool = False,
     ):
         if self.session is not None:
             raise ConnectedError()
-        reader, writer = await asyncio.open_connection(host, port, ssl=ssl)
-        self.session = ClientSession(Session(uuid4(), reader, writer), self)
+        # backends besides cbor2 are opt in, in order of preference
+        codecs = require([DEFAULT_CODEC] if codecs is None else codecs)
+        self.host = host
+        self.connect_options = {
+            "ssl": ssl,
+            "version": version,
+            "window": window,
+            "codecs": codecs,
+            "buffered": buffered,
+        }
+        self.session = await self.open_session(host, port, **self.connect_options)
         log.info("client started on %s:%s", host, port)
 
+    async def open_session(
+        self,
+        host: str | None,
+        port: int | str | None,
+        ssl: ssl.SSLContext | bool | None,  # pylint: disable=W0621
+        version: ProtocolVersion,
+        window: int,
+        codecs: list[str],
+        buffered: bool,
+    ):
+        if buffered:
+            _, protocol = await asyncio.get_running_loop().create_connection(
+                FrameProtocol, host, port, ssl=ssl
+            )
+            session = protocol.session
+        else:
+            reader, writer = await asyncio.open_connection(host, port, ssl=ssl)
+            session = Session(uuid4(), reader, writer)
+        client_session = ClientSession(session, self)
+        if version > ProtocolVersion.V1:
+            await self.hello(session, version, window, codecs)
+        return client_session
+
+    async def redirect(self, address: bytes):
+        # address is "host:port", an empty host keeps the current one
+        host, _, port = address.decode().rpartition(":")
+        if self.session is None:
+            raise DisconnectedError()
+        session = await self.open_session(
+            host or self.host, port, **self.connect_options
+        )
+        old_session, self.session = self.session, session
+        if host:
+            self.host = host
+        log.info("client redirected to %s:%s", self.host, port)
+        await self.close_session(old_session)
+
+    async def hello(
+        self,
+        session: Session,
+        version: ProtocolVersion,
+        window: int,
+        codecs: list[str],
+    ):
+        methods = [*self.routes.keys(), *self.subscribes.keys()]
+        with session.create_channel() as channel:
+            await channel.write(
+                Message(
+                    "hello",
+                    cbor2_codec.dumps(Hello(version, methods, window, codecs)),
+                )
+            )
+            try:
+                hello = cbor2_codec.loads((await channel.read()).to_content(), Hello)
+            except ResponseError:
+                # servers that predate negotiation answer with "no method found"
+                hello = Hello(ProtocolVersion.V1)
+        session.upgrade(
+            ProtocolVersion(hello.version),
+            initiator=True,
+            methods=hello.methods,
+            window=hello.window,
+            codec=negotiate(hello.codecs, codecs),
+        )
+
     async def disconnect(self):
         if self.session is None:
             raise DisconnectedError()
         session = self.session
         self.session = None
+        await self.close_session(session)
+
+    async def close_session(self, session: ClientSession):
         with session.create_channel() as channel:
             await channel.write(Message("close", b""))
             await channel.read()
@@ -12,20 +12,21 @@ import ssl
 from threading import Thread
 from typing import Any, Generic, Protocol, TypeVar, get_args, runtime_checkable
 
-from uuid import UUID
-
-from cattrs.preconf.cbor2 import Cbor2Converter
-
-from .client import Client, simple_writer, stream_writer, simple_reader, stream_reader
+from .client import (
+    Client,
+    _route_types,
+    make_dumps,
+    make_loads,
+    simple_writer,
+    stream_writer,
+    simple_reader,
+    stream_reader,
+)
+from .codec import Buffer
 from .shared import ConnectedError, DisconnectedError, ResponseError
 
 log = logging.getLogger(__name__)
 
-converter = Cbor2Converter()
-
-converter.register_structure_hook(UUID, lambda d, t: UUID(bytes=d))
-converter.register_unstructure_hook(UUID, lambda u: u.bytes)
-
 ClientThreadT_contra = TypeVar(
     "ClientThreadT_contra", bound="ClientThread", contravariant=True
 )
@@ -93,17 +94,31 @@ async def asynciterator_to_queue(
 class SimpleWorkItem(Generic[T, U]):
     name: str
     content: T
-    cls: type[U]
+    loads: dict[str, Callable[[Buffer], U]]
+    dumps: dict[str, Callable[[T], bytes]]
     future: Future[U] = field(default_factory=Future)
 
     async def run(self, client: Client):
         if self.future.set_running_or_notify_cancel():
+            await awaitable_to_future(self.call(client), self.future)
+
+    async def call(self, client: Client) -> U:
+        while True:
             with client.session.create_channel() as channel:
                 write_task = asyncio.create_task(
-                    simple_writer(channel, self.name, self.content)
+                    simple_writer(channel, self.name, self.content, self.dumps)
                 )
-                await awaitable_to_future(simple_reader(channel, self.cls), self.future)
-                await write_task
+                try:
+                    content = await simple_reader(channel, self.loads)
+                    await write_task
+                    return content
+                except ResponseError as err:
+                    await write_task
+                    if err.method != "redirect":
+                        raise
+                    address = err.content
+            # the server wants this call made on another server instead
+            await client.redirect(address)
 
 
 @dataclass
@@ -118,12 +133,13 @@ class _SimpleRoute(Generic[ClientThreadT_contra, T, U]):
         self, name: str
     ) -> Callable[[ClientThreadT_contra, T], Future[U]]:
         func = self.func
+        arg_type, return_type = _route_types(func)
+        loads = make_loads(get_args(return_type)[0])
+        dumps = make_dumps(arg_type)
 
         @wraps(func)
         def fake_route(self: ClientThreadT_contra, data: T) -> Future[U]:
-            work = SimpleWorkItem(
-                name, data, get_args(inspect.signature(func).return_annotation)[0]
-            )
+            work = SimpleWorkItem(name, data, loads, dumps)
             self.work_queue.put(work)
             return work.future
 
@@ -134,7 +150,8 @@ class _SimpleRoute(Generic[ClientThreadT_contra, T, U]):
 class StreamInWorkItem(Generic[T, U]):
     name: str
     content: queue.SimpleQueue[Future[T]]
-    cls: type[U]
+    loads: dict[str, Callable[[Buffer], U]]
+    dumps: dict[str, Callable[[T], bytes]]
     future: Future[U] = field(default_factory=Future)
 
     async def run(self, client: Client):
@@ -142,10 +159,15 @@ class StreamInWorkItem(Generic[T, U]):
             with client.session.create_channel() as channel:
                 write_task = asyncio.create_task(
                     stream_writer(
-                        channel, self.name, queue_to_asynciterator(self.content)
+                        channel,
+                        self.name,
+                        queue_to_asynciterator(self.content),
+                        self.dumps,
                     )
                 )
-                await awaitable_to_future(simple_reader(channel, self.cls), self.future)
+                await awaitable_to_future(
+                    simple_reader(channel, self.loads), self.future
+                )
                 await write_task
 
 
@@ -161,14 +183,15 @@ class _StreamInRoute(Generic[ClientThreadT_contra, T, U]):
         self, name: str
     ) -> Callable[[ClientThreadT_contra, queue.SimpleQueue[Future[T]]], Future[U]]:
         func = self.func
+        arg_type, return_type = _route_types(func)
+        loads = make_loads(get_args(return_type)[0])
+        dumps = make_dumps(get_args(get_args(arg_type)[0])[0])
 
         @wraps(func)
         def fake_route(
             self: ClientThreadT_contra, data: queue.SimpleQueue[Future[T]]
         ) -> Future[U]:
-            work = StreamInWorkItem(
-                name, data, get_args(inspect.signature(func).return_annotation)[0]
-            )
+            work = StreamInWorkItem(name, data, loads, dumps)
             self.work_queue.put(work)
             return work.future
 
@@ -179,7 +202,8 @@ class _StreamInRoute(Generic[ClientThreadT_contra, T, U]):
 class StreamOutWorkItem(Generic[T, U]):
     name: str
     content: T
-    cls: type[U]
+    loads: dict[str, Callable[[Buffer], U]]
+    dumps: dict[str, Callable[[T], bytes]]
     future: Future[queue.SimpleQueue[Future[U]]] = field(default_factory=Future)
 
     async def run(self, client: Client):
@@ -188,10 +212,10 @@ class StreamOutWorkItem(Generic[T, U]):
             self.future.set_result(out_queue)
             with client.session.create_channel() as channel:
                 write_task = asyncio.create_task(
-                    simple_writer(channel, self.name, self.content)
+                    simple_writer(channel, self.name, self.content, self.dumps)
                 )
                 await asynciterator_to_queue(
-                    stream_reader(channel, self.cls), out_queue
+                    stream_reader(channel, self.loads), out_queue
                 )
                 await write_task
 
@@ -208,18 +232,15 @@ class _StreamOutRoute(Generic[ClientThreadT_contra, T, U]):
         self, name: str
     ) -> Callable[[ClientThreadT_contra, T], Future[queue.SimpleQueue[Future[U]]]]:
         func = self.func
+        arg_type, return_type = _route_types(func)
+        loads = make_loads(get_args(get_args(get_args(return_type)[0])[0])[0])
+        dumps = make_dumps(arg_type)
 
         @wraps(func)
         def fake_route(
             self: ClientThreadT_contra, data: T
         ) -> Future[queue.SimpleQueue[Future[U]]]:
-            work = StreamOutWorkItem(
-                name,
-                data,
-                get_args(
-                    get_args(get_args(inspect.signature(func).return_annotation)[0])[0]
-                )[0],
-            )
+            work = StreamOutWorkItem(name, data, loads, dumps)
             self.work_queue.put(work)
             return work.future
 
@@ -230,7 +251,8 @@ class _StreamOutRoute(Generic[ClientThreadT_contra, T, U]):
 class StreamInOutWorkItem(Generic[T, U]):
     name: str
     content: queue.SimpleQueue[Future[T]]
-    cls: type[U]
+    loads: dict[str, Callable[[Buffer], U]]
+    dumps: dict[str, Callable[[T], bytes]]
     future: Future[queue.SimpleQueue[Future[U]]] = field(default_factory=Future)
 
     async def run(self, client: Client):
@@ -240,11 +262,14 @@ class StreamInOutWorkItem(Generic[T, U]):
             with client.session.create_channel() as channel:
                 write_task = asyncio.create_task(
                     stream_writer(
-                        channel, self.name, queue_to_asynciterator(self.content)
+                        channel,
+                        self.name,
+                        queue_to_asynciterator(self.content),
+                        self.dumps,
                     )
                 )
                 await asynciterator_to_queue(
-                    stream_reader(channel, self.cls), out_queue
+                    stream_reader(channel, self.loads), out_queue
                 )
                 await write_task
 
@@ -269,18 +294,15 @@ class _StreamInOutRoute(Generic[ClientThreadT_contra, T, U]):
         Future[queue.SimpleQueue[Future[U]]],
     ]:
         func = self.func
+        arg_type, return_type = _route_types(func)
+        loads = make_loads(get_args(get_args(get_args(return_type)[0])[0])[0])
+        dumps = make_dumps(get_args(get_args(arg_type)[0])[0])
 
         @wraps(func)
         def fake_route(
             self: ClientThreadT_contra, data: queue.SimpleQueue[Future[T]]
         ) -> Future[queue.SimpleQueue[Future[U]]]:
-            work = StreamInOutWorkItem(
-                name,
-                data,
-                get_args(
-                    get_args(get_args(inspect.signature(func).return_annotation)[0])[0]
-                )[0],
-            )
+            work = StreamInOutWorkItem(name, data, loads, dumps)
             self.work_queue.put(work)
             return work.future
 
@@ -332,7 +354,7 @@ class UnsubscribeWorkItem:
 @dataclass
 class SubscribeWorkItem(Generic[ClientThreadT_contra, T]):
     name: str
-    cls: type[T]
+    loads: dict[str, Callable[[Buffer], T]]
     client_thread: ClientThreadT_contra
     future: Future[AbstractContextManager[queue.SimpleQueue[Future[T]]]] = field(
         default_factory=Future
@@ -344,12 +366,11 @@ class SubscribeWorkItem(Generic[ClientThreadT_contra, T]):
             client_queue = client.cbs.get(self.name, asyncio.Queue())
             client.cbs[self.name] = client_queue
 
+            loads = self.loads[client.session.session.protocol.codec]
+
             async def async_subscriber():
                 while True:
-                    yield converter.loads(
-                        await client_queue.get(),
-                        self.cls,
-                    )
+                    yield loads(await client_queue.get())
 
             async def async_subscriber_to_queue():
                 with contextlib.suppress(asyncio.CancelledError):
@@ -387,22 +408,19 @@ class _Subscribe(Generic[ClientThreadT_contra, T]):
         Future[AbstractContextManager[queue.SimpleQueue[Future[T]]]],
     ]:
         func = self.func
+        loads = make_loads(
+            get_args(
+                get_args(
+                    get_args(get_args(inspect.signature(func).return_annotation)[0])[0]
+                )[0]
+            )[0]
+        )
 
         @wraps(func)
         def fake_subscribe(
             self: ClientThreadT_contra,
         ) -> Future[AbstractContextManager[queue.SimpleQueue[Future[T]]]]:
-            work = SubscribeWorkItem(
-                name,
-                get_args(
-                    get_args(
-                        get_args(
-                            get_args(inspect.signature(func).return_annotation)[0]
-                        )[0]
-                    )[0]
-                )[0],
-                self,
-            )
+            work = SubscribeWorkItem(name, loads, self)
             self.work_queue.put(work)
             return work.future
 
@@ -451,9 +469,11 @@ class ClientThread(metaclass=ClientThreadMeta):
         host: str | None,
         port: int | str | None,
         ssl: ssl.SSLContext | bool | None = None,  # pylint: disable=W0621
+        codecs: list[str] | None = None,
+        buffered: bool = False,
     ):
         client = Client()
-        await client.connect(host, port, ssl=ssl)
+        await client.connect(host, port, ssl=ssl, codecs=codecs, buffered=buffered)
         running_tasks = set[asyncio.Task]()
         while True:
             running_tasks = {task for task in running_tasks if not task.done()}
@@ -471,11 +491,17 @@ class ClientThread(metaclass=ClientThreadMeta):
         host: str | None,
         port: int | str | None,
         ssl: ssl.SSLContext | bool | None = None,  # pylint: disable=W0621
+        codecs: list[str] | None = None,
+        buffered: bool = False,
     ):
         if self.thread is not None:
             raise ConnectedError()
         self.thread = Thread(
-            target=partial(asyncio.run, self._runner(host, port, ssl=ssl)), daemon=True
+            target=partial(
+                asyncio.run,
+                self._runner(host, port, ssl=ssl, codecs=codecs, buffered=buffered),
+            ),
+            daemon=True,
         )
         self.thread.start()
 
@@ -0,0 +1,128 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+import inspect
+from typing import Any, TypeVar
+from uuid import UUID
+
+import cbor2
+from cattrs.converters import Converter
+from cattrs.preconf.cbor2 import make_converter as make_cbor2_converter
+
+T = TypeVar("T")
+
+# payloads may be sliced straight out of the read buffer
+Buffer = bytes | bytearray | memoryview
+
+DEFAULT_CODEC = "cbor2"
+
+
+@dataclass(frozen=True)
+class Codec:
+    name: str
+    converter: Converter
+    encode: Callable[[Any], bytes]
+    decode: Callable[[Buffer], Any]
+
+    def loads(self, data: Buffer, cls: type[T]) -> T:
+        return self.converter.structure(self.decode(data), cls)
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.encode(self.converter.unstructure(obj))
+
+    def make_loads(self, cls: type[T]) -> Callable[[Buffer], T]:
+        structure = self.converter._structure_func.dispatch(  # pylint: disable=W0212
+            cls
+        )
+        decode = self.decode
+
+        def loads(data: Buffer) -> T:
+            return structure(decode(data), cls)
+
+        return loads
+
+    def make_dumps(self, cls: type[T]) -> Callable[[T], bytes]:
+        if cls is inspect.Signature.empty:
+            return self.dumps
+        unstructure_func = self.converter._unstructure_func  # pylint: disable=W0212
+        unstructure = unstructure_func.dispatch(cls)
+        encode = self.encode
+        dumps_any = self.dumps
+
+        def dumps(obj: T) -> bytes:
+            # subclasses and generic aliases still go through the full dispatch
+            if obj.__class__ is cls:
+                return encode(unstructure(obj))
+            return dumps_any(obj)
+
+        return dumps
+
+
+def _cbor2_codec():
+    converter = make_cbor2_converter()
+    converter.register_structure_hook(UUID, lambda d, t: UUID(bytes=d))
+    converter.register_unstructure_hook(UUID, lambda u: u.bytes)
+    return Codec("cbor2", converter, cbor2.dumps, cbor2.loads)
+
+
+def _msgpack_codec():
+    try:
+        import msgpack  # pylint: disable=C0415
+        from cattrs.preconf.msgpack import (  # pylint: disable=C0415
+            make_converter as make_msgpack_converter,
+        )
+    except ImportError:
+        return None
+    converter = make_msgpack_converter()
+    converter.register_structure_hook(UUID, lambda d, t: UUID(bytes=d))
+    converter.register_unstructure_hook(UUID, lambda u: u.bytes)
+    return Codec("msgpack", converter, msgpack.packb, msgpack.unpackb)
+
+
+def _orjson_codec():
+    try:
+        import orjson  # pylint: disable=C0415
+        from cattrs.preconf.orjson import (  # pylint: disable=C0415
+            make_converter as make_orjson_converter,
+        )
+    except ImportError:
+        return None
+    converter = make_orjson_converter()
+    converter.register_structure_hook(UUID, lambda d, t: UUID(d))
+    converter.register_unstructure_hook(UUID, str)
+    return Codec("orjson", converter, orjson.dumps, orjson.loads)
+
+
+# every installed backend, msgpack and orjson come from the extras of the
+# same name. a session only uses one of them when both ends list it, so what
+# happens to be installed never changes the codec on its own
+CODECS: dict[str, Codec] = {
+    codec.name: codec
+    for codec in (_cbor2_codec(), _msgpack_codec(), _orjson_codec())
+    if codec is not None
+}
+
+# the handshake and anything sent before it always use cbor2
+cbor2_codec = CODECS[DEFAULT_CODEC]
+
+
+def make_loads(cls: type[T]) -> dict[str, Callable[[Buffer], T]]:
+    return {name: codec.make_loads(cls) for name, codec in CODECS.items()}
+
+
+def make_dumps(cls: type[T]) -> dict[str, Callable[[T], bytes]]:
+    return {name: codec.make_dumps(cls) for name, codec in CODECS.items()}
+
+
+def require(names: list[str]) -> list[str]:
+    for name in names:
+        if name not in CODECS:
+            raise ValueError(f"codec {name} is not installed")
+    return names
+
+
+def negotiate(offered: list[str], accepted: list[str]) -> str:
+    # the first codec in the offer that the other end accepts
+    return next(
+        (name for name in offered if name in accepted and name in CODECS),
+        DEFAULT_CODEC,
+    )
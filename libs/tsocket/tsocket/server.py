@@ -1,5 +1,6 @@
 import asyncio
-from collections.abc import Awaitable, AsyncIterator, Callable, Sequence
+from collections import deque
+from collections.abc import Awaitable, AsyncIterator, Callable, Iterable, Sequence
 import contextlib
 from dataclasses import dataclass, field
 from functools import wraps
@@ -17,17 +18,29 @@ from typing import (
 )
 from uuid import UUID, uuid4
 
-from cattrs.preconf.cbor2 import Cbor2Converter
-
-from .shared import Channel, Message, MessageFlag, ResponseError, Session, SessionId
+from .codec import (
+    DEFAULT_CODEC,
+    Buffer,
+    cbor2_codec,
+    make_dumps,
+    make_loads,
+    negotiate,
+    require,
+)
+from .shared import (
+    Channel,
+    Hello,
+    Message,
+    MessageFlag,
+    ProtocolVersion,
+    ResponseError,
+    Session,
+    SessionId,
+)
+from .transport import FrameProtocol
 
 log = logging.getLogger(__name__)
 
-converter = Cbor2Converter()
-
-converter.register_structure_hook(UUID, lambda d, t: UUID(bytes=d))
-converter.register_unstructure_hook(UUID, lambda u: u.bytes)
-
 ServerT_contra = TypeVar("ServerT_contra", bound="Server", contravariant=True)
 T = TypeVar("T")
 U = TypeVar("U")
@@ -64,9 +77,22 @@ async def handle_channel_exc(channel: Channel):
         )
 
 
+def _route_types(func: Callable[..., Any]) -> tuple[Any, Any]:
+    signature = inspect.signature(func)
+    params = [*signature.parameters.values()]
+    return params[-1].annotation, signature.return_annotation
+
+
 @dataclass
 class _SimpleRoute(Generic[ServerT_contra, T, U]):
     func: Callable[[ServerT_contra, Session, T], Awaitable[U]]
+    loads: dict[str, Callable[[Buffer], T]] = field(init=False)
+    dumps: dict[str, Callable[[U], bytes]] = field(init=False)
+
+    def __post_init__(self):
+        arg_type, return_type = _route_types(self.func)
+        self.loads = make_loads(arg_type)
+        self.dumps = make_dumps(return_type)
 
     async def __call__(self, session: Session, args: T) -> U:
         # For tricking LSP / type checker
@@ -74,24 +100,30 @@ class _SimpleRoute(Generic[ServerT_contra, T, U]):
 
     async def run(self, server: ServerT_contra, channel: Channel):
         async with handle_channel_exc(channel):
-            params = [*inspect.signature(self.func).parameters.values()]
+            codec = channel.session.protocol.codec
             msg = await channel.read()
             content = await self.func(
                 server,
                 channel.session,
-                converter.loads(msg.to_content(), params[-1].annotation),
+                self.loads[codec](msg.to_content()),
             )
             await channel.write(
                 Message(
-                    "", converter.dumps(content), MessageFlag.RESPONSE | MessageFlag.END
+                    "",
+                    self.dumps[codec](content),
+                    MessageFlag.RESPONSE | MessageFlag.END,
                 )
             )
 
 
-async def gen_content_from_channel(channel: Channel, cls: type[T]) -> AsyncIterator[T]:
+async def gen_content_from_channel(
+    channel: Channel, loads: Callable[[Buffer], T]
+) -> AsyncIterator[T]:
     while True:
         msg = await channel.read()
-        yield converter.loads(msg.to_content(), cls)
+        content = msg.to_content()
+        if content:
+            yield loads(content)
         if MessageFlag.END in msg.flag:
             break
 
@@ -99,6 +131,13 @@ async def gen_content_from_channel(channel: Channel, cls: type[T]) -> AsyncItera
 @dataclass
 class _StreamInRoute(Generic[ServerT_contra, T, U]):
     func: Callable[[ServerT_contra, Session, AsyncIterator[T]], Awaitable[U]]
+    loads: dict[str, Callable[[Buffer], T]] = field(init=False)
+    dumps: dict[str, Callable[[U], bytes]] = field(init=False)
+
+    def __post_init__(self):
+        arg_type, return_type = _route_types(self.func)
+        self.loads = make_loads(get_args(arg_type)[0])
+        self.dumps = make_dumps(return_type)
 
     async def __call__(self, session: Session, args: AsyncIterator[T]) -> U:
         # For tricking LSP / type checker
@@ -106,15 +145,17 @@ class _StreamInRoute(Generic[ServerT_contra, T, U]):
 
     async def run(self, server: ServerT_contra, channel: Channel):
         async with handle_channel_exc(channel):
-            params = [*inspect.signature(self.func).parameters.values()]
+            codec = channel.session.protocol.codec
             content = await self.func(
                 server,
                 channel.session,
-                gen_content_from_channel(channel, get_args(params[-1].annotation)[0]),
+                gen_content_from_channel(channel, self.loads[codec]),
             )
             await channel.write(
                 Message(
-                    "", converter.dumps(content), MessageFlag.RESPONSE | MessageFlag.END
+                    "",
+                    self.dumps[codec](content),
+                    MessageFlag.RESPONSE | MessageFlag.END,
                 )
             )
 
@@ -122,6 +163,13 @@ class _StreamInRoute(Generic[ServerT_contra, T, U]):
 @dataclass
 class _StreamOutRoute(Generic[ServerT_contra, T, U]):
     func: Callable[[ServerT_contra, Session, T], AsyncIterator[U]]
+    loads: dict[str, Callable[[Buffer], T]] = field(init=False)
+    dumps: dict[str, Callable[[U], bytes]] = field(init=False)
+
+    def __post_init__(self):
+        arg_type, return_type = _route_types(self.func)
+        self.loads = make_loads(arg_type)
+        self.dumps = make_dumps(get_args(return_type)[0])
 
     async def __call__(self, session: Session, args: T) -> AsyncIterator[U]:
         # For tricking LSP / type checker
@@ -129,16 +177,15 @@ class _StreamOutRoute(Generic[ServerT_contra, T, U]):
 
     async def run(self, server: ServerT_contra, channel: Channel):
         async with handle_channel_exc(channel):
-            params = [*inspect.signature(self.func).parameters.values()]
+            codec = channel.session.protocol.codec
+            dumps = self.dumps[codec]
             msg = await channel.read()
             async for content in self.func(
                 server,
                 channel.session,
-                converter.loads(msg.content, params[-1].annotation),
+                self.loads[codec](msg.content),
             ):
-                await channel.write(
-                    Message("", converter.dumps(content), MessageFlag.RESPONSE)
-                )
+                await channel.write(Message("", dumps(content), MessageFlag.RESPONSE))
             await channel.write(
                 Message("", b"", MessageFlag.RESPONSE | MessageFlag.END)
             )
@@ -147,6 +194,13 @@ class _StreamOutRoute(Generic[ServerT_contra, T, U]):
 @dataclass
 class _StreamInOutRoute(Generic[ServerT_contra, T, U]):
     func: Callable[[ServerT_contra, Session, AsyncIterator[T]], AsyncIterator[U]]
+    loads: dict[str, Callable[[Buffer], T]] = field(init=False)
+    dumps: dict[str, Callable[[U], bytes]] = field(init=False)
+
+    def __post_init__(self):
+        arg_type, return_type = _route_types(self.func)
+        self.loads = make_loads(get_args(arg_type)[0])
+        self.dumps = make_dumps(get_args(return_type)[0])
 
     async def __call__(
         self, session: Session, args: AsyncIterator[T]
@@ -156,15 +210,14 @@ class _StreamInOutRoute(Generic[ServerT_contra, T, U]):
 
     async def run(self, server: ServerT_contra, channel: Channel):
         async with handle_channel_exc(channel):
-            params = [*inspect.signature(self.func).parameters.values()]
+            codec = channel.session.protocol.codec
+            dumps = self.dumps[codec]
             async for content in self.func(
                 server,
                 channel.session,
-                gen_content_from_channel(channel, get_args(params[-1].annotation)[0]),
+                gen_content_from_channel(channel, self.loads[codec]),
             ):
-                await channel.write(
-                    Message("", converter.dumps(content), MessageFlag.RESPONSE)
-                )
+                await channel.write(Message("", dumps(content), MessageFlag.RESPONSE))
             await channel.write(
                 Message("", b"", MessageFlag.RESPONSE | MessageFlag.END)
             )
@@ -200,9 +253,14 @@ class Route:
 @dataclass
 class _Emit(Generic[ServerT_contra, T]):
     func: Callable[[ServerT_contra, Session, T], Awaitable[None]]
+    dumps: dict[str, Callable[[T], bytes]] = field(init=False)
+
+    def __post_init__(self):
+        self.dumps = make_dumps(_route_types(self.func)[0])
 
     def get_fake_emit(self, name: str):
         func = self.func
+        dumps = self.dumps
 
         @wraps(func)
         async def fake_emit(_self: ServerT_contra, session: Session, args: T) -> None:
@@ -210,7 +268,7 @@ class _Emit(Generic[ServerT_contra, T]):
                 await channel.write(
                     Message(
                         name,
-                        converter.dumps(args),
+                        dumps[session.protocol.codec](args),
                         MessageFlag.END,
                     )
                 )
@@ -243,6 +301,84 @@ class ServerMeta(type):
         return cls
 
 
+Frame = tuple[bytes, bytes, bytes]
+
+
+@dataclass(eq=False)
+class _Subscriber:
+    session: Session
+    on_drop: Callable[[Session], Any] | None
+    pending: deque[Frame] = field(default_factory=deque)
+    wakeup: asyncio.Event = field(default_factory=asyncio.Event)
+    closing: bool = False
+    task: asyncio.Task | None = None
+
+
+@dataclass(eq=False)
+class BroadcastStream:
+    # fans already encoded frames out to many sessions, each subscriber is
+    # written by its own task so the publisher never waits on a slow one, and a
+    # subscriber that falls max_pending frames behind is dropped
+    max_pending: int = 64
+    subscribers: dict[Session, _Subscriber] = field(init=False, default_factory=dict)
+    closing_tasks: set[asyncio.Task] = field(init=False, default_factory=set)
+
+    def __contains__(self, session: Session):
+        return session in self.subscribers
+
+    def subscribe(
+        self, session: Session, on_drop: Callable[[Session], Any] | None = None
+    ):
+        if session in self.subscribers:
+            return
+        subscriber = self.subscribers[session] = _Subscriber(session, on_drop)
+        subscriber.task = asyncio.create_task(self._write(subscriber))
+
+    def unsubscribe(self, session: Session):
+        if (subscriber := self.subscribers.pop(session, None)) is None:
+            return False
+        if subscriber.task is not None:
+            subscriber.task.cancel()
+        return True
+
+    def publish(self, encode: Callable[[Session], Frame]):
+        for subscriber in [*self.subscribers.values()]:
+            if len(subscriber.pending) >= self.max_pending:
+                self._drop(subscriber)
+                continue
+            subscriber.pending.append(encode(subscriber.session))
+            subscriber.wakeup.set()
+
+    def _drop(self, subscriber: _Subscriber):
+        log.info("DROP %s", subscriber.session.id)
+        self.unsubscribe(subscriber.session)
+        subscriber.pending.clear()
+        if subscriber.on_drop is not None:
+            subscriber.on_drop(subscriber.session)
+
+    async def _write(self, subscriber: _Subscriber):
+        writer = subscriber.session.writer
+        with contextlib.suppress(ConnectionError):
+            while True:
+                await subscriber.wakeup.wait()
+                subscriber.wakeup.clear()
+                while subscriber.pending:
+                    writer.writelines(subscriber.pending.popleft())
+                    await writer.drain()
+                if subscriber.closing:
+                    return
+
+    def close(self):
+        # frames already published are still written out, without waiting here
+        for subscriber in self.subscribers.values():
+            subscriber.closing = True
+            subscriber.wakeup.set()
+            if (task := subscriber.task) is not None:
+                self.closing_tasks.add(task)
+                task.add_done_callback(self.closing_tasks.discard)
+        self.subscribers.clear()
+
+
 @dataclass
 class Server(metaclass=ServerMeta):
     _default_routes: ClassVar[dict[str, _Route]] = dict()
@@ -253,8 +389,21 @@ class Server(metaclass=ServerMeta):
     session_leave_cbs: dict[UUID, list[Callable[[Session], Awaitable[Any]]]] = field(
         init=False, default_factory=dict
     )
+    session_tasks: set[asyncio.Task] = field(init=False, default_factory=set)
+    shutdown_cbs: list[Callable[[], Awaitable[Any]]] = field(
+        init=False, default_factory=list
+    )
+    protocol_version: ProtocolVersion = field(default=ProtocolVersion.V2, kw_only=True)
+    max_concurrent_routes: int = field(default=16, kw_only=True)
+    max_pending_routes: int = field(default=64, kw_only=True)
+    channel_window: int = field(default=32, kw_only=True)
+    # how long a closing session waits for its routes before cancelling them
+    close_timeout: float = field(default=5.0, kw_only=True)
+    # backends besides cbor2 are opt in, in order of preference
+    codecs: list[str] = field(default_factory=lambda: [DEFAULT_CODEC], kw_only=True)
 
     def __post_init__(self):
+        require(self.codecs)
         self.routes = self._default_routes.copy()
         self.emits = self._default_emits.copy()
 
@@ -264,6 +413,46 @@ class Server(metaclass=ServerMeta):
     def add_emit(self, name: str, emt: _Emit):
         self.emits[name] = emt
 
+    def broadcast_encoder(self, name: str, args: Any) -> Callable[[Session], Frame]:
+        dumps = self.emits[name].dumps
+        # sessions that would encode the frame identically share one buffer
+        channel_id = uuid4()
+        contents: dict[str, bytes] = {}
+        frames: dict[Any, Frame] = {}
+
+        def encode(session: Session):
+            key = session.broadcast_key(name)
+            if (frame := frames.get(key)) is None:
+                codec = session.protocol.codec
+                if (content := contents.get(codec)) is None:
+                    content = contents[codec] = dumps[codec](args)
+                frame = frames[key] = session.encode_broadcast(
+                    channel_id, Message(name, content, MessageFlag.END)
+                )
+            return frame
+
+        return encode
+
+    async def broadcast(
+        self,
+        name: str,
+        sessions: Iterable[Session],
+        args: Any,
+        streams: Iterable[BroadcastStream] = (),
+    ):
+        log.debug("BROADCAST %s %s", name, args)
+        encode = self.broadcast_encoder(name, args)
+        # streams are handed the same frames but are never waited on
+        for stream in streams:
+            stream.publish(encode)
+        writers: list[asyncio.StreamWriter] = []
+        for session in sessions:
+            session.writer.writelines(encode(session))
+            writers.append(session.writer)
+        for writer in writers:
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+
     def on_session_leave(
         self, session: Session, cb: Callable[[Session], Awaitable[Any]]
     ):
@@ -274,17 +463,91 @@ class Server(metaclass=ServerMeta):
     ):
         self.session_leave_cbs[session.id].remove(cb)
 
+    def on_shutdown(self, cb: Callable[[], Awaitable[Any]]):
+        self.shutdown_cbs.append(cb)
+
+    def off_shutdown(self, cb: Callable[[], Awaitable[Any]]):
+        self.shutdown_cbs.remove(cb)
+
+    async def handle_hello(self, session: Session, channel: Channel):
+        async with handle_channel_exc(channel):
+            msg = await channel.read()
+            hello = cbor2_codec.loads(msg.to_content(), Hello)
+            version = ProtocolVersion(min(hello.version, self.protocol_version))
+            window = min(hello.window, self.channel_window)
+            methods = [
+                method
+                for method in hello.methods
+                if method in self.routes or method in self.emits
+            ]
+            codec = negotiate(hello.codecs, self.codecs)
+            await channel.write(
+                Message(
+                    "hello",
+                    cbor2_codec.dumps(Hello(version, methods, window, [codec])),
+                    MessageFlag.RESPONSE | MessageFlag.END,
+                )
+            )
+            session.upgrade(
+                version, initiator=False, methods=methods, window=window, codec=codec
+            )
+
+    async def run_route(
+        self,
+        rte: _Route,
+        channel: Channel,
+        running: asyncio.Semaphore,
+        admitted: asyncio.Semaphore,
+    ):
+        try:
+            async with running:
+                await rte.run(self, channel)
+        finally:
+            admitted.release()
+
+    async def drain_session(
+        self, session: Session, channel: Channel, route_tasks: set[asyncio.Task]
+    ):
+        # runs beside the read loop, which keeps delivering the frames and
+        # window credits the routes wait on until they are done
+        if route_tasks:
+            _, pending = await asyncio.wait(route_tasks, timeout=self.close_timeout)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        await channel.write(Message("", b"", MessageFlag.RESPONSE | MessageFlag.END))
+        # the read loop ends once the peer has its answer and the stream closes
+        await session.writer.drain()
+        session.writer.close()
+
     async def handle_client(
         self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
     ):
-        session = Session(uuid4(), reader, writer)
+        await self.handle_session(Session(uuid4(), reader, writer))
+
+    def start_session(self, session: Session):
+        task = asyncio.create_task(self.handle_session(session))
+        self.session_tasks.add(task)
+        task.add_done_callback(self.session_tasks.discard)
+
+    async def handle_session(self, session: Session):
         self.sessions[session.id] = session
         self.session_leave_cbs[session.id] = list()
+        # routes run as their own tasks so the read loop keeps feeding other
+        # channels. the loop never waits for a route to finish, admitted routes
+        # may need it to deliver their window credits or later frames, so once
+        # too many are admitted new ones are turned away with an error
+        running = asyncio.Semaphore(self.max_concurrent_routes)
+        admitted = asyncio.Semaphore(
+            self.max_concurrent_routes + self.max_pending_routes
+        )
+        route_tasks = set[asyncio.Task]()
+        closing: asyncio.Task | None = None
         with session.create_channel() as channel:
             await channel.write(
                 Message(
                     "hello",
-                    converter.dumps(SessionId.from_session(session)),
+                    cbor2_codec.dumps(SessionId.from_session(session)),
                     MessageFlag.RESPONSE | MessageFlag.END,
                 )
             )
@@ -292,13 +555,39 @@ class Server(metaclass=ServerMeta):
             while True:
                 if channel_method := await session.read():
                     channel, msg_method = channel_method
-                    if msg_method == "close":
+                    if msg_method == "close" and closing is None:
+                        closing = asyncio.create_task(
+                            self.drain_session(session, channel, route_tasks)
+                        )
+                    elif closing is not None:
                         await channel.write(
-                            Message("", b"", MessageFlag.RESPONSE | MessageFlag.END)
+                            Message(
+                                "",
+                                b"session closing",
+                                MessageFlag.RESPONSE
+                                | MessageFlag.ERROR
+                                | MessageFlag.END,
+                            )
                         )
-                        break
-                    elif rte := self.routes.get(msg_method):
-                        await rte.run(self, channel)
+                    elif msg_method == "hello":
+                        await self.handle_hello(session, channel)
+                    elif (rte := self.routes.get(msg_method)) and admitted.locked():
+                        await channel.write(
+                            Message(
+                                "",
+                                b"too many routes",
+                                MessageFlag.RESPONSE
+                                | MessageFlag.ERROR
+                                | MessageFlag.END,
+                            )
+                        )
+                    elif rte:
+                        await admitted.acquire()
+                        task = asyncio.create_task(
+                            self.run_route(rte, channel, running, admitted)
+                        )
+                        route_tasks.add(task)
+                        task.add_done_callback(route_tasks.discard)
                     else:
                         await channel.write(
                             Message(
@@ -310,27 +599,73 @@ class Server(metaclass=ServerMeta):
                             )
                         )
                 else:
+                    # the peer is gone, nothing the routes send would arrive
+                    for task in route_tasks:
+                        task.cancel()
                     break
         except ConnectionError:
             pass
 
+        session.close_channels()
+        await asyncio.gather(*route_tasks, return_exceptions=True)
+        if closing is not None:
+            with contextlib.suppress(ConnectionError):
+                await closing
+
         for cb in reversed(self.session_leave_cbs[session.id]):
             await cb(session)
 
         with contextlib.suppress(ConnectionResetError):
-            await writer.drain()
-            writer.close()
+            await session.writer.drain()
+            session.writer.close()
         del self.session_leave_cbs[session.id]
         del self.sessions[session.id]
 
+    async def listen(
+        self,
+        host: str | Sequence[str] | None,
+        port: int | str | None,
+        ssl: ssl.SSLContext | None,  # pylint: disable=W0621
+        buffered: bool = False,
+        reuse_port: bool | None = None,
+    ) -> asyncio.Server:
+        if buffered:
+            server = await asyncio.get_running_loop().create_server(
+                lambda: FrameProtocol(self.start_session),
+                host,
+                port,
+                ssl=ssl,
+                reuse_port=reuse_port,
+            )
+        else:
+            server = await asyncio.start_server(
+                self.handle_client, host, port, ssl=ssl, reuse_port=reuse_port
+            )
+        log.info("server started on %s:%s", host, port)
+        return server
+
+    async def serve(self, *servers: asyncio.Server):
+        # every listener shares the sessions and the shutdown hooks, when one
+        # of them fails the rest are closed too
+        try:
+            with contextlib.suppress(asyncio.CancelledError):
+                async with contextlib.AsyncExitStack() as stack:
+                    for server in servers:
+                        await stack.enter_async_context(server)
+                    async with asyncio.TaskGroup() as tg:
+                        for server in servers:
+                            tg.create_task(server.serve_forever())
+        finally:
+            # runs once the listeners are gone, also when serve is cancelled
+            for cb in reversed(self.shutdown_cbs):
+                await cb()
+
     async def run(
         self,
         host: str | Sequence[str] | None,
         port: int | str | None,
         ssl: ssl.SSLContext | None,  # pylint: disable=W0621
+        buffered: bool = False,
+        reuse_port: bool | None = None,
     ):
-        server = await asyncio.start_server(self.handle_client, host, port, ssl=ssl)
-        log.info("server started on %s:%s", host, port)
-        with contextlib.suppress(asyncio.CancelledError):
-            async with server:
-                await server.serve_forever()
+        await self.serve(await self.listen(host, port, ssl, buffered, reuse_port))
@@ -1,14 +1,35 @@
 import asyncio
-from enum import IntFlag, auto
+from enum import IntEnum, IntFlag, auto
 from dataclasses import dataclass, field
 import logging
+import struct
+from typing import TYPE_CHECKING
 from uuid import UUID, uuid4
 
+from .codec import DEFAULT_CODEC, Buffer
+
+if TYPE_CHECKING:
+    from .transport import FrameProtocol, FrameWriter
+
 log = logging.getLogger(__name__)
 
 PROTOCOL_NAME = b"tsocket\x00\x00\x00\x00\x00\x00\x00\x00\x00"
 PROTOCOL_VER = b"\x00\x00\x00\x00\x00\x01\x00\x00"
 
+# name, version, channel id, flag, method size, content size
+PROTOCOL_HEADER = struct.Struct(">16s8s16sQQQ")
+
+# v2 frames start with this bit set on the flag byte, v1 frames start with "t"
+PROTOCOL_V2_MARKER = 0x80
+# set when the v2 method field is an index into the session method table
+PROTOCOL_V2_METHOD_ID = 0x40
+PROTOCOL_V2_FLAGS = 0x3F
+
+
+class ProtocolVersion(IntEnum):
+    V1 = 1
+    V2 = 2
+
 
 class ConnectedError(Exception):
     pass
@@ -26,11 +47,16 @@ class RespondRequestError(Exception):
     pass
 
 
+class ProtocolError(Exception):
+    pass
+
+
 class MessageFlag(IntFlag):
     NONE = 0
     RESPONSE = auto()
     ERROR = auto()
     END = auto()
+    WINDOW = auto()
 
 
 @dataclass
@@ -42,20 +68,161 @@ class ResponseError(Exception):
 @dataclass
 class Message:
     method: str
-    content: bytes
+    content: Buffer
     flag: MessageFlag = field(default=MessageFlag.END)
 
     def to_content(self):
         if MessageFlag.ERROR in self.flag:
-            raise ResponseError(self.method, self.content)
+            raise ResponseError(self.method, bytes(self.content))
         return self.content
 
 
+_VARINTS = [bytes((i,)) for i in range(0x80)]
+
+
+def encode_varint(value: int) -> bytes:
+    if value < 0x80:
+        return _VARINTS[value]
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+async def read_varint(reader: asyncio.StreamReader) -> int:
+    value = 0
+    shift = 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+        shift += 7
+
+
+def decode_varint(data: memoryview, pos: int) -> tuple[int, int] | None:
+    value = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+    return None
+
+
+def encode_frame(channel_id: UUID, msg: Message) -> tuple[bytes, bytes, bytes]:
+    msg_method_bytes = msg.method.encode()
+    header = PROTOCOL_HEADER.pack(
+        PROTOCOL_NAME,
+        PROTOCOL_VER,
+        channel_id.bytes,
+        msg.flag,
+        len(msg_method_bytes),
+        len(msg.content),
+    )
+    return header, msg_method_bytes, msg.content
+
+
+def encode_frame_v2(
+    channel_index: int, msg: Message, method_ids: dict[str, int]
+) -> tuple[bytes, bytes, bytes]:
+    if (method_id := method_ids.get(msg.method)) is not None:
+        flag_byte = PROTOCOL_V2_MARKER | PROTOCOL_V2_METHOD_ID | msg.flag
+        method_field = method_id
+        msg_method_bytes = b""
+    else:
+        flag_byte = PROTOCOL_V2_MARKER | msg.flag
+        msg_method_bytes = msg.method.encode()
+        method_field = len(msg_method_bytes)
+    header = b"".join(
+        (
+            bytes((flag_byte,)),
+            encode_varint(channel_index),
+            encode_varint(method_field),
+            encode_varint(len(msg.content)),
+        )
+    )
+    return header, msg_method_bytes, msg.content
+
+
+def decode_frame(
+    data: memoryview, methods: list[str]
+) -> tuple[int, UUID | None, int, MessageFlag, str, memoryview] | None:
+    # returns the frame size and fields, the content is a view into data
+    # None means data does not hold a whole frame yet
+    if not data:
+        return None
+    head = data[0]
+    if head & PROTOCOL_V2_MARKER:
+        pos = 1
+        fields = []
+        for _ in range(3):
+            if (varint := decode_varint(data, pos)) is None:
+                return None
+            value, pos = varint
+            fields.append(value)
+        channel_index, method_field, msg_content_size = fields
+        if head & PROTOCOL_V2_METHOD_ID:
+            if method_field >= len(methods):
+                raise ProtocolError(f"unknown method id {method_field}")
+            msg_method = methods[method_field]
+        else:
+            if len(data) < pos + method_field:
+                return None
+            msg_method = str(data[pos : pos + method_field], "utf-8")
+            pos += method_field
+        end = pos + msg_content_size
+        if len(data) < end:
+            return None
+        return (
+            end,
+            None,
+            channel_index,
+            MessageFlag(head & PROTOCOL_V2_FLAGS),
+            msg_method,
+            data[pos:end],
+        )
+    if len(data) < PROTOCOL_HEADER.size:
+        return None
+    (
+        proto_name,
+        proto_ver,
+        channel_id_bytes,
+        msg_flag,
+        msg_method_size,
+        msg_content_size,
+    ) = PROTOCOL_HEADER.unpack_from(data)
+    if proto_name != PROTOCOL_NAME or proto_ver != PROTOCOL_VER:
+        raise ProtocolError("bad protocol header")
+    pos = PROTOCOL_HEADER.size + msg_method_size
+    end = pos + msg_content_size
+    if len(data) < end:
+        return None
+    return (
+        end,
+        UUID(bytes=channel_id_bytes),
+        0,
+        MessageFlag(msg_flag),
+        str(data[PROTOCOL_HEADER.size : pos], "utf-8"),
+        data[pos:end],
+    )
+
+
 @dataclass
 class Channel:
     session: "Session"
     id: UUID = field(default_factory=uuid4)  # pylint: disable=C0103
     queue: asyncio.Queue[Message] = field(default_factory=asyncio.Queue)
+    index: int = field(default=0)
+    credit: int = field(default=0)
+    credit_event: asyncio.Event = field(default_factory=asyncio.Event)
+    consumed: int = field(default=0)
+    closed: bool = field(default=False)
 
     def __enter__(self):
         return self
@@ -63,83 +230,224 @@ class Channel:
     def __exit__(self, exc_type, exc_value, exc_tb):
         self.session.destroy_channel(self)
 
+    def encode(self, msg: Message):
+        if self.index:
+            return encode_frame_v2(self.index, msg, self.session.protocol.method_ids)
+        return encode_frame(self.id, msg)
+
+    def grant(self, credit: int):
+        self.credit += credit
+        self.credit_event.set()
+
+    def close(self):
+        self.closed = True
+        self.credit_event.set()
+        self.queue.put_nowait(
+            Message(
+                "",
+                b"disconnected",
+                MessageFlag.RESPONSE | MessageFlag.ERROR | MessageFlag.END,
+            )
+        )
+
     async def write(self, msg: Message):
+        if self.session.protocol.window and MessageFlag.WINDOW not in msg.flag:
+            # wait for the peer to make room in its queue for this channel
+            while self.credit <= 0 and not self.closed:
+                self.credit_event.clear()
+                await self.credit_event.wait()
+            self.credit -= 1
         log.debug("SEND %s: %s %s %s", self.id, msg.flag, msg.method, msg.content)
         if MessageFlag.RESPONSE in msg.flag:
             if MessageFlag.END in msg.flag or MessageFlag.ERROR in msg.flag:
                 self.session.destroy_channel(self)
-        msg_method_bytes = msg.method.encode()
-        self.session.writer.write(PROTOCOL_NAME)
-        self.session.writer.write(PROTOCOL_VER)
-        self.session.writer.write(self.id.bytes)
-        self.session.writer.write(msg.flag.to_bytes(8))
-        self.session.writer.write(len(msg_method_bytes).to_bytes(8))
-        self.session.writer.write(len(msg.content).to_bytes(8))
-        self.session.writer.write(msg_method_bytes)
-        self.session.writer.write(msg.content)
+        self.session.writer.writelines(self.encode(msg))
         await self.session.writer.drain()
 
     async def read(self):
         msg = await self.queue.get()
         log.debug("RECV %s: %s %s %s", self.id, msg.flag, msg.method, msg.content)
+        if (window := self.session.protocol.window) and MessageFlag.END not in msg.flag:
+            self.consumed += 1
+            if self.consumed >= max(window // 2, 1):
+                consumed, self.consumed = self.consumed, 0
+                await self.write(Message("", consumed.to_bytes(4), MessageFlag.WINDOW))
         return msg
 
 
+@dataclass
+class SessionProtocol:
+    version: ProtocolVersion = field(default=ProtocolVersion.V1)
+    next_index: int = field(default=0)
+    methods: list[str] = field(default_factory=list)
+    method_ids: dict[str, int] = field(default_factory=dict)
+    # messages a channel may have queued at the receiver, 0 disables flow control
+    window: int = field(default=0)
+    codec: str = field(default=DEFAULT_CODEC)
+
+    def allocate_index(self):
+        # v2 channel indices are odd for the connecting side and even for the
+        # accepting side so both ends can open channels without colliding
+        if self.version < ProtocolVersion.V2:
+            return 0
+        index = self.next_index
+        self.next_index += 2
+        return index
+
+
 @dataclass(eq=True, frozen=True)
 class Session:
     id: UUID  # pylint: disable=C0103
-    reader: asyncio.StreamReader = field(hash=False, compare=False)
-    writer: asyncio.StreamWriter = field(hash=False, compare=False)
+    reader: "asyncio.StreamReader | FrameProtocol" = field(hash=False, compare=False)
+    writer: "asyncio.StreamWriter | FrameWriter" = field(hash=False, compare=False)
     channels: dict[UUID, Channel] = field(
         default_factory=dict, hash=False, compare=False
     )
+    channel_indices: dict[int, Channel] = field(
+        default_factory=dict, hash=False, compare=False
+    )
+    protocol: SessionProtocol = field(
+        default_factory=SessionProtocol, hash=False, compare=False
+    )
 
-    def create_channel(self):
-        channel = Channel(self)
+    def upgrade(
+        self,
+        version: ProtocolVersion,
+        initiator: bool,
+        methods: list[str],
+        window: int,
+        codec: str = DEFAULT_CODEC,
+    ):
+        self.protocol.version = version
+        self.protocol.next_index = 1 if initiator else 2
+        self.protocol.methods = methods
+        self.protocol.method_ids = {method: i for i, method in enumerate(methods)}
+        self.protocol.window = window
+        self.protocol.codec = codec
+
+    def broadcast_key(self, method: str):
+        if self.protocol.version < ProtocolVersion.V2:
+            return self.protocol.codec, None
+        return self.protocol.codec, self.protocol.method_ids.get(method, -1)
+
+    def encode_broadcast(self, channel_id: UUID, msg: Message):
+        # one-shot frames that nobody answers, v2 sends them on channel index 0
+        if self.protocol.version < ProtocolVersion.V2:
+            return encode_frame(channel_id, msg)
+        return encode_frame_v2(0, msg, self.protocol.method_ids)
+
+    def _new_channel(self, channel_id: UUID, index: int):
+        channel = Channel(self, channel_id, index=index, credit=self.protocol.window)
         self.channels[channel.id] = channel
+        if channel.index:
+            self.channel_indices[channel.index] = channel
         return channel
 
+    def create_channel(self):
+        return self._new_channel(uuid4(), self.protocol.allocate_index())
+
     def destroy_channel(self, channel: Channel):
         self.channels.pop(channel.id, None)
+        if channel.index:
+            self.channel_indices.pop(channel.index, None)
+
+    def close_channels(self):
+        for channel in [*self.channels.values()]:
+            self.destroy_channel(channel)
+            channel.close()
+
+    def _deliver(self, channel: Channel, msg: Message):
+        if self.protocol.window and channel.queue.qsize() >= self.protocol.window:
+            log.warning("OVERFLOW %s: %s %s", channel.id, msg.flag, msg.method)
+            return False
+        channel.queue.put_nowait(msg)
+        return True
+
+    async def _read_frame(self, reader: asyncio.StreamReader):
+        head = await reader.readexactly(1)
+        if head[0] & PROTOCOL_V2_MARKER:
+            msg_flag = MessageFlag(head[0] & PROTOCOL_V2_FLAGS)
+            channel_index = await read_varint(reader)
+            method_field = await read_varint(reader)
+            msg_content_size = await read_varint(reader)
+            if head[0] & PROTOCOL_V2_METHOD_ID:
+                if method_field >= len(self.protocol.methods):
+                    raise ProtocolError(f"unknown method id {method_field}")
+                msg_method = self.protocol.methods[method_field]
+            else:
+                msg_method = (await reader.readexactly(method_field)).decode()
+            msg_content = await reader.readexactly(msg_content_size)
+            return None, channel_index, msg_flag, msg_method, msg_content
+        (
+            proto_name,
+            proto_ver,
+            channel_id_bytes,
+            msg_flag,
+            msg_method_size,
+            msg_content_size,
+        ) = PROTOCOL_HEADER.unpack(
+            head + await reader.readexactly(PROTOCOL_HEADER.size - 1)
+        )
+        if proto_name != PROTOCOL_NAME or proto_ver != PROTOCOL_VER:
+            raise ProtocolError("bad protocol header")
+        msg_method = (await reader.readexactly(msg_method_size)).decode()
+        msg_content = await reader.readexactly(msg_content_size)
+        return (
+            UUID(bytes=channel_id_bytes),
+            0,
+            MessageFlag(msg_flag),
+            msg_method,
+            msg_content,
+        )
+
+    def receive(
+        self,
+        channel_id: UUID | None,
+        channel_index: int,
+        msg_flag: MessageFlag,
+        msg_method: str,
+        msg_content: Buffer,
+    ):
+        # returns the channel and method of a frame that opened a new channel
+        if channel_id is not None:
+            channel = self.channels.get(channel_id)
+        else:
+            channel = self.channel_indices.get(channel_index)
+        if MessageFlag.WINDOW in msg_flag:
+            if channel is not None:
+                channel.grant(int.from_bytes(msg_content))
+        elif channel is not None:
+            if not self._deliver(channel, Message(msg_method, msg_content, msg_flag)):
+                raise ProtocolError(f"channel {channel.id} overflowed")
+            if MessageFlag.RESPONSE in msg_flag:
+                if MessageFlag.END in msg_flag or MessageFlag.ERROR in msg_flag:
+                    self.destroy_channel(channel)
+        elif MessageFlag.RESPONSE not in msg_flag:
+            channel = self._new_channel(
+                channel_id if channel_id is not None else uuid4(),
+                channel_index,
+            )
+            self._deliver(channel, Message(msg_method, msg_content, msg_flag))
+            return channel, msg_method
+        else:
+            log.warning(
+                "DROP %s: %s %s %s",
+                channel_id if channel_id is not None else channel_index,
+                msg_flag,
+                msg_method,
+                msg_content,
+            )
+        return None
 
     async def read(self):
+        if not isinstance(self.reader, asyncio.StreamReader):
+            # frames are parsed and dispatched by the transport as they arrive
+            return await self.reader.read_channel()
         while True:
             try:
-                proto_name = await self.reader.readexactly(16)
-                if proto_name != PROTOCOL_NAME:
-                    return None
-                proto_ver = await self.reader.readexactly(8)
-                if proto_ver != PROTOCOL_VER:
-                    return None
-                channel_id_bytes = await self.reader.readexactly(16)
-                channel_id = UUID(bytes=channel_id_bytes)
-                msg_flag_bytes = await self.reader.readexactly(8)
-                msg_flag = MessageFlag.from_bytes(msg_flag_bytes)
-                msg_method_size_bytes = await self.reader.readexactly(8)
-                msg_method_size = int.from_bytes(msg_method_size_bytes)
-                msg_content_size_bytes = await self.reader.readexactly(8)
-                msg_content_size = int.from_bytes(msg_content_size_bytes)
-                msg_method = (await self.reader.readexactly(msg_method_size)).decode()
-                msg_content = await self.reader.readexactly(msg_content_size)
-                if channel := self.channels.get(channel_id):
-                    await channel.queue.put(Message(msg_method, msg_content, msg_flag))
-                    if MessageFlag.RESPONSE in msg_flag:
-                        if MessageFlag.END in msg_flag or MessageFlag.ERROR in msg_flag:
-                            self.destroy_channel(channel)
-                elif MessageFlag.RESPONSE not in msg_flag:
-                    channel = Channel(self, channel_id)
-                    await channel.queue.put(Message(msg_method, msg_content, msg_flag))
-                    self.channels[channel.id] = channel
-                    return channel, msg_method
-                else:
-                    log.warning(
-                        "DROP %s: %s %s %s",
-                        channel_id,
-                        msg_flag,
-                        msg_method,
-                        msg_content,
-                    )
-            except asyncio.exceptions.IncompleteReadError:
+                if channel_method := self.receive(*await self._read_frame(self.reader)):
+                    return channel_method
+            except (asyncio.exceptions.IncompleteReadError, ProtocolError):
                 return None
 
 
@@ -155,3 +463,11 @@ class SessionId:
 @dataclass
 class Empty:
     pass
+
+
+@dataclass
+class Hello:
+    version: int
+    methods: list[str] = field(default_factory=list)
+    window: int = field(default=0)
+    codecs: list[str] = field(default_factory=list)
@@ -0,0 +1,154 @@
+import asyncio
+from collections.abc import Callable, Iterable
+from collections import deque
+import logging
+from typing import Any
+from uuid import uuid4
+
+from .codec import Buffer
+from .shared import Channel, ProtocolError, Session, decode_frame
+
+log = logging.getLogger(__name__)
+
+BUFFER_SIZE = 1 << 16
+MIN_READ = 1 << 12
+
+
+class FrameWriter:
+    def __init__(self, transport: asyncio.Transport, protocol: "FrameProtocol"):
+        self.transport = transport
+        self.protocol = protocol
+
+    def write(self, data: Buffer):
+        self.transport.write(data)
+
+    def writelines(self, data: Iterable[Buffer]):
+        self.transport.writelines(data)
+
+    async def drain(self):
+        await self.protocol.drain()
+
+    def can_write_eof(self):
+        return self.transport.can_write_eof()
+
+    def write_eof(self):
+        self.transport.write_eof()
+
+    def is_closing(self):
+        return self.transport.is_closing()
+
+    def close(self):
+        self.transport.close()
+
+    async def wait_closed(self):
+        await self.protocol.closed
+
+    def get_extra_info(self, name: str, default: Any = None):
+        return self.transport.get_extra_info(name, default)
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    # parses frames straight out of the receive buffer and hands them to the
+    # session as they arrive, the content of a message is a memoryview into it
+
+    def __init__(
+        self,
+        on_session: Callable[[Session], Any] | None = None,
+        max_incoming: int = 64,
+    ):
+        self.on_session = on_session
+        self.max_incoming = max_incoming
+        self.session: Session | None = None
+        self.transport: asyncio.Transport | None = None
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.start = 0
+        self.end = 0
+        self.incoming: asyncio.Queue[tuple[Channel, str] | None] = asyncio.Queue()
+        self.reading_paused = False
+        self.writing_paused = False
+        self.drain_waiters: deque[asyncio.Future[None]] = deque()
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport: asyncio.BaseTransport):
+        assert isinstance(transport, asyncio.Transport)
+        self.transport = transport
+        self.session = Session(uuid4(), self, FrameWriter(transport, self))
+        if self.on_session is not None:
+            self.on_session(self.session)
+
+    def connection_lost(self, exc: Exception | None):
+        self.incoming.put_nowait(None)
+        while self.drain_waiters:
+            waiter = self.drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(exc or ConnectionResetError("Connection lost"))
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def get_buffer(self, sizehint: int):
+        wanted = max(sizehint, MIN_READ)
+        if len(self.buffer) - self.end < wanted:
+            # earlier payloads may still be referenced by queued messages, so
+            # the unparsed tail moves to a fresh buffer instead of compacting
+            pending = self.end - self.start
+            buffer = bytearray(max(BUFFER_SIZE, (pending + wanted) * 2))
+            buffer[:pending] = self.buffer[self.start : self.end]
+            self.buffer = buffer
+            self.start = 0
+            self.end = pending
+        return memoryview(self.buffer)[self.end :]
+
+    def buffer_updated(self, nbytes: int):
+        self.end += nbytes
+        session = self.session
+        assert session is not None
+        data = memoryview(self.buffer)[: self.end]
+        try:
+            while (
+                frame := decode_frame(data[self.start :], session.protocol.methods)
+            ) is not None:
+                size, *fields = frame
+                self.start += size
+                if channel_method := session.receive(*fields):
+                    self.incoming.put_nowait(channel_method)
+        except ProtocolError as err:
+            log.warning("CLOSE %s: %s", session.id, err)
+            self.start = self.end
+            self.transport.close()
+        finally:
+            data.release()
+        if not self.reading_paused and self.incoming.qsize() >= self.max_incoming:
+            self.reading_paused = True
+            self.transport.pause_reading()
+
+    def eof_received(self):
+        return None
+
+    def pause_writing(self):
+        self.writing_paused = True
+
+    def resume_writing(self):
+        self.writing_paused = False
+        while self.drain_waiters:
+            waiter = self.drain_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def drain(self):
+        if self.transport.is_closing():
+            # let connection_lost run before the next write fails
+            await asyncio.sleep(0)
+            if self.closed.done():
+                raise ConnectionResetError("Connection lost")
+        if not self.writing_paused:
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.drain_waiters.append(waiter)
+        await waiter
+
+    async def read_channel(self):
+        channel_method = await self.incoming.get()
+        if self.reading_paused and self.incoming.qsize() < self.max_incoming // 2:
+            self.reading_paused = False
+            self.transport.resume_reading()
+        return channel_method
@@ -51,6 +51,10 @@ class BattleshipClient(Client):
     def on_room_delete(self) -> AsyncIterator[Empty]:
         raise NotImplementedError()
 
+    @subscribe
+    def on_room_move(self) -> AsyncIterator[models.RoomInfo]:
+        raise NotImplementedError()
+
     @subscribe
     def on_room_player_ready(self) -> AsyncIterator[models.PlayerId]:
         raise NotImplementedError()
@@ -95,6 +99,10 @@ class BattleshipClient(Client):
     def on_game_reset(self) -> AsyncIterator[Empty]:
         raise NotImplementedError()
 
+    @subscribe
+    def on_room_spectate_drop(self) -> AsyncIterator[models.RoomId]:
+        raise NotImplementedError()
+
     @subscribe
     def on_emote_display(self) -> AsyncIterator[models.EmoteDisplayData]:
         raise NotImplementedError()
@@ -115,6 +123,14 @@ class BattleshipClient(Client):
     async def room_surrender(self, args: models.RoomId) -> Empty:
         raise NotImplementedError()
 
+    @Route.simple
+    async def room_spectate(self, args: models.RoomId) -> models.RoomInfo:
+        raise NotImplementedError()
+
+    @Route.simple
+    async def room_spectate_leave(self, args: models.RoomId) -> Empty:
+        raise NotImplementedError()
+
     @Route.simple
     async def private_room_create(
         self, args: models.BearingPlayerAuth
@@ -143,6 +159,10 @@ class BattleshipClient(Client):
     async def shot_submit(self, args: models.ShotSubmitArgs) -> models.ShotResult:
         raise NotImplementedError()
 
+    @Route.simple
+    async def game_view_get(self, args: models.GameViewArgs) -> models.GameView:
+        raise NotImplementedError()
+
     @Route.simple
     async def emote_display(self, args: models.EmoteDisplayArgs) -> Empty:
         raise NotImplementedError()
@@ -12,8 +12,7 @@ from tgraphics.style import *
 
 from .. import store
 from ..component import game_end_overlay
-from ...shared import models, shot_type, avatar_type
-from ...shared.utils import add, mat_mul_vec
+from ...shared import geometry, models, shot_type, avatar_type
 
 
 def _expect_index_error(func, default):
@@ -100,18 +99,9 @@ def game(**kwargs):
 
     current_shot_placement = computed(
         lambda: (
-            {
-                add(
-                    unref(hover_index),
-                    mat_mul_vec(
-                        shot_type.ORIENTATIONS[unref(orientation)],
-                        offset,
-                    ),
-                ): sprite
-                for offset, sprite in shot_type.SHOT_VARIANTS[
-                    _current_shot_type_id.id
-                ].placement_offsets.items()
-            }
+            geometry.shot_footprint(
+                _current_shot_type_id, unref(orientation)
+            ).placement(unref(hover_index))
             if (
                 not unref(not_submitable)
                 and ((_current_shot_type_id := unref(current_shot_type_id)) is not None)
@@ -121,16 +111,12 @@ def game(**kwargs):
     )
 
     def check_shot_placement():
-        _current_shot_placement = unref(current_shot_placement)
-        if not _current_shot_placement:
+        if not unref(current_shot_placement):
             return False
-        for col, row in _current_shot_placement.keys():
-            _current_grid = unref(current_grid)
-            if col < 0 or col >= len(_current_grid):
-                return False
-            if row < 0 or row >= len(_current_grid[col]):
-                return False
-        return True
+        _current_grid = unref(current_grid)
+        return geometry.shot_footprint(
+            unref(current_shot_type_id), unref(orientation)
+        ).in_bounds(unref(hover_index), len(_current_grid), len(_current_grid[0]))
 
     current_shot_placement_legal = computed(check_shot_placement)
 
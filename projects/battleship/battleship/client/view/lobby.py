@@ -53,6 +53,20 @@ def lobby(**kwargs):
                     )
                     store.game.ready_players.trigger()
 
+    async def subscribe_room_move():
+        # matchmaking merged this room into another, readies do not carry over
+        if (client := unref(store.ctx.client)) is not None:
+            async for room in client.on_room_move():
+                store.game.room.value = models.RoomId.from_room_info(room)
+                store.game.players.value = {
+                    models.PlayerId.from_player_info(player_info): player_info
+                    for player_info in room.players
+                }
+                store.game.ready_players.value.clear()
+                store.game.ready_players.value.update(room.readies)
+                store.game.ready_players.trigger()
+                ready.value = False
+
     async def subscribe_room_player_ready():
         if (client := unref(store.ctx.client)) is not None:
             async for player_id in client.on_room_player_ready():
@@ -83,6 +97,7 @@ def lobby(**kwargs):
             [
                 asyncio.create_task(subscribe_player_join()),
                 asyncio.create_task(subscribe_player_leave()),
+                asyncio.create_task(subscribe_room_move()),
                 asyncio.create_task(subscribe_room_player_ready()),
                 asyncio.create_task(subscribe_room_ready()),
                 asyncio.create_task(store.game.subscribe_emote_display()),
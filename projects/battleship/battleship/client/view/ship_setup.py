@@ -13,8 +13,7 @@ from tgraphics.style import *
 
 from .. import store
 from ..component import game_end_overlay
-from ...shared import models, ship_type, avatar_type
-from ...shared.utils import add, mat_mul_vec
+from ...shared import geometry, models, avatar_type
 
 
 def _expect_index_error(func, default):
@@ -97,18 +96,9 @@ def ship_setup(**kwargs):
 
     current_placement = computed(
         lambda: (
-            {
-                add(
-                    unref(hover_index),
-                    mat_mul_vec(
-                        ship_type.ORIENTATIONS[_current_ship.orientation],
-                        offset,
-                    ),
-                ): sprite
-                for offset, sprite in ship_type.SHIP_VARIANTS[
-                    _current_ship.ship_variant.id
-                ].placement_offsets.items()
-            }
+            geometry.ship_footprint(
+                _current_ship.ship_variant, _current_ship.orientation
+            ).placement(unref(hover_index))
             if (_current_ship := unref(current_ship)) is not None
             else {}
         )
@@ -117,11 +107,13 @@ def ship_setup(**kwargs):
     def check_placement():
         if (_player_grid := unref(player_grid)) is None:
             return False
+        if (_current_ship := unref(current_ship)) is None:
+            return True
+        if not geometry.ship_footprint(
+            _current_ship.ship_variant, _current_ship.orientation
+        ).in_bounds(unref(hover_index), len(_player_grid), len(_player_grid[0])):
+            return False
         for col, row in unref(current_placement):
-            if col < 0 or col >= len(_player_grid):
-                return False
-            if row < 0 or row >= len(_player_grid[col]):
-                return False
             if not isinstance(unref(_player_grid[col][row]), models.EmptyTile):
                 return False
         return True
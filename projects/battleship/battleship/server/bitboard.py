@@ -0,0 +1,105 @@
+from dataclasses import dataclass, field
+from uuid import UUID
+
+from ..shared import models
+
+
+@dataclass
+class BitBoard:
+    # server side copy of a models.Board, every layer is an int with one bit
+    # per tile at col * height + row
+    id: UUID  # pylint: disable=C0103
+    player: models.PlayerId
+    room: models.RoomId
+    width: int
+    height: int
+    ship: list[models.Ship]
+    ships: int = 0
+    obstacles: int = 0
+    mines: int = 0
+    hits: int = 0
+    tile_ships: dict[int, models.ShipId | None] = field(default_factory=dict)
+    tile_obstacles: dict[int, models.ObstacleVariantId] = field(default_factory=dict)
+    tile_mines: dict[int, models.MineVariantId] = field(default_factory=dict)
+    ship_remaining: dict[models.ShipId | None, int] = field(default_factory=dict)
+    remaining: int = 0
+
+    @classmethod
+    def from_board(cls, board: models.Board):
+        bitboard = cls(
+            board.id,
+            board.player,
+            board.room,
+            len(board.grid),
+            len(board.grid[0]) if board.grid else 0,
+            board.ship,
+        )
+        for col, tiles in enumerate(board.grid):
+            for row, tile in enumerate(tiles):
+                cell = col * bitboard.height + row
+                bit = 1 << cell
+                match tile:
+                    case models.ShipTile():
+                        bitboard.ships |= bit
+                        bitboard.tile_ships[cell] = tile.ship
+                        if not tile.hit:
+                            bitboard.ship_remaining[tile.ship] = (
+                                bitboard.ship_remaining.get(tile.ship, 0) + 1
+                            )
+                            bitboard.remaining += 1
+                    case models.ObstacleTile():
+                        bitboard.obstacles |= bit
+                        bitboard.tile_obstacles[cell] = tile.obstacle_variant
+                    case models.MineTile():
+                        bitboard.mines |= bit
+                        bitboard.tile_mines[cell] = tile.mine_variant
+                if tile.hit:
+                    bitboard.hits |= bit
+        return bitboard
+
+    def to_board(self):
+        return models.Board(
+            self.id,
+            self.player,
+            self.room,
+            [
+                [self.tile(col * self.height + row) for row in range(self.height)]
+                for col in range(self.width)
+            ],
+            self.ship,
+        )
+
+    def cell(self, col: int, row: int):
+        if 0 <= col < self.width and 0 <= row < self.height:
+            return col * self.height + row
+        return None
+
+    def is_hit(self, cell: int):
+        return bool(self.hits >> cell & 1)
+
+    def tile(self, cell: int):
+        hit = self.is_hit(cell)
+        bit = 1 << cell
+        if self.ships & bit:
+            return models.ShipTile(self.tile_ships[cell], hit)
+        if self.obstacles & bit:
+            return models.ObstacleTile(self.tile_obstacles[cell], hit)
+        if self.mines & bit:
+            return models.MineTile(self.tile_mines[cell], hit)
+        return models.EmptyTile(hit)
+
+    def hit(self, cell: int):
+        bit = 1 << cell
+        if self.hits & bit:
+            return
+        self.hits |= bit
+        if self.ships & bit:
+            self.ship_remaining[self.tile_ships[cell]] -= 1
+            self.remaining -= 1
+
+    def is_sunk(self, ship: models.ShipId):
+        return not self.ship_remaining.get(ship, 0)
+
+    @property
+    def lost(self):
+        return not self.remaining
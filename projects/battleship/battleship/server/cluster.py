@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+import logging
+import multiprocessing
+import os
+import signal
+import ssl
+
+from dotenv import load_dotenv
+from tsocket.client import Client, Route as ClientRoute
+from tsocket.server import Server, Route
+from tsocket.shared import Empty, Session
+
+from . import db
+from .directory import (
+    LocalRoomDirectory,
+    MatchMergeQuery,
+    MatchMove,
+    MatchQuery,
+    MatchRoom,
+    RoomPlacement,
+)
+from .server import BattleshipServer
+from ..shared import models
+from ..shared.logging import setup_logging
+
+log = logging.getLogger(__name__)
+
+
+def create_ssl_context():
+    ssl_context = ssl.create_default_context(purpose=ssl.Purpose.CLIENT_AUTH)
+    ssl_context.load_cert_chain(os.environ["SSL_CERT"], os.environ["SSL_KEY"])
+    return ssl_context
+
+
+@dataclass
+class Coordinator(Server):
+    # owns the tables every worker has to agree on, the rooms themselves stay
+    # on the worker that created them
+    directory: LocalRoomDirectory = field(default_factory=LocalRoomDirectory)
+
+    @Route.simple
+    async def match_take(self, _session: Session, args: MatchQuery) -> MatchRoom | None:
+        return await self.directory.match_take(args)
+
+    @Route.simple
+    async def match_put(self, _session: Session, args: MatchRoom) -> Empty:
+        await self.directory.match_put(args)
+        return Empty()
+
+    @Route.simple
+    async def match_merge(
+        self, _session: Session, args: MatchMergeQuery
+    ) -> list[MatchMove]:
+        return await self.directory.match_merge(args)
+
+    @Route.simple
+    async def private_code_create(self, _session: Session, args: RoomPlacement) -> str:
+        return await self.directory.private_code_create(args)
+
+    @Route.simple
+    async def private_code_get(
+        self, _session: Session, args: str
+    ) -> RoomPlacement | None:
+        return await self.directory.private_code_get(args)
+
+    @Route.simple
+    async def room_close(self, _session: Session, args: models.RoomId) -> Empty:
+        await self.directory.room_close(args)
+        return Empty()
+
+
+@dataclass
+class CoordinatorClient(Client):
+    @ClientRoute.simple
+    async def match_take(self, args: MatchQuery) -> MatchRoom | None:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def match_put(self, args: MatchRoom) -> Empty:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def match_merge(self, args: MatchMergeQuery) -> list[MatchMove]:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def private_code_create(self, args: RoomPlacement) -> str:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def private_code_get(self, args: str) -> RoomPlacement | None:
+        raise NotImplementedError()
+
+    @ClientRoute.simple
+    async def room_close(self, args: models.RoomId) -> Empty:
+        raise NotImplementedError()
+
+
+@dataclass
+class CoordinatorRoomDirectory:
+    client: CoordinatorClient
+
+    async def match_take(self, query: MatchQuery) -> MatchRoom | None:
+        return await self.client.match_take(query)
+
+    async def match_put(self, room: MatchRoom):
+        await self.client.match_put(room)
+
+    async def match_merge(self, query: MatchMergeQuery) -> list[MatchMove]:
+        return await self.client.match_merge(query)
+
+    async def private_code_create(self, placement: RoomPlacement) -> str:
+        return await self.client.private_code_create(placement)
+
+    async def private_code_get(self, join_code: str) -> RoomPlacement | None:
+        return await self.client.private_code_get(join_code)
+
+    async def room_close(self, room: models.RoomId):
+        await self.client.room_close(room)
+
+
+async def run_worker_async(
+    worker: int,
+    host: str,
+    port: int,
+    worker_ports: list[int],
+    coordinator_port: int,
+    db_url: str,
+    buffered: bool,
+):
+    session_maker = await db.create_session_maker(db_url, create_all=False)
+    coordinator = CoordinatorClient()
+    # the coordinator may still be starting up
+    for _ in range(50):
+        with contextlib.suppress(ConnectionError):
+            await coordinator.connect("127.0.0.1", coordinator_port)
+            break
+        await asyncio.sleep(0.1)
+    else:
+        raise ConnectionError("coordinator not reachable")
+    server = BattleshipServer(
+        session_maker,
+        directory=CoordinatorRoomDirectory(coordinator),
+        worker=worker,
+        worker_ports=worker_ports,
+    )
+    ssl_context = create_ssl_context()
+    # terminate() from run_cluster still lets the shutdown hooks flush
+    asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel
+    )
+    log.info("worker %s started", worker)
+    # both ports are bound before any player is served, and are served together
+    # so the shutdown hooks run once and a failing listener closes the other
+    public = await server.listen(
+        host, port, ssl=ssl_context, buffered=buffered, reuse_port=True
+    )
+    try:
+        own = await server.listen(
+            host, worker_ports[worker], ssl=ssl_context, buffered=buffered
+        )
+    except BaseException:
+        public.close()
+        raise
+    await server.serve(public, own)
+
+
+def run_worker(*args):
+    load_dotenv()
+    setup_logging()
+    with contextlib.suppress(KeyboardInterrupt, asyncio.CancelledError):
+        asyncio.run(run_worker_async(*args))
+
+
+async def run_cluster(
+    workers: int,
+    host: str,
+    port: int,
+    db_url: str,
+    buffered: bool = False,
+):
+    # every worker shares the public port through SO_REUSEPORT and also
+    # listens on a port of its own that players get redirected to
+    worker_ports = [port + 1 + i for i in range(workers)]
+    coordinator_port = port + workers + 1
+
+    engine = await db.create_dev_engine(db_url)
+    await engine.dispose()
+
+    coordinator_task = asyncio.create_task(
+        Coordinator().run("127.0.0.1", coordinator_port, None)
+    )
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_worker,
+            args=(
+                worker,
+                host,
+                port,
+                worker_ports,
+                coordinator_port,
+                db_url,
+                buffered,
+            ),
+            daemon=True,
+        )
+        for worker in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        await coordinator_task
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            await asyncio.to_thread(process.join)
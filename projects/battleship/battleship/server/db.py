@@ -1,9 +1,24 @@
+from collections.abc import Sequence
 from typing import Optional
 from uuid import UUID, uuid4
 
-from sqlalchemy import ForeignKey, String
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import ForeignKey, String, event, inspect, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import (
+    DeclarativeBase,
+    Mapped,
+    Session,
+    mapped_column,
+    relationship,
+    selectinload,
+)
+from sqlalchemy.sql.dml import UpdateBase
 
 from ..shared import models
 
@@ -44,9 +59,30 @@ class Player(Base):
             [e.variant_id for e in self.emotes],
         )
 
+    def _relationships_loaded(self):
+        return not inspect(self).unloaded & {"ships", "emotes"}
+
     async def to_shared(self, db_session: AsyncSession):
+        # queries built with PLAYER_LOAD_OPTIONS already have everything, only
+        # fall back to lazy loading through the greenlet bridge otherwise
+        if self._relationships_loaded():
+            return self._to_shared()
         return await db_session.run_sync(lambda _: self._to_shared())
 
+    @staticmethod
+    async def to_shared_many(
+        db_session: AsyncSession, players: Sequence["Player"]
+    ) -> list[models.Player]:
+        if unloaded := [p.id for p in players if not p._relationships_loaded()]:
+            # one query per relationship for all of them, the loaded
+            # collections land on the instances already in the session
+            await db_session.execute(
+                select(Player)
+                .where(Player.id.in_(unloaded))
+                .options(*PLAYER_LOAD_OPTIONS)
+            )
+        return [p._to_shared() for p in players]
+
 
 class Ship(Base):
     __tablename__ = "ship"
@@ -64,6 +100,10 @@ class Emote(Base):
     owner_id: Mapped[UUID] = mapped_column(ForeignKey(Player.id), nullable=False)
 
 
+# ships and emotes are needed by every conversion to models.Player
+PLAYER_LOAD_OPTIONS = (selectinload(Player.ships), selectinload(Player.emotes))
+
+
 class FriendFrom(Base):
     __tablename__ = "friend_from"
     id: Mapped[UUID] = mapped_column(ForeignKey(Player.id), primary_key=True)
@@ -89,8 +129,92 @@ class FriendAssociation(Base):
     friend_to: Mapped["FriendTo"] = relationship(back_populates="friend_froms")
 
 
-async def create_dev_engine():
-    engine = create_async_engine("sqlite+aiosqlite://")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+async def create_dev_engine(url: str = "sqlite+aiosqlite://", create_all: bool = True):
+    engine = create_async_engine(url)
+    if create_all:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
     return engine
+
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": "5000",
+    "cache_size": "-16000",
+    "temp_store": "MEMORY",
+    "mmap_size": str(1 << 28),
+}
+
+
+def _sqlite_pragmas(engine: AsyncEngine, query_only: bool):
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        if query_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+
+def _schema_check(connection):
+    inspector = inspect(connection)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        columns = {c["name"] for c in inspector.get_columns(table.name)}
+        missing.extend(
+            f"{table.name}.{c.name}" for c in table.c if c.name not in columns
+        )
+    if missing:
+        raise RuntimeError(f"database schema is out of date, missing {missing}")
+
+
+def is_file_url(url: str):
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database not in (
+        None,
+        "",
+        ":memory:",
+    )
+
+
+async def create_file_session_maker(
+    url: str, readers: int = 4, create_all: bool = True
+) -> async_sessionmaker[AsyncSession]:
+    # sqlite only ever has one writer, so writes share a single connection
+    # while reads run on a pool of their own against the WAL snapshot
+    writer = create_async_engine(url, pool_size=1, max_overflow=0)
+    reader = create_async_engine(url, pool_size=readers, max_overflow=0)
+    _sqlite_pragmas(writer, query_only=False)
+    _sqlite_pragmas(reader, query_only=True)
+
+    async with writer.begin() as conn:
+        if create_all:
+            await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_schema_check)
+
+    class RoutingSession(Session):
+        def get_bind(self, mapper=None, clause=None, **kw):
+            # once a session has written it stays on the writer so it keeps
+            # seeing its own changes
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info["writer"] = True
+            if self.info.get("writer", False):
+                return writer.sync_engine
+            return reader.sync_engine
+
+    return async_sessionmaker(sync_session_class=RoutingSession, expire_on_commit=False)
+
+
+async def create_session_maker(
+    url: str = "sqlite+aiosqlite://", create_all: bool = True
+) -> async_sessionmaker[AsyncSession]:
+    if is_file_url(url):
+        return await create_file_session_maker(url, create_all=create_all)
+    engine = await create_dev_engine(url, create_all)
+    return async_sessionmaker(engine, expire_on_commit=False)
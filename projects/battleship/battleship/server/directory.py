@@ -0,0 +1,191 @@
+from bisect import bisect_left, insort
+from dataclasses import dataclass, field
+import random
+import string
+import time
+from typing import Protocol
+
+from ..shared import models
+
+
+@dataclass(eq=True, frozen=True)
+class RoomPlacement:
+    room: models.RoomId
+    worker: int
+
+
+@dataclass(eq=True, frozen=True)
+class MatchRoom:
+    placement: RoomPlacement
+    rating: int
+    players: int
+
+
+@dataclass(eq=True, frozen=True)
+class MatchQuery:
+    worker: int
+    rating: int
+
+
+@dataclass(eq=True, frozen=True)
+class MatchMergeQuery:
+    worker: int
+    room_size: int
+
+
+@dataclass(eq=True, frozen=True)
+class MatchMove:
+    # the players of room go over to into, both are out of matchmaking until
+    # the worker that holds them puts back whatever is left
+    room: MatchRoom
+    into: MatchRoom
+
+
+class RoomDirectory(Protocol):
+    async def match_take(self, query: MatchQuery) -> MatchRoom | None:
+        ...
+
+    async def match_put(self, room: MatchRoom) -> None:
+        ...
+
+    async def match_merge(self, query: MatchMergeQuery) -> list[MatchMove]:
+        ...
+
+    async def private_code_create(self, placement: RoomPlacement) -> str:
+        ...
+
+    async def private_code_get(self, join_code: str) -> RoomPlacement | None:
+        ...
+
+    async def room_close(self, room: models.RoomId) -> None:
+        ...
+
+
+@dataclass
+class LocalRoomDirectory:
+    # open rooms are indexed by rating bucket then by how many players are in
+    # them, a room accepts players further away the longer it has been open
+    bucket_size: int = 100
+    base_window: int = 100
+    widen_rate: float = 20
+    max_window: int = 800
+    match_rooms: dict[models.RoomId, MatchRoom] = field(default_factory=dict)
+    match_buckets: dict[int, dict[int, dict[models.RoomId, MatchRoom]]] = field(
+        default_factory=dict
+    )
+    match_bucket_keys: list[int] = field(default_factory=list)
+    match_opened: dict[models.RoomId, float] = field(default_factory=dict)
+    private_room_codes: dict[str, RoomPlacement] = field(default_factory=dict)
+    private_room_codes_rev: dict[models.RoomId, str] = field(default_factory=dict)
+    rng: random.Random = field(default_factory=random.Random)
+
+    def _match_window(self, room: models.RoomId, now: float):
+        waited = now - self.match_opened[room]
+        return min(self.base_window + self.widen_rate * waited, self.max_window)
+
+    def _match_remove(self, room: models.RoomId):
+        if (match_room := self.match_rooms.pop(room, None)) is None:
+            return
+        bucket = match_room.rating // self.bucket_size
+        fills = self.match_buckets[bucket]
+        del fills[match_room.players][room]
+        if not fills[match_room.players]:
+            del fills[match_room.players]
+        if not fills:
+            del self.match_buckets[bucket]
+            del self.match_bucket_keys[bisect_left(self.match_bucket_keys, bucket)]
+
+    async def match_take(self, query: MatchQuery) -> MatchRoom | None:
+        # walks the non empty buckets outwards from the player's own, within a
+        # bucket the fullest rooms go first and at each fill level the room
+        # that has been there the longest and is close enough is taken
+        now = time.monotonic()
+        keys = self.match_bucket_keys
+        bucket = query.rating // self.bucket_size
+        high = bisect_left(keys, bucket)
+        low = high - 1
+        while low >= 0 or high < len(keys):
+            if high >= len(keys) or (
+                low >= 0 and bucket - keys[low] < keys[high] - bucket
+            ):
+                key = keys[low]
+                low -= 1
+            else:
+                key = keys[high]
+                high += 1
+            if (abs(key - bucket) - 1) * self.bucket_size > self.max_window:
+                break
+            fills = self.match_buckets[key]
+            for players in sorted(fills.keys(), reverse=True):
+                for match_room in fills[players].values():
+                    room = match_room.placement.room
+                    if abs(match_room.rating - query.rating) <= self._match_window(
+                        room, now
+                    ):
+                        self._match_remove(room)
+                        return match_room
+        return None
+
+    async def match_put(self, room: MatchRoom):
+        room_id = room.placement.room
+        self._match_remove(room_id)
+        self.match_opened.setdefault(room_id, time.monotonic())
+        self.match_rooms[room_id] = room
+        bucket = room.rating // self.bucket_size
+        if (fills := self.match_buckets.get(bucket)) is None:
+            fills = self.match_buckets[bucket] = {}
+            insort(self.match_bucket_keys, bucket)
+        fills.setdefault(room.players, {})[room_id] = room
+
+    async def match_merge(self, query: MatchMergeQuery) -> list[MatchMove]:
+        # windows only widen when someone asks for a room, so rooms that were
+        # too far apart when they opened are paired up here once they are not.
+        # the younger room goes into the older one, whose window is the wider,
+        # and only rooms on the worker asking can be merged
+        now = time.monotonic()
+        rooms = sorted(
+            (
+                r
+                for r in self.match_rooms.values()
+                if r.placement.worker == query.worker
+            ),
+            key=lambda r: self.match_opened[r.placement.room],
+        )
+        moves = []
+        merged = set()
+        for i, into in enumerate(rooms):
+            if into.placement.room in merged:
+                continue
+            window = self._match_window(into.placement.room, now)
+            for room in rooms[i + 1 :]:
+                if (
+                    room.placement.room not in merged
+                    and into.players + room.players <= query.room_size
+                    and abs(room.rating - into.rating) <= window
+                ):
+                    merged.update((room.placement.room, into.placement.room))
+                    self._match_remove(room.placement.room)
+                    self._match_remove(into.placement.room)
+                    moves.append(MatchMove(room, into))
+                    break
+        return moves
+
+    async def private_code_create(self, placement: RoomPlacement) -> str:
+        while True:
+            join_code = "".join(
+                self.rng.choice(string.ascii_lowercase) for _ in range(6)
+            )
+            if join_code not in self.private_room_codes:
+                break
+        self.private_room_codes[join_code] = placement
+        self.private_room_codes_rev[placement.room] = join_code
+        return join_code
+
+    async def private_code_get(self, join_code: str) -> RoomPlacement | None:
+        return self.private_room_codes.get(join_code, None)
+
+    async def room_close(self, room: models.RoomId):
+        self._match_remove(room)
+        self.match_opened.pop(room, None)
+        if (join_code := self.private_room_codes_rev.pop(room, None)) is not None:
+            del self.private_room_codes[join_code]
@@ -1,12 +1,10 @@
 import argparse
 import asyncio
-import os
-import ssl
 
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from . import db
+from .cluster import create_ssl_context, run_cluster
 from .server import BattleshipServer
 from .view.main_menu import main_menu
 from ..shared.logging import setup_logging
@@ -18,25 +16,36 @@ if __name__ == "__main__":
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-u", "--ui", action="store_true")
+    parser.add_argument("-b", "--buffered", action="store_true")
+    parser.add_argument("-w", "--workers", type=int, default=0)
+    parser.add_argument("--db", default="sqlite+aiosqlite://")
     args = parser.parse_args()
 
-    ssl_context = ssl.create_default_context(purpose=ssl.Purpose.CLIENT_AUTH)
-    ssl_context.load_cert_chain(os.environ["SSL_CERT"], os.environ["SSL_KEY"])
+    if args.workers and args.ui:
+        parser.error("--workers cannot be used with --ui")
+    if args.workers and args.db == "sqlite+aiosqlite://":
+        parser.error("--workers needs a database shared between processes")
 
-    if args.ui:
+    ssl_context = create_ssl_context()
+
+    if args.workers:
+        asyncio.run(run_cluster(args.workers, "0.0.0.0", 60000, args.db, args.buffered))
+    elif args.ui:
         import contextlib
         import pyglet
         from tgraphics.component import Window, loop
 
         window = Window(resizable=True)
 
-        engine = loop.run_until_complete(db.create_dev_engine())
-        server = BattleshipServer(async_sessionmaker(engine, expire_on_commit=False))
+        server = BattleshipServer(
+            loop.run_until_complete(db.create_session_maker(args.db))
+        )
         loop.create_task(
             server.run(
                 "0.0.0.0",
                 60000,
                 ssl=ssl_context,
+                buffered=args.buffered,
             )
         )
         loop.run_until_complete(
@@ -57,14 +66,12 @@ if __name__ == "__main__":
     else:
 
         async def amain():
-            engine = await db.create_dev_engine()
-            server = BattleshipServer(
-                async_sessionmaker(engine, expire_on_commit=False)
-            )
+            server = BattleshipServer(await db.create_session_maker(args.db))
             await server.run(
                 "0.0.0.0",
                 60000,
                 ssl=ssl_context,
+                buffered=args.buffered,
             )
 
         asyncio.run(amain())
@@ -1,16 +1,23 @@
 from attrs import evolve
 import asyncio
+from collections.abc import Awaitable, Callable
 import contextlib
 from dataclasses import dataclass, field, replace
 from enum import Enum, auto
+import os
 import random
-from typing import TYPE_CHECKING
+from typing import Any, TYPE_CHECKING
 from uuid import UUID
 
-from tsocket.shared import Session, Empty
+from tsocket.server import BroadcastStream
+from tsocket.shared import Empty, ResponseError, Session
 
-from ..shared import models, shot_type
-from ..shared.utils import add, mat_mul_vec
+from .bitboard import BitBoard
+from .directory import MatchRoom, RoomPlacement
+from .replay import BoardRecord, ReplayEvent, ReplayLog, ShotRecord
+from .timer import Timer
+from .visibility import VisibilityIndex
+from ..shared import geometry, models, shot_type
 
 if TYPE_CHECKING:
     from .server import BattleshipServer
@@ -20,6 +27,11 @@ class RoomPhase(Enum):
     LOBBY = auto()
     SHIPSETUP = auto()
     PLAYING = auto()
+    TURN_TRANSITION = auto()
+
+
+TURN_TRANSITION_DELAY = 5
+TURN_TIMEOUT = 10
 
 
 @dataclass
@@ -27,6 +39,11 @@ class Room:
     id: UUID  # pylint: disable=C0103
     server: "BattleshipServer"
     start_private: bool
+    # everything random in a room comes from its own generator, so the seed and
+    # the replay log are enough to play it again
+    seed: int = field(default_factory=lambda: random.getrandbits(64), kw_only=True)
+    rng: random.Random = field(init=False)
+    replay: ReplayLog = field(init=False)
     lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
     phase: RoomPhase = field(init=False, default=RoomPhase.LOBBY)
     players: dict[models.PlayerId, models.PlayerInfo] = field(
@@ -38,8 +55,22 @@ class Room:
         init=False, default_factory=list
     )
     readies: set[models.PlayerId] = field(init=False, default_factory=set)
-    boards: dict[models.BoardId, models.Board] = field(init=False, default_factory=dict)
-    next_player_task: asyncio.Task | None = field(init=False, default=None)
+    boards: dict[models.BoardId, BitBoard] = field(init=False, default_factory=dict)
+    visibility: VisibilityIndex = field(init=False, default_factory=VisibilityIndex)
+    # spectators share the frames encoded for the players, without ever
+    # holding the room up when they read slowly
+    spectators: BroadcastStream = field(init=False, default_factory=BroadcastStream)
+    # turn changes are driven by timers instead of tasks sleeping with the
+    # lock held, a timer that fires for an earlier turn is ignored
+    turn: int = field(init=False, default=0)
+    turn_timer: Timer | None = field(init=False, default=None)
+    event_tasks: set[asyncio.Task] = field(init=False, default_factory=set)
+    # whether players from matchmaking may join while the room is in the lobby
+    matchable: bool = field(init=False, default=False)
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+        self.replay = ReplayLog(self.id, self.start_private, self.seed)
 
     def __contains__(self, player: models.PlayerId):
         return player in self.players.keys()
@@ -48,38 +79,90 @@ class Room:
     def should_start(self):
         return len(self.players) > 1 and len(self.readies) == len(self.players)
 
+    def player_sessions(self):
+        return [
+            self.server.known_player_session[player_id]
+            for player_id in self.players.keys()
+        ]
+
+    async def broadcast(
+        self, name: str, args: Any, sessions: list[Session] | None = None
+    ):
+        await self.server.broadcast(
+            name,
+            self.player_sessions() if sessions is None else sessions,
+            args,
+            streams=[self.spectators],
+        )
+
+    async def match_put(self):
+        # full rooms stay out of matchmaking until someone leaves
+        if self.matchable and 0 < len(self.players) < self.server.match_room_size:
+            await self.server.directory.match_put(
+                MatchRoom(
+                    RoomPlacement(self.to_room_id(), self.server.worker),
+                    sum(p.rating for p in self.players.values()) // len(self.players),
+                    len(self.players),
+                )
+            )
+
     async def remove_session(self, session: Session):
         await self.remove_player(self.server.known_player_session_rev[session])
 
     async def add_player(self, player_id: models.PlayerId):
         async with self.lock:
             session = self.server.known_player_session[player_id]
+            await self.remove_spectator(session)
             self.server.on_session_leave(session, self.remove_session)
             player_info = await self.server.player_info_get(session, player_id)
-            async with asyncio.TaskGroup() as tg:
-                for other_player_info in self.players.values():
-                    tg.create_task(
-                        self.server.on_room_join(
-                            self.server.known_player_session[
-                                models.PlayerId.from_player_info(other_player_info)
-                            ],
-                            player_info,
-                        )
-                    )
+            await self.broadcast("on_room_join", player_info)
             self.players[player_id] = player_info
+            self.replay.append(ReplayEvent.JOIN, player_info)
+
+    async def add_spectator(self, session: Session):
+        async with self.lock:
+            if session not in self.spectators:
+                self.spectators.subscribe(session, self.on_spectator_drop)
+                self.server.on_session_leave(session, self.remove_spectator)
+
+    async def remove_spectator(self, session: Session):
+        if self.spectators.unsubscribe(session):
+            self.server.off_session_leave(session, self.remove_spectator)
+
+    def on_spectator_drop(self, session: Session):
+        # whatever was queued for them is gone, so they are told to join again
+        # and pick up the current view from game_view_get
+        self.server.off_session_leave(session, self.remove_spectator)
+        task = asyncio.create_task(
+            self.server.broadcast("on_room_spectate_drop", [session], self.to_room_id())
+        )
+        self.event_tasks.add(task)
+        task.add_done_callback(self.event_tasks.discard)
 
-    async def do_cancel_next_player_task(self):
-        if (n_task := self.next_player_task) is not None:
-            n_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError, Exception):
-                await n_task
-        self.next_player_task = None
+    def cancel_turn_timer(self):
+        if (turn_timer := self.turn_timer) is not None:
+            turn_timer.cancel()
+        self.turn_timer = None
+
+    def schedule_turn_timer(
+        self, delay: float, handler: Callable[[int], Awaitable[None]]
+    ):
+        self.cancel_turn_timer()
+        turn = self.turn
+
+        def fire():
+            self.turn_timer = None
+            task = asyncio.create_task(handler(turn))
+            self.event_tasks.add(task)
+            task.add_done_callback(self.event_tasks.discard)
+
+        self.turn_timer = self.server.timers.call_later(delay, fire)
 
     async def do_room_reset(self, hard=False):
         self.phase = RoomPhase.SHIPSETUP
         if not self.lost_players or hard:
             self.alive_players = [p for p in self.players.values()]
-            random.shuffle(self.alive_players)
+            self.rng.shuffle(self.alive_players)
             self.lost_players = []
         else:
             self.alive_players = [
@@ -90,29 +173,27 @@ class Room:
             ]
             self.lost_players = []
         self.boards = dict()
-        await self.do_cancel_next_player_task()
+        self.visibility.reset()
+        self.turn += 1
+        self.cancel_turn_timer()
         if hard:
-            async with asyncio.TaskGroup() as tg:
-                for player_info in self.players.values():
-                    tg.create_task(
-                        self.server.on_game_reset(
-                            self.server.known_player_session[
-                                models.PlayerId.from_player_info(player_info)
-                            ],
-                            Empty(),
-                        )
-                    )
+            await self.broadcast("on_game_reset", Empty())
 
-    async def _player_update(
-        self, player_id: models.PlayerId, rating_changes: int, coin_changes: int
+    async def _players_settle(
+        self,
+        rating_changes: dict[models.PlayerId, int],
+        coin_changes: dict[models.PlayerId, int],
     ):
-        player = await self.server._player_update(
-            player_id, rating_changes, coin_changes
-        )
-        new_info = models.PlayerInfo.from_player(player)
-        if player_id in self.players:
-            self.players[player_id] = new_info
-        return player
+        players = await self.server._players_settle(rating_changes, coin_changes)
+        for player_id, player in players.items():
+            if player_id in self.players:
+                self.players[player_id] = models.PlayerInfo.from_player(player)
+        return players
+
+    async def do_surrender(self, player_id: models.PlayerId):
+        async with self.lock:
+            self.replay.append(ReplayEvent.SURRENDER, player_id)
+            await self.do_player_lost(player_id)
 
     async def do_player_lost(self, player_id: models.PlayerId, remove: bool = False):
         player = self.players[player_id]
@@ -121,47 +202,29 @@ class Room:
         if player in self.alive_players:
             self.alive_players.remove(player)
             self.lost_players.append(player)
-        async with asyncio.TaskGroup() as tg:
-            for player_info in self.players.values():
-                tg.create_task(
-                    self.server.on_game_player_lost(
-                        self.server.known_player_session[
-                            models.PlayerId.from_player_info(player_info)
-                        ],
-                        player,
-                    )
-                )
+        self.replay.append(ReplayEvent.LOST, models.PlayerId.from_player_info(player))
+        await self.broadcast("on_game_player_lost", player)
         if len(self.alive_players) == 1:
+            # a game can also end on a surrender or a leave, so the timer of
+            # the turn it ended in must not fire into the finished game
+            self.cancel_turn_timer()
+            self.turn += 1
             self.lost_players.append(self.alive_players.pop())
             self.readies = set()
             rating_changes = {}
             coin_changes = {}
             new_stats = {}
             if not self.start_private:
-                async with asyncio.TaskGroup() as tg:
-                    for i, player in enumerate(self.lost_players):
-                        change = sum(
-                            [
-                                player.rating_changes(p, win=True)
-                                for p in self.lost_players[:i]
-                            ]
-                        ) + sum(
-                            [
-                                player.rating_changes(p, win=False)
-                                for p in self.lost_players[i + 1 :]
-                            ]
-                        )
-                        rating_changes[
-                            models.PlayerId.from_player_info(player)
-                        ] = change
-                        coin_changes[models.PlayerId.from_player_info(player)] = 20 * i
-                        new_stats[
-                            models.PlayerId.from_player_info(player)
-                        ] = tg.create_task(
-                            self._player_update(
-                                models.PlayerId.from_player_info(player), change, 20 * i
-                            )
-                        )
+                placement_changes = self.server.rating_system.placement_changes(
+                    self.lost_players
+                )
+                for i, (player, change) in enumerate(
+                    zip(self.lost_players, placement_changes)
+                ):
+                    player_id = models.PlayerId.from_player_info(player)
+                    rating_changes[player_id] = change
+                    coin_changes[player_id] = 20 * i
+                new_stats = await self._players_settle(rating_changes, coin_changes)
             async with asyncio.TaskGroup() as tg:
                 for player_id, player_info in self.players.items():
                     if (new_stat := new_stats.get(player_id)) is not None:
@@ -176,7 +239,7 @@ class Room:
                                     ),
                                     rating_changes.get(player_id, 0),
                                     coin_changes.get(player_id, 0),
-                                    await new_stat,
+                                    new_stat,
                                 ),
                             )
                         )
@@ -185,6 +248,7 @@ class Room:
         async with self.lock:
             session = self.server.known_player_session[player_id]
             player_info = await self.server.player_info_get(session, player_id)
+            self.replay.append(ReplayEvent.LEAVE, player_id)
             should_delete = False
             match self.phase:
                 case RoomPhase.LOBBY:
@@ -192,7 +256,9 @@ class Room:
                         self.readies.remove(player_id)
                     del self.players[models.PlayerId.from_player_info(player_info)]
                     should_delete = len(self.players) < 1
-                case RoomPhase.SHIPSETUP | RoomPhase.PLAYING:
+                    if not should_delete:
+                        await self.match_put()
+                case RoomPhase.SHIPSETUP | RoomPhase.PLAYING | RoomPhase.TURN_TRANSITION:
                     await self.do_player_lost(player_id, remove=True)
                     should_delete = len(self.players) < 2
 
@@ -202,171 +268,155 @@ class Room:
                 room_id = self.to_room_id()
                 with contextlib.suppress(KeyError):
                     del self.server.rooms[room_id]
-                with contextlib.suppress(KeyError):
-                    self.server.match_rooms.remove(room_id)
-                with contextlib.suppress(KeyError):
-                    join_code = self.server.private_room_codes_rev[room_id]
-                    del self.server.private_room_codes[join_code]
-                    del self.server.private_room_codes_rev[room_id]
-
-            async with asyncio.TaskGroup() as tg:
-                for other_player_info in self.players.values():
-                    tg.create_task(
-                        self.server.on_room_leave(
-                            self.server.known_player_session[
-                                models.PlayerId.from_player_info(other_player_info)
-                            ],
-                            player_info,
-                        )
+                await self.server.directory.room_close(room_id)
+                if (replay_dir := self.server.replay_dir) is not None:
+                    await asyncio.to_thread(
+                        self.replay.save, os.path.join(replay_dir, f"{self.id}.replay")
                     )
-                    if should_delete:
-                        tg.create_task(
-                            self.server.on_room_delete(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(other_player_info)
-                                ],
-                                Empty(),
-                            )
-                        )
+
+            other_sessions = self.player_sessions()
+            await self.broadcast("on_room_leave", player_info, other_sessions)
+            if should_delete:
+                await self.broadcast("on_room_delete", Empty(), other_sessions)
+                for spectator in [*self.spectators.subscribers.keys()]:
+                    self.server.off_session_leave(spectator, self.remove_spectator)
+                self.spectators.close()
 
     async def add_ready(self, player_id: models.PlayerId):
         async with self.lock:
             self.readies.add(player_id)
-            async with asyncio.TaskGroup() as tg:
-                for player_info in self.players.values():
-                    tg.create_task(
-                        self.server.on_room_player_ready(
-                            self.server.known_player_session[
-                                models.PlayerId.from_player_info(player_info)
-                            ],
-                            player_id,
-                        )
-                    )
+            self.replay.append(ReplayEvent.READY, player_id)
+            await self.broadcast("on_room_player_ready", player_id)
             if self.should_start:
-                async with asyncio.TaskGroup() as tg:
-                    room_id = self.to_room_id()
-                    with contextlib.suppress(KeyError):
-                        self.server.match_rooms.remove(room_id)
-                    with contextlib.suppress(KeyError):
-                        join_code = self.server.private_room_codes_rev[room_id]
-                        del self.server.private_room_codes[join_code]
-                        del self.server.private_room_codes_rev[room_id]
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_room_ready(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                Empty(),
-                            )
-                        )
+                await self.server.directory.room_close(self.to_room_id())
+                await self.broadcast("on_room_ready", Empty())
                 await self.do_room_reset()
 
-    async def to_next_player_timeout(self):
-        await asyncio.sleep(10)
-        await self.to_next_player(is_task=True)
-
-    async def to_next_player(self, end_turn=True, is_task=False):
+    async def do_turn_end(self, end_turn: bool = True):
+        # called with the lock held, starts the pause before the next turn
+        self.turn += 1
+        if not self.alive_players:
+            self.cancel_turn_timer()
+            return
+        self.phase = RoomPhase.TURN_TRANSITION
+        if end_turn:
+            await self.broadcast("on_game_turn_end", self.alive_players[0])
+        self.schedule_turn_timer(TURN_TRANSITION_DELAY, self.on_turn_start)
+
+    async def on_turn_start(self, turn: int):
         async with self.lock:
-            if not is_task and self.next_player_task is not None:
-                self.next_player_task.cancel()
-            if self.alive_players and end_turn:
-                async with asyncio.TaskGroup() as tg:
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_game_turn_end(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                self.alive_players[0],
-                            )
-                        )
-
-            await asyncio.sleep(5)
-
-            if self.alive_players:
-                player = self.alive_players.pop()
-                self.alive_players.insert(0, player)
-                async with asyncio.TaskGroup() as tg:
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_game_turn_start(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                player,
-                            )
-                        )
-                self.next_player_task = asyncio.create_task(
-                    self.to_next_player_timeout()
-                )
+            if (
+                turn != self.turn
+                or self.phase != RoomPhase.TURN_TRANSITION
+                or not self.alive_players
+            ):
+                return
+            self.replay.append(ReplayEvent.TURN_START, Empty())
+            player = self.alive_players.pop()
+            self.alive_players.insert(0, player)
+            self.phase = RoomPhase.PLAYING
+            await self.broadcast("on_game_turn_start", player)
+            self.schedule_turn_timer(TURN_TIMEOUT, self.on_turn_timeout)
+
+    async def on_turn_timeout(self, turn: int):
+        async with self.lock:
+            if turn == self.turn and self.phase == RoomPhase.PLAYING:
+                self.replay.append(ReplayEvent.TURN_TIMEOUT, Empty())
+                await self.do_turn_end()
 
-    async def add_board_submit(self, board: models.Board):
+    async def add_board_submit(self, board: BitBoard):
         board_id = models.BoardId.from_board(board)
         async with self.lock:
+            if (
+                self.phase != RoomPhase.SHIPSETUP
+                or board_id in self.boards
+                or any(b.player == board.player for b in self.boards.values())
+            ):
+                raise ResponseError("invalid_board", b"")
             self.boards[board_id] = board
-            # TODO: board check??
-            async with asyncio.TaskGroup() as tg:
-                for player_info in self.players.values():
-                    tg.create_task(
-                        self.server.on_room_player_submit(
-                            self.server.known_player_session[
-                                models.PlayerId.from_player_info(player_info)
-                            ],
-                            models.RoomPlayerSubmitData(board.player, board_id),
-                        )
-                    )
-                if len(self.boards) == len(self.players):
-                    self.phase = RoomPhase.PLAYING
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_room_submit(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                Empty(),
-                            )
-                        )
-                    self.next_player_task = asyncio.create_task(
-                        self.to_next_player(end_turn=False, is_task=True)
-                    )
+            self.replay.append(ReplayEvent.BOARD, BoardRecord.from_bitboard(board))
+            await self.broadcast(
+                "on_room_player_submit",
+                models.RoomPlayerSubmitData(board.player, board_id),
+            )
+            if len(self.boards) == len(self.players):
+                await self.broadcast("on_room_submit", Empty())
+                await self.do_turn_end(end_turn=False)
 
     async def display_board(self, player: models.PlayerId, board: models.BoardId):
         async with self.lock:
-            if player == models.PlayerId.from_player_info(self.alive_players[0]):
-                async with asyncio.TaskGroup() as tg:
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_game_board_display(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                board,
-                            )
-                        )
+            if self.is_turn_of(player):
+                await self.broadcast("on_game_board_display", board)
             else:
                 # TODO:
                 raise Exception()
 
-    async def do_shot_submit(self, player: models.PlayerId, shot: models.Shot):
-        if player == models.PlayerId.from_player_info(self.alive_players[0]):
-            shot_variant = shot_type.SHOT_VARIANTS[shot.shot_variant.id]
-            shot_locations = [
-                add(
-                    shot.tile_position,
-                    mat_mul_vec(
-                        shot_type.ORIENTATIONS[shot.orientation],
-                        offset,
-                    ),
+    def game_view(self, viewer: models.PlayerId, since: int | None):
+        if (
+            since is not None
+            and (shots := self.visibility.since(viewer, since)) is not None
+        ):
+            return models.GameView(self.visibility.seq, None, shots)
+        views = self.visibility.views(viewer)
+        boards = []
+        for board_id, board in self.boards.items():
+            if board.player == viewer:
+                board_view = models.BoardView(
+                    board_id,
+                    board.player,
+                    [
+                        models.Reveal((col, row), board.tile(board.cell(col, row)))
+                        for col in range(board.width)
+                        for row in range(board.height)
+                    ],
+                    board.ship,
                 )
-                for offset in shot_variant.placement_offsets.keys()
+            elif (view := views.get(board_id, None)) is not None:
+                board_view = view.to_shared(board_id, board.player)
+            else:
+                board_view = models.BoardView(board_id, board.player, [], [])
+            boards.append(board_view)
+        return models.GameView(self.visibility.seq, boards, [])
+
+    def is_turn_of(self, player: models.PlayerId):
+        return bool(self.alive_players) and player == models.PlayerId.from_player_info(
+            self.alive_players[0]
+        )
+
+    async def do_shot_submit(self, player: models.PlayerId, shot: models.Shot):
+        async with self.lock:
+            return await self._do_shot_submit(player, shot)
+
+    async def _do_shot_submit(self, player: models.PlayerId, shot: models.Shot):
+        if self.phase == RoomPhase.PLAYING and self.is_turn_of(player):
+            # a shot that cannot be played must fail before it is logged or
+            # draws from the rng, otherwise the replay would no longer match
+            footprints = geometry.SHOT_FOOTPRINTS.get(shot.shot_variant.id, ())
+            if (
+                (shot_variant := shot_type.SHOT_VARIANTS.get(shot.shot_variant.id))
+                is None
+                or (board := self.boards.get(shot.board)) is None
+                or not 0 <= shot.orientation < len(footprints)
+                or board.cell(*shot.tile_position) is None
+            ):
+                raise ResponseError("not_found", b"")
+            shot_locations = footprints[shot.orientation].locations(shot.tile_position)
+            self.replay.append(ReplayEvent.SHOT, ShotRecord(player, shot))
+            pick_locations = self.rng.sample(
+                shot_locations, shot_variant.number_of_shot
+            )
+            pick_cells = [
+                (location, cell)
+                for location in pick_locations
+                if (cell := board.cell(*location)) is not None
+                and not board.is_hit(cell)
             ]
-            pick_locations = random.sample(shot_locations, shot_variant.number_of_shot)
-            board = self.boards[shot.board]
+            if not shot_variant.reveal:
+                for _, cell in pick_cells:
+                    board.hit(cell)
             location_result = [
-                models.Reveal((col, row), board.grid[col][row])
-                for col, row in pick_locations
-                if not board.grid[col][row].hit
+                models.Reveal(location, board.tile(cell))
+                for location, cell in pick_cells
             ]
             if shot_variant.reveal:
                 reveal_ship_tile = [
@@ -380,16 +430,17 @@ class Room:
                     for s in board.ship
                     if models.ShipId.from_ship(s) in reveal_ship_id
                 ]
-                res = models.ShotResult(
+                res = self.visibility.record(
+                    models.ShotResult(
+                        player,
+                        models.BoardId.from_board(board),
+                        False,
+                        location_result,
+                        reveal_ship,
+                    ),
                     player,
-                    models.BoardId.from_board(board),
-                    False,
-                    location_result,
-                    reveal_ship,
                 )
             else:
-                for r in location_result:
-                    r.tile.hit = True
                 res = models.ShotResult(
                     player,
                     models.BoardId.from_board(board),
@@ -416,23 +467,12 @@ class Room:
                     [],
                 )
 
-                async with asyncio.TaskGroup() as tg:
-                    for player_info in self.players.values():
-                        tg.create_task(
-                            self.server.on_game_board_shot(
-                                self.server.known_player_session[
-                                    models.PlayerId.from_player_info(player_info)
-                                ],
-                                other_res,
-                            )
-                        )
-                if all(
-                    t.hit or not isinstance(t, models.ShipTile)
-                    for c in board.grid
-                    for t in c
-                ):
+                other_res = self.visibility.record(other_res)
+                res = self.visibility.record(res, player)
+                await self.broadcast("on_game_board_shot", other_res)
+                if board.lost:
                     await self.do_player_lost(board.player)
-            asyncio.create_task(self.to_next_player())
+            await self.do_turn_end()
             return res
 
         else:
@@ -442,16 +482,11 @@ class Room:
     async def do_emote_display(
         self, player: models.PlayerId, emote: models.EmoteVariantId
     ):
-        async with asyncio.TaskGroup() as tg:
-            for player_info in self.players.values():
-                tg.create_task(
-                    self.server.on_emote_display(
-                        self.server.known_player_session[
-                            models.PlayerId.from_player_info(player_info)
-                        ],
-                        models.EmoteDisplayData(player, emote),
-                    )
-                )
+        self.replay.append(ReplayEvent.EMOTE, models.EmoteDisplayData(player, emote))
+        await self.broadcast(
+            "on_emote_display",
+            models.EmoteDisplayData(player, emote),
+        )
 
     def to_room_id(self):
         return models.RoomId(self.id)
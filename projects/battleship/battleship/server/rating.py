@@ -0,0 +1,71 @@
+from collections.abc import Sequence
+from dataclasses import dataclass
+from functools import lru_cache
+import math
+from typing import Protocol
+
+from ..shared import models
+
+
+class RatingSystem(Protocol):
+    # placement goes from the first player to lose to the winner, the result
+    # is the rating change of each player in the same order
+    def placement_changes(self, placement: Sequence[models.PlayerInfo]) -> list[int]:
+        ...
+
+
+@lru_cache(maxsize=4096)
+def elo_q(rating: int, scale: float = 400) -> float:
+    return 10 ** (rating / scale)
+
+
+@dataclass(frozen=True)
+class EloRatingSystem:
+    k: float = 32
+    scale: float = 400
+
+    def placement_changes(self, placement: Sequence[models.PlayerInfo]) -> list[int]:
+        # every player won against everyone placed before them and lost to
+        # everyone after, each pair is rounded on its own like
+        # PlayerInfo.rating_changes does
+        k = self.k
+        qs = [elo_q(p.rating, self.scale) for p in placement]
+        changes = [0] * len(qs)
+        for i, q_i in enumerate(qs):
+            for j in range(i + 1, len(qs)):
+                q_j = qs[j]
+                total = q_i + q_j
+                changes[i] += round(k * (0 - q_i / total))
+                changes[j] += round(k * (1 - q_j / total))
+        return changes
+
+
+@dataclass(frozen=True)
+class GlickoRatingSystem:
+    # rating deviations are not stored, so every player is assumed to be
+    # equally uncertain, 50 keeps single games close to the k=32 elo
+    deviation: float = 50
+    scale: float = 400
+
+    def placement_changes(self, placement: Sequence[models.PlayerInfo]) -> list[int]:
+        q = math.log(10) / self.scale
+        g = 1 / math.sqrt(1 + 3 * (q * self.deviation / math.pi) ** 2)
+        ratings = [p.rating for p in placement]
+        changes = []
+        for i, rating in enumerate(ratings):
+            score_sum = 0.0
+            variance_sum = 0.0
+            for j, other in enumerate(ratings):
+                if i == j:
+                    continue
+                expected = 1 / (1 + 10 ** (-g * (rating - other) / self.scale))
+                score_sum += g * ((1 if j < i else 0) - expected)
+                variance_sum += g * g * expected * (1 - expected)
+            if not variance_sum:
+                changes.append(0)
+                continue
+            d_squared = 1 / (q * q * variance_sum)
+            changes.append(
+                round(q / (1 / self.deviation**2 + 1 / d_squared) * score_sum)
+            )
+        return changes
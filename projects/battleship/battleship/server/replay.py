@@ -0,0 +1,319 @@
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import lru_cache
+import struct
+import time
+from typing import Any
+from uuid import UUID
+
+from tsocket.codec import cbor2_codec
+from tsocket.shared import Empty, decode_varint, encode_varint
+
+from .bitboard import BitBoard
+from ..shared import geometry, models
+
+
+class ReplayEvent(IntEnum):
+    JOIN = 1
+    LEAVE = 2
+    READY = 3
+    BOARD = 4
+    TURN_START = 5
+    TURN_TIMEOUT = 6
+    SHOT = 7
+    EMOTE = 8
+    SURRENDER = 9
+    # follows from the events before it, kept so a replay can be checked
+    LOST = 10
+
+
+@dataclass(frozen=True)
+class BoardRecord:
+    # a board as it was submitted, the grid follows from the ships and the
+    # obstacles so only those are kept. boards are validated before they reach
+    # a room, so every ship covers its footprint from its first tile
+    id: UUID  # pylint: disable=C0103
+    player: models.PlayerId
+    width: int
+    height: int
+    ship: list[models.Ship]
+    obstacles: list[tuple[int, models.ObstacleVariantId]]
+
+    @classmethod
+    def from_bitboard(cls, board: BitBoard):
+        return cls(
+            board.id,
+            board.player,
+            board.width,
+            board.height,
+            board.ship,
+            sorted(board.tile_obstacles.items()),
+        )
+
+    def to_bitboard(self, room: models.RoomId):
+        board = BitBoard(self.id, self.player, room, self.width, self.height, self.ship)
+        for ship in self.ship:
+            ship_id = models.ShipId.from_ship(ship)
+            for location in ship.tile_position:
+                cell = board.cell(*location)
+                board.ships |= 1 << cell
+                board.tile_ships[cell] = ship_id
+                board.ship_remaining[ship_id] = board.ship_remaining.get(ship_id, 0) + 1
+                board.remaining += 1
+        for cell, obstacle_variant in self.obstacles:
+            board.obstacles |= 1 << cell
+            board.tile_obstacles[cell] = obstacle_variant
+        return board
+
+
+@dataclass(frozen=True)
+class ShotRecord:
+    player: models.PlayerId
+    shot: models.Shot
+
+
+# the same few players, boards and variants come up over and over in a log
+@lru_cache(maxsize=4096)
+def _uuid(data: bytes):
+    return UUID(bytes=data)
+
+
+def _empty_dumps(_empty: Empty):
+    return b""
+
+
+def _empty_loads(_data: memoryview):
+    return Empty()
+
+
+def _player_dumps(player: models.PlayerId):
+    return player.id.bytes
+
+
+def _player_loads(data: memoryview):
+    return models.PlayerId(_uuid(bytes(data)))
+
+
+# player, shot variant, board, col, row, orientation
+SHOT_RECORD = struct.Struct("<16s16s16sBBB")
+
+
+def _shot_dumps(record: ShotRecord):
+    shot = record.shot
+    return SHOT_RECORD.pack(
+        record.player.id.bytes,
+        shot.shot_variant.id.bytes,
+        shot.board.id.bytes,
+        *shot.tile_position,
+        shot.orientation,
+    )
+
+
+def _shot_loads(data: memoryview):
+    player, shot_variant, board, col, row, orientation = SHOT_RECORD.unpack(data)
+    return ShotRecord(
+        models.PlayerId(_uuid(player)),
+        models.Shot(
+            models.ShotVariantId(_uuid(shot_variant)),
+            (col, row),
+            orientation,
+            models.BoardId(_uuid(board)),
+        ),
+    )
+
+
+# id, player, width, height, number of ships, number of obstacles
+BOARD_RECORD = struct.Struct("<16s16sBBBB")
+# id, ship variant, orientation, col, row of the first tile
+BOARD_SHIP_RECORD = struct.Struct("<16s16sBBB")
+# cell, obstacle variant
+BOARD_OBSTACLE_RECORD = struct.Struct("<B16s")
+
+
+def _board_dumps(record: BoardRecord):
+    data = bytearray(
+        BOARD_RECORD.pack(
+            record.id.bytes,
+            record.player.id.bytes,
+            record.width,
+            record.height,
+            len(record.ship),
+            len(record.obstacles),
+        )
+    )
+    for ship in record.ship:
+        data += BOARD_SHIP_RECORD.pack(
+            ship.id.bytes,
+            ship.ship_variant.id.bytes,
+            ship.orientation,
+            *ship.tile_position[0],
+        )
+    for cell, obstacle_variant in record.obstacles:
+        data += BOARD_OBSTACLE_RECORD.pack(cell, obstacle_variant.id.bytes)
+    return bytes(data)
+
+
+def _board_loads(data: memoryview):
+    board_id, player, width, height, ships, obstacles = BOARD_RECORD.unpack_from(data)
+    pos = BOARD_RECORD.size
+    ship = []
+    for _ in range(ships):
+        ship_id, ship_variant, orientation, col, row = BOARD_SHIP_RECORD.unpack_from(
+            data, pos
+        )
+        pos += BOARD_SHIP_RECORD.size
+        ship_variant = models.ShipVariantId(_uuid(ship_variant))
+        footprint = geometry.ship_footprint(ship_variant, orientation)
+        first_col, first_row = footprint.offsets[0]
+        ship.append(
+            models.Ship(
+                _uuid(ship_id),
+                ship_variant,
+                footprint.locations((col - first_col, row - first_row)),
+                orientation,
+            )
+        )
+    obstacle = []
+    for _ in range(obstacles):
+        cell, obstacle_variant = BOARD_OBSTACLE_RECORD.unpack_from(data, pos)
+        pos += BOARD_OBSTACLE_RECORD.size
+        obstacle.append((cell, models.ObstacleVariantId(_uuid(obstacle_variant))))
+    return BoardRecord(
+        _uuid(board_id),
+        models.PlayerId(_uuid(player)),
+        width,
+        height,
+        ship,
+        obstacle,
+    )
+
+
+# shots, turns and boards make up most of a log so they are packed by hand,
+# the rare and nested ones go through cbor2
+RECORD_DUMPS: dict[ReplayEvent, Callable[[Any], bytes]] = {
+    ReplayEvent.JOIN: cbor2_codec.make_dumps(models.PlayerInfo),
+    ReplayEvent.LEAVE: _player_dumps,
+    ReplayEvent.READY: _player_dumps,
+    ReplayEvent.BOARD: _board_dumps,
+    ReplayEvent.TURN_START: _empty_dumps,
+    ReplayEvent.TURN_TIMEOUT: _empty_dumps,
+    ReplayEvent.SHOT: _shot_dumps,
+    ReplayEvent.EMOTE: cbor2_codec.make_dumps(models.EmoteDisplayData),
+    ReplayEvent.SURRENDER: _player_dumps,
+    ReplayEvent.LOST: _player_dumps,
+}
+RECORD_LOADS: dict[ReplayEvent, Callable[[memoryview], Any]] = {
+    ReplayEvent.JOIN: cbor2_codec.make_loads(models.PlayerInfo),
+    ReplayEvent.LEAVE: _player_loads,
+    ReplayEvent.READY: _player_loads,
+    ReplayEvent.BOARD: _board_loads,
+    ReplayEvent.TURN_START: _empty_loads,
+    ReplayEvent.TURN_TIMEOUT: _empty_loads,
+    ReplayEvent.SHOT: _shot_loads,
+    ReplayEvent.EMOTE: cbor2_codec.make_loads(models.EmoteDisplayData),
+    ReplayEvent.SURRENDER: _player_loads,
+    ReplayEvent.LOST: _player_loads,
+}
+_EVENTS = {event.value: event for event in ReplayEvent}
+
+
+def _read_varint(data: memoryview, pos: int):
+    # deltas and lengths nearly always fit in one byte
+    if pos < len(data) and data[pos] < 0x80:
+        return data[pos], pos + 1
+    if (value := decode_varint(data, pos)) is None:
+        raise ValueError("replay log truncated")
+    return value
+
+
+MAGIC = b"BSRP"
+VERSION = 1
+# magic, version, start_private, seed, wall clock start, room id
+HEADER = struct.Struct("<4sB?Qd16s")
+
+
+@dataclass
+class ReplayLog:
+    # every event that changed a room, each one is the event byte, the ms since
+    # the event before it and the length of its payload, both varints.
+    # with the seed of the room that is enough to play the room again
+    room: UUID
+    start_private: bool
+    seed: int
+    started: float = field(default_factory=time.time)
+    clock: Callable[[], float] = field(default=time.monotonic, repr=False)
+    data: bytearray = field(default_factory=bytearray, repr=False)
+    origin: float = field(init=False, repr=False)
+    # ms since origin of the last event appended
+    last: int = field(init=False, default=0)
+
+    def __post_init__(self):
+        self.origin = self.clock()
+
+    def append(self, event: ReplayEvent, payload: Any):
+        now = round((self.clock() - self.origin) * 1000)
+        payload = RECORD_DUMPS[event](payload)
+        data = self.data
+        data.append(event)
+        data += encode_varint(max(now - self.last, 0))
+        data += encode_varint(len(payload))
+        data += payload
+        self.last = max(now, self.last)
+
+    def records(self) -> Iterator[tuple[ReplayEvent, int, memoryview]]:
+        # payloads are left encoded, ms are since the start of the log
+        data = memoryview(self.data)
+        size = len(data)
+        pos = 0
+        now = 0
+        while pos < size:
+            if (event := _EVENTS.get(data[pos], None)) is None:
+                raise ValueError("unknown replay event")
+            delta, pos = _read_varint(data, pos + 1)
+            length, pos = _read_varint(data, pos)
+            now += delta
+            if pos + length > size:
+                raise ValueError("replay log truncated")
+            yield event, now, data[pos : pos + length]
+            pos += length
+
+    def events(self) -> Iterator[tuple[ReplayEvent, int, Any]]:
+        for event, now, payload in self.records():
+            yield event, now, RECORD_LOADS[event](payload)
+
+    def to_bytes(self):
+        return (
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                self.start_private,
+                self.seed,
+                self.started,
+                self.room.bytes,
+            )
+            + self.data
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        magic, version, start_private, seed, started, room = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a replay log")
+        # loaded logs are read back, anything appended would be timed from now
+        return cls(
+            UUID(bytes=room),
+            start_private,
+            seed,
+            started,
+            data=bytearray(data[HEADER.size :]),
+        )
+
+    def save(self, path: str):
+        with open(path, "wb") as file:
+            file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as file:
+            return cls.from_bytes(file.read())
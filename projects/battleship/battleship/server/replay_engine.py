@@ -0,0 +1,294 @@
+import argparse
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass, field, replace
+import random
+import time
+from typing import Any
+from uuid import UUID
+
+from .bitboard import BitBoard
+from .directory import LocalRoomDirectory
+from .models import Room
+from .rating import EloRatingSystem, RatingSystem
+from .replay import RECORD_LOADS, SHOT_RECORD, ReplayEvent, ReplayLog
+from ..shared import geometry, models, shot_type
+
+
+class ReplayMismatch(Exception):
+    pass
+
+
+class ReplayTimer:
+    def cancel(self):
+        pass
+
+
+class ReplayTimers:
+    # nothing fires on its own, the log says when the turn timers did
+    def call_later(self, _delay: float, _callback: Callable[[], Any]):
+        return ReplayTimer()
+
+
+@dataclass
+class ReplayServer:
+    # just enough of BattleshipServer for a room to run without sockets or a
+    # database, every player id stands in for its own session
+    rating_system: RatingSystem = field(default_factory=EloRatingSystem)
+    players: dict[models.PlayerId, models.PlayerInfo] = field(default_factory=dict)
+    known_player_session: dict[models.PlayerId, models.PlayerId] = field(
+        default_factory=dict
+    )
+    known_player_session_rev: dict[models.PlayerId, models.PlayerId] = field(
+        default_factory=dict
+    )
+    rooms: dict[models.RoomId, Room] = field(default_factory=dict)
+    directory: LocalRoomDirectory = field(default_factory=LocalRoomDirectory)
+    timers: ReplayTimers = field(default_factory=ReplayTimers)
+    match_room_size: int = 8
+    worker: int = 0
+    replay_dir: str | None = None
+
+    def player_add(self, player_info: models.PlayerInfo):
+        player_id = models.PlayerId.from_player_info(player_info)
+        self.players[player_id] = player_info
+        self.known_player_session[player_id] = player_id
+        self.known_player_session_rev[player_id] = player_id
+        return player_id
+
+    async def broadcast(self, _name: str, _sessions: Any, _args: Any, streams=()):
+        pass
+
+    def on_session_leave(self, _session: Any, _callback: Any):
+        pass
+
+    def off_session_leave(self, _session: Any, _callback: Any):
+        pass
+
+    async def player_info_get(self, _session: Any, args: models.PlayerId):
+        return self.players[args]
+
+    async def _players_settle(
+        self,
+        rating_changes: dict[models.PlayerId, int],
+        coin_changes: dict[models.PlayerId, int],
+    ):
+        settled = {}
+        for player_id in rating_changes.keys() | coin_changes.keys():
+            player = self.players[player_id]
+            settled[player_id] = self.players[player_id] = replace(
+                player, rating=player.rating + rating_changes.get(player_id, 0)
+            )
+        return settled
+
+    async def on_game_end(self, _session: Any, _args: models.GameEndData):
+        pass
+
+
+async def replay(log: ReplayLog, server: ReplayServer | None = None) -> Room:
+    # plays the log through a room seeded the same way, the room logs again as
+    # it goes and that has to come out the same as the log it was given
+    if server is None:
+        server = ReplayServer()
+    now = 0
+    room = Room(log.room, server, log.start_private, seed=log.seed)
+    room.replay = ReplayLog(
+        log.room, log.start_private, log.seed, log.started, clock=lambda: now / 1000
+    )
+    room_id = room.to_room_id()
+    server.rooms[room_id] = room
+    for event, now, payload in log.events():
+        match event:
+            case ReplayEvent.JOIN:
+                await room.add_player(server.player_add(payload))
+            case ReplayEvent.LEAVE:
+                await room.remove_player(payload)
+            case ReplayEvent.READY:
+                await room.add_ready(payload)
+            case ReplayEvent.BOARD:
+                await room.add_board_submit(payload.to_bitboard(room_id))
+            case ReplayEvent.TURN_START:
+                await room.on_turn_start(room.turn)
+            case ReplayEvent.TURN_TIMEOUT:
+                await room.on_turn_timeout(room.turn)
+            case ReplayEvent.SHOT:
+                await room.do_shot_submit(payload.player, payload.shot)
+            case ReplayEvent.EMOTE:
+                await room.do_emote_display(payload.player, payload.emote)
+            case ReplayEvent.SURRENDER:
+                await room.do_surrender(payload)
+    expected = [(event, bytes(payload)) for event, _, payload in log.records()]
+    got = [(event, bytes(payload)) for event, _, payload in room.replay.records()]
+    if expected != got:
+        at = next(
+            (i for i, (e, g) in enumerate(zip(expected, got)) if e != g),
+            min(len(expected), len(got)),
+        )
+        raise ReplayMismatch(f"replay diverged at event {at}")
+    return room
+
+
+async def replay_many(logs: list[ReplayLog]):
+    return [await replay(log) for log in logs]
+
+
+# what a shot does, looked up by the raw variant id of a shot record
+SHOT_RULES = {
+    variant_id.bytes: (
+        geometry.SHOT_FOOTPRINTS[variant_id],
+        variant.number_of_shot,
+        variant.reveal,
+    )
+    for variant_id, variant in shot_type.SHOT_VARIANTS.items()
+}
+
+
+@dataclass
+class SimulatedGame:
+    # from the first player to lose to the winner
+    placement: list[models.PlayerId]
+    shots: int
+    hits: int
+
+
+@dataclass
+class Simulation:
+    # the rules of Room again on raw ids, without locks, broadcasts or views,
+    # drawing from the rng in the same order so a log plays out the same way.
+    # ratings are left out since neither turn order nor anything random
+    # depends on them, losses are checked against the ones in the log
+    rng: random.Random
+    players: dict[bytes, models.PlayerInfo] = field(default_factory=dict)
+    readies: set[bytes] = field(default_factory=set)
+    started: bool = False
+    alive: list[bytes] = field(default_factory=list)
+    lost: list[bytes] = field(default_factory=list)
+    boards: dict[bytes, BitBoard] = field(default_factory=dict)
+    shots: int = 0
+    hits: int = 0
+    games: list[SimulatedGame] = field(default_factory=list)
+    lost_pending: deque[bytes] = field(default_factory=deque)
+
+    def reset(self):
+        self.started = True
+        if not self.lost:
+            self.alive = [*self.players]
+            self.rng.shuffle(self.alive)
+        else:
+            self.alive = [p for p in self.lost if p in self.players]
+        self.lost = []
+        self.boards = {}
+        self.shots = 0
+        self.hits = 0
+
+    def player_lost(self, player: bytes, remove: bool = False):
+        if remove:
+            del self.players[player]
+        if player in self.alive:
+            self.alive.remove(player)
+            self.lost.append(player)
+        self.lost_pending.append(player)
+        if len(self.alive) == 1:
+            self.lost.append(self.alive.pop())
+            self.readies = set()
+            self.games.append(
+                SimulatedGame(
+                    [models.PlayerId(UUID(bytes=p)) for p in self.lost],
+                    self.shots,
+                    self.hits,
+                )
+            )
+
+    def shot(self, shot_variant: bytes, board: bytes, col, row, orientation):
+        footprints, number_of_shot, reveal = SHOT_RULES[shot_variant]
+        picks = self.rng.sample(
+            footprints[orientation].locations((col, row)), number_of_shot
+        )
+        self.shots += 1
+        if reveal:
+            return
+        bitboard = self.boards[board]
+        remaining = bitboard.remaining
+        for location in picks:
+            if (cell := bitboard.cell(*location)) is not None:
+                bitboard.hit(cell)
+        self.hits += remaining - bitboard.remaining
+        if bitboard.lost:
+            self.player_lost(bitboard.player.id.bytes)
+
+
+def simulate(log: ReplayLog) -> Simulation:
+    simulation = Simulation(random.Random(log.seed))
+    for i, (event, _, payload) in enumerate(log.records()):
+        match event:
+            case ReplayEvent.SHOT:
+                player, shot_variant, board, col, row, orientation = SHOT_RECORD.unpack(
+                    payload
+                )
+                if not simulation.alive or simulation.alive[0] != player:
+                    raise ReplayMismatch(f"replay diverged at event {i}")
+                simulation.shot(shot_variant, board, col, row, orientation)
+            case ReplayEvent.TURN_START:
+                simulation.alive.insert(0, simulation.alive.pop())
+            case ReplayEvent.LOST:
+                if (
+                    not simulation.lost_pending
+                    or simulation.lost_pending.popleft() != payload
+                ):
+                    raise ReplayMismatch(f"replay diverged at event {i}")
+            case ReplayEvent.JOIN:
+                player_info = RECORD_LOADS[event](payload)
+                simulation.players[player_info.id.bytes] = player_info
+            case ReplayEvent.READY:
+                simulation.readies.add(bytes(payload))
+                if len(simulation.players) > 1 and len(simulation.readies) == len(
+                    simulation.players
+                ):
+                    simulation.reset()
+            case ReplayEvent.BOARD:
+                board = RECORD_LOADS[event](payload)
+                simulation.boards[board.id.bytes] = board.to_bitboard(
+                    models.RoomId(log.room)
+                )
+            case ReplayEvent.SURRENDER:
+                simulation.player_lost(bytes(payload))
+            case ReplayEvent.LEAVE:
+                if simulation.started:
+                    simulation.player_lost(bytes(payload), remove=True)
+                else:
+                    simulation.readies.discard(bytes(payload))
+                    del simulation.players[bytes(payload)]
+    if simulation.lost_pending:
+        raise ReplayMismatch("replay lost players the log did not")
+    return simulation
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+")
+    # plays every log through a room instead, slower but checks each event
+    parser.add_argument("-e", "--exact", action="store_true")
+    args = parser.parse_args()
+
+    replay_logs = [ReplayLog.load(path) for path in args.paths]
+    start = time.perf_counter()
+    if args.exact:
+        rooms = asyncio.run(replay_many(replay_logs))
+        elapsed = time.perf_counter() - start
+        for path, room in zip(args.paths, rooms):
+            # winner first, empty when the room closed before a game finished
+            print(path, " > ".join(p.name for p in reversed(room.lost_players)))
+        print(f"{len(rooms)} rooms in {elapsed:.3f}s")
+    else:
+        simulations = [simulate(replay_log) for replay_log in replay_logs]
+        elapsed = time.perf_counter() - start
+        for path, simulation in zip(args.paths, simulations):
+            for game in simulation.games:
+                print(
+                    path,
+                    " > ".join(str(p.id) for p in reversed(game.placement)),
+                    f"{game.hits}/{game.shots} hits",
+                )
+        games = sum(len(simulation.games) for simulation in simulations)
+        print(f"{games} games in {elapsed:.3f}s")
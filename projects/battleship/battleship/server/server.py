@@ -1,27 +1,40 @@
 import asyncio
-from collections.abc import Callable
-from dataclasses import dataclass, field
+from collections.abc import Callable, Collection
+from dataclasses import dataclass, field, replace
 from functools import wraps
+import logging
 import os
 import random
 import ssl
-import string
 from typing import Any, TypeVar
-from uuid import uuid4
+from uuid import UUID, uuid4
 
 from dotenv import load_dotenv
 from tsocket.server import Server, Route, emit
 from tsocket.shared import Empty, ResponseError, Session
-from sqlalchemy import delete, insert, select, update
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
 
 from . import db
 from . import models as server_models
+from . import validation
+from .directory import (
+    LocalRoomDirectory,
+    MatchMergeQuery,
+    MatchQuery,
+    RoomDirectory,
+    RoomPlacement,
+)
+from .rating import EloRatingSystem, RatingSystem
+from .timer import Timer, TimerWheel
+from .write_behind import PlayerWriteBehind
 from ..shared import models, emote_type
 from ..shared.ship_type import NORMAL_NAVY_SHIP_VARIANT
 from ..shared.logging import setup_logging
 
 
+log = logging.getLogger(__name__)
+
 BearingPlayerAuthT = TypeVar("BearingPlayerAuthT", bound=models.BearingPlayerAuth)
 
 
@@ -32,16 +45,54 @@ class BattleshipServer(Server):
     known_player_session_rev: dict[Session, models.PlayerId] = field(
         default_factory=dict
     )
+    # players bound to a session by auth token, dropped when the session leaves
+    player_cache: dict[UUID, models.Player] = field(default_factory=dict)
+    player_cache_rev: dict[models.PlayerId, UUID] = field(default_factory=dict)
     rooms: dict[models.RoomId, server_models.Room] = field(default_factory=dict)
-    match_rooms: set[models.RoomId] = field(default_factory=set)
-    private_room_codes: dict[str, models.RoomId] = field(default_factory=dict)
-    private_room_codes_rev: dict[models.RoomId, str] = field(default_factory=dict)
+    directory: RoomDirectory = field(default_factory=LocalRoomDirectory, kw_only=True)
+    # index of this process in a worker pool and the port each worker also
+    # listens on by itself, so players can be sent to the worker of their room
+    worker: int = field(default=0, kw_only=True)
+    worker_ports: list[int] = field(default_factory=list, kw_only=True)
+    rating_system: RatingSystem = field(default_factory=EloRatingSystem, kw_only=True)
+    match_room_size: int = field(default=8, kw_only=True)
+    # how often rooms waiting in matchmaking are checked for one to merge with
+    match_merge_interval: float = field(default=2, kw_only=True)
+    match_merge_timer: Timer | None = field(init=False, default=None)
+    # every room schedules its turn timers here
+    timers: TimerWheel = field(default_factory=TimerWheel, kw_only=True)
+    rng: random.Random = field(default_factory=random.Random, kw_only=True)
+    # where the replay log of each room is written once the room closes
+    replay_dir: str | None = field(
+        default_factory=lambda: os.environ.get("REPLAY_DIR"), kw_only=True
+    )
+    write_behind: PlayerWriteBehind = field(init=False)
+
+    def __post_init__(self):
+        super().__post_init__()
+        self.write_behind = PlayerWriteBehind(self.db_session_maker)
+        self.on_shutdown(self.write_behind.close)
+        self.on_shutdown(self.timers.close)
+
+    def _player_cache_update(self, player: models.Player):
+        if models.PlayerId.from_player(player) in self.player_cache_rev:
+            self.player_cache[player.auth_token] = player
+        return player
+
+    def _player_cache_drop(self, player_id: models.PlayerId):
+        if (auth_token := self.player_cache_rev.pop(player_id, None)) is not None:
+            del self.player_cache[auth_token]
 
     async def _player_get(self, args: models.BearingPlayerAuth) -> models.Player:
+        if (player := self.player_cache.get(args.auth_token, None)) is not None:
+            return player
+        # rows on disk are only current once queued changes are written
+        await self.write_behind.flush()
         async with self.db_session_maker() as db_session:
             stmt = (
                 select(db.Player)
                 .where(db.Player.auth_token == args.auth_token)
+                .options(*db.PLAYER_LOAD_OPTIONS)
                 .limit(1)
             )
             result = await db_session.execute(stmt)
@@ -51,31 +102,116 @@ class BattleshipServer(Server):
             else:
                 raise ResponseError("not_found", b"")
 
-    async def _player_update(
-        self, player: models.PlayerId, rating_changes: int, coin_changes: int
-    ) -> models.Player:
-        async with self.db_session_maker() as db_session:
-            stmt = (
-                update(db.Player)
-                .where(db.Player.id == player.id)
-                .values(
-                    rating=db.Player.rating + rating_changes,
-                    coins=db.Player.coins + coin_changes,
+    async def _players_load(
+        self, player_ids: Collection[models.PlayerId]
+    ) -> dict[models.PlayerId, models.Player]:
+        players = {
+            player_id: self.player_cache[auth_token]
+            for player_id in player_ids
+            if (auth_token := self.player_cache_rev.get(player_id, None)) is not None
+        }
+        if missing := [p.id for p in player_ids if p not in players]:
+            await self.write_behind.flush()
+            async with self.db_session_maker() as db_session:
+                stmt = (
+                    select(db.Player)
+                    .where(db.Player.id.in_(missing))
+                    .options(*db.PLAYER_LOAD_OPTIONS)
                 )
-                .returning(db.Player)
+                result = await db_session.execute(stmt)
+                for player in await db.Player.to_shared_many(
+                    db_session, result.scalars().all()
+                ):
+                    players[models.PlayerId.from_player(player)] = player
+        return players
+
+    async def _players_settle(
+        self,
+        rating_changes: dict[models.PlayerId, int],
+        coin_changes: dict[models.PlayerId, int],
+    ) -> dict[models.PlayerId, models.Player]:
+        # applied to the players in memory right away, the database catches up
+        # when the write behind queue flushes
+        players = await self._players_load(rating_changes.keys() | coin_changes.keys())
+        settled = {}
+        for player_id, player in players.items():
+            rating_change = rating_changes.get(player_id, 0)
+            coin_change = coin_changes.get(player_id, 0)
+            self.write_behind.change(
+                player_id.id, rating=rating_change, coins=coin_change
             )
-            result = await db_session.execute(stmt)
-            await db_session.commit()
+            settled[player_id] = self._player_cache_update(
+                replace(
+                    player,
+                    rating=player.rating + rating_change,
+                    coins=player.coins + coin_change,
+                )
+            )
+        return settled
 
-            if db_player := result.scalars().one_or_none():
-                return await db_player.to_shared(db_session)
-            else:
-                raise ResponseError("not_found", b"")
+    def schedule_match_merge(self):
+        if self.match_merge_timer is None:
+            self.match_merge_timer = self.timers.call_later(
+                self.match_merge_interval, self._match_merge_fire
+            )
+
+    def _match_merge_fire(self):
+        task = asyncio.create_task(self._match_merge())
+        task.add_done_callback(self._match_merge_done)
+
+    def _match_merge_done(self, task: asyncio.Task):
+        self.match_merge_timer = None
+        if not task.cancelled() and (err := task.exception()) is not None:
+            log.error("%s", err, exc_info=err)
+        # keeps going for as long as any room here is still waiting
+        if any(
+            room.matchable
+            and room.phase == server_models.RoomPhase.LOBBY
+            and 0 < len(room.players) < self.match_room_size
+            for room in self.rooms.values()
+        ):
+            self.schedule_match_merge()
+
+    async def _match_merge(self):
+        moves = await self.directory.match_merge(
+            MatchMergeQuery(self.worker, self.match_room_size)
+        )
+        for move in moves:
+            room = self.rooms.get(move.room.placement.room)
+            into = self.rooms.get(move.into.placement.room)
+            # either room may have started or closed since it was listed
+            if (
+                room is None
+                or into is None
+                or room.phase != server_models.RoomPhase.LOBBY
+                or into.phase != server_models.RoomPhase.LOBBY
+                or len(room.players) + len(into.players) > self.match_room_size
+            ):
+                for waiting in (room, into):
+                    if waiting is not None:
+                        await waiting.match_put()
+                continue
+            try:
+                for player_id in [*room.players.keys()]:
+                    await room.remove_player(player_id)
+                    await into.add_player(player_id)
+                    await self.on_room_move(
+                        self.known_player_session[player_id], into.to_room_info()
+                    )
+            finally:
+                await room.match_put()
+                await into.match_put()
+
+    def redirect(self, placement: RoomPlacement):
+        raise ResponseError(
+            "redirect", f":{self.worker_ports[placement.worker]}".encode()
+        )
 
     async def remove_session(self, session: Session):
         player_id = self.known_player_session_rev[session]
         del self.known_player_session_rev[session]
         del self.known_player_session[player_id]
+        self._player_cache_drop(player_id)
 
     @staticmethod
     def ensure_session_player(
@@ -95,6 +231,8 @@ class BattleshipServer(Server):
             else:
                 self.known_player_session[player_id] = session
                 self.known_player_session_rev[session] = player_id
+                self.player_cache[player.auth_token] = player
+                self.player_cache_rev[player_id] = player.auth_token
                 self.on_session_leave(session, self.remove_session)
             return await func(self, session, args)
 
@@ -117,6 +255,7 @@ class BattleshipServer(Server):
             db_player.ships = [
                 db.Ship(variant_id=NORMAL_NAVY_SHIP_VARIANT.id) for _ in range(4)
             ]
+            db_player.emotes = []
 
             db_session.add(db_player)
             await db_session.commit()
@@ -127,22 +266,13 @@ class BattleshipServer(Server):
     async def player_avatar_set(
         self, _session: Session, args: models.PlayerAvatarSetArgs
     ) -> models.Player:
-        async with self.db_session_maker() as db_session:
-            stmt = (
-                update(db.Player)
-                .where(db.Player.auth_token == args.auth_token)
-                .values(
-                    avatar=args.avatar.id,
-                )
-                .returning(db.Player)
+        player = await self._player_get(args)
+        self.write_behind.change(player.id, avatar=args.avatar.id)
+        return self._player_cache_update(
+            replace(
+                player, avatar=models.AvatarVariantId.from_avatar_variant(args.avatar)
             )
-            result = await db_session.execute(stmt)
-            await db_session.commit()
-
-            if db_player := result.scalars().one_or_none():
-                return await db_player.to_shared(db_session)
-            else:
-                raise ResponseError("not_found", b"")
+        )
 
     @Route.simple
     @ensure_session_player
@@ -155,8 +285,16 @@ class BattleshipServer(Server):
     async def player_info_get(
         self, _session: Session, args: models.PlayerId
     ) -> models.PlayerInfo:
+        if (auth_token := self.player_cache_rev.get(args, None)) is not None:
+            return models.PlayerInfo.from_player(self.player_cache[auth_token])
+        await self.write_behind.flush()
         async with self.db_session_maker() as db_session:
-            stmt = select(db.Player).where(db.Player.id == args.id).limit(1)
+            stmt = (
+                select(db.Player)
+                .where(db.Player.id == args.id)
+                .options(*db.PLAYER_LOAD_OPTIONS)
+                .limit(1)
+            )
             result = await db_session.execute(stmt)
 
             if db_player := result.scalars().one_or_none():
@@ -171,17 +309,23 @@ class BattleshipServer(Server):
     async def player_delete(
         self, _session: Session, args: models.BearingPlayerAuth
     ) -> models.Player:
+        await self.write_behind.flush()
         async with self.db_session_maker() as db_session:
             stmt = (
                 delete(db.Player)
                 .where(db.Player.auth_token == args.auth_token)
                 .returning(db.Player)
+                .options(*db.PLAYER_LOAD_OPTIONS)
             )
             result = await db_session.execute(stmt)
             await db_session.commit()
 
             if db_player := result.scalars().one_or_none():
-                return await db_player.to_shared(db_session)
+                player = await db_player.to_shared(db_session)
+                self._player_cache_drop(models.PlayerId.from_player(player))
+                # anything queued since the flush above has no row to go to
+                await self.write_behind.drop(player.id)
+                return player
             else:
                 raise ResponseError("not_found", b"")
 
@@ -197,6 +341,10 @@ class BattleshipServer(Server):
     async def on_room_delete(self, _session: Session, args: Empty):
         raise NotImplementedError()
 
+    @emit
+    async def on_room_move(self, _session: Session, args: models.RoomInfo):
+        raise NotImplementedError()
+
     @emit
     async def on_room_player_ready(self, _session: Session, args: models.PlayerId):
         raise NotImplementedError()
@@ -243,6 +391,10 @@ class BattleshipServer(Server):
     async def on_game_reset(self, _session: Session, args: Empty):
         raise NotImplementedError()
 
+    @emit
+    async def on_room_spectate_drop(self, _session: Session, args: models.RoomId):
+        raise NotImplementedError()
+
     @emit
     async def on_emote_display(self, _session: Session, args: models.EmoteDisplayData):
         raise NotImplementedError()
@@ -250,19 +402,30 @@ class BattleshipServer(Server):
     @Route.simple
     @ensure_session_player
     async def room_match(
-        self, _session: Session, args: models.BearingPlayerAuth
+        self, session: Session, args: models.BearingPlayerAuth
     ) -> models.RoomInfo:
+        player_id = self.known_player_session_rev[session]
         player = await self._player_get(args)
-        player_id = models.PlayerId.from_player(player)
-        try:
-            room_id = self.match_rooms.pop()
-            room = self.rooms[room_id]
-        except KeyError:
+        match_room = await self.directory.match_take(
+            MatchQuery(self.worker, player.rating)
+        )
+        if match_room is not None and match_room.placement.worker != self.worker:
+            await self.directory.match_put(match_room)
+            self.redirect(match_room.placement)
+        if (
+            match_room is None
+            or (room := self.rooms.get(match_room.placement.room)) is None
+        ):
             room = server_models.Room(uuid4(), self, start_private=False)
-            room_id = room.to_room_id()
-            self.rooms[room_id] = room
-        await room.add_player(player_id)
-        self.match_rooms.add(room_id)
+            room.matchable = True
+            self.rooms[room.to_room_id()] = room
+        # the room is out of matchmaking from match_take on, so it goes back
+        # even when the player cannot join it
+        try:
+            await room.add_player(player_id)
+        finally:
+            await room.match_put()
+        self.schedule_match_merge()
         return room.to_room_info()
 
     @Route.simple
@@ -288,36 +451,55 @@ class BattleshipServer(Server):
         if (room := self.rooms.get(args, None)) and (
             (player_id := self.known_player_session_rev[session]) in room
         ):
-            await room.do_player_lost(player_id)
+            await room.do_surrender(player_id)
+            return Empty()
+        raise ResponseError("not_found", b"")
+
+    @Route.simple
+    async def room_spectate(
+        self, session: Session, args: models.RoomId
+    ) -> models.RoomInfo:
+        if (room := self.rooms.get(args, None)) and (
+            self.known_player_session_rev[session] not in room
+        ):
+            await room.add_spectator(session)
+            return room.to_room_info()
+        raise ResponseError("not_found", b"")
+
+    @Route.simple
+    async def room_spectate_leave(self, session: Session, args: models.RoomId) -> Empty:
+        if (room := self.rooms.get(args, None)) and session in room.spectators:
+            await room.remove_spectator(session)
             return Empty()
         raise ResponseError("not_found", b"")
 
     @Route.simple
     @ensure_session_player
     async def private_room_create(
-        self, _session: Session, args: models.BearingPlayerAuth
+        self, session: Session, args: models.BearingPlayerAuth
     ) -> models.PrivateRoomCreateResults:
-        player = await self._player_get(args)
-        player_id = models.PlayerId.from_player(player)
+        player_id = self.known_player_session_rev[session]
         room = server_models.Room(uuid4(), self, start_private=True)
         room_id = room.to_room_id()
         self.rooms[room_id] = room
-        join_code = "".join(random.choice(string.ascii_lowercase) for _ in range(6))
-        self.private_room_codes[join_code] = room_id
+        join_code = await self.directory.private_code_create(
+            RoomPlacement(room_id, self.worker)
+        )
         await room.add_player(player_id)
         return models.PrivateRoomCreateResults(room.to_room_info(), join_code)
 
     @Route.simple
     @ensure_session_player
     async def private_room_join(
-        self, _session: Session, args: models.PrivateRoomJoinArgs
+        self, session: Session, args: models.PrivateRoomJoinArgs
     ) -> models.RoomInfo:
-        player = await self._player_get(args)
-        player_id = models.PlayerId.from_player(player)
-        if room_id := self.private_room_codes.get(args.join_code, None):
-            room = self.rooms[room_id]
-            await room.add_player(player_id)
-            return room.to_room_info()
+        player_id = self.known_player_session_rev[session]
+        if placement := await self.directory.private_code_get(args.join_code):
+            if placement.worker != self.worker:
+                self.redirect(placement)
+            if room := self.rooms.get(placement.room, None):
+                await room.add_player(player_id)
+                return room.to_room_info()
         raise ResponseError("not_found", b"")
 
     @Route.simple
@@ -325,7 +507,9 @@ class BattleshipServer(Server):
         if (room := self.rooms.get(args, None)) and (
             self.known_player_session_rev[session] in room
         ):
-            self.match_rooms.add(args)
+            room.matchable = True
+            await room.match_put()
+            self.schedule_match_merge()
             return Empty()
         raise ResponseError("not_found", b"")
 
@@ -336,7 +520,12 @@ class BattleshipServer(Server):
             and ((player_id := self.known_player_session_rev[session]) == args.player)
             and player_id in room
         ):
-            await room.add_board_submit(args)
+            player = (await self._players_load([player_id]))[player_id]
+            try:
+                board = validation.board_check(args, player.ships)
+            except validation.BoardInvalid as err:
+                raise ResponseError("invalid_board", str(err).encode()) from err
+            await room.add_board_submit(board)
             return Empty()
         raise ResponseError("not_found", b"")
 
@@ -361,6 +550,17 @@ class BattleshipServer(Server):
             return await room.do_shot_submit(player_id, args.shot)
         raise ResponseError("not_found", b"")
 
+    @Route.simple
+    async def game_view_get(
+        self, session: Session, args: models.GameViewArgs
+    ) -> models.GameView:
+        if (room := self.rooms.get(args.room, None)) and (
+            (player_id := self.known_player_session_rev[session]) in room
+            or session in room.spectators
+        ):
+            return room.game_view(player_id, args.since)
+        raise ResponseError("not_found", b"")
+
     @Route.simple
     async def emote_display(
         self, session: Session, args: models.EmoteDisplayArgs
@@ -372,33 +572,21 @@ class BattleshipServer(Server):
             return Empty()
         raise ResponseError("not_found", b"")
 
-    def _gacha(self, db_session: AsyncSession, db_player: db.Player):
-        emote = random.choice([*emote_type.EMOTE_VARIANTS.keys()])
-        db_player.coins -= 100
-        db_player.emotes.append(db.Emote(variant_id=emote))
-        db_session.add(db_player)
-        return emote
-
     @Route.simple
     @ensure_session_player
     async def gacha(
-        self, session: Session, args: models.BearingPlayerAuth
+        self, _session: Session, args: models.BearingPlayerAuth
     ) -> models.GachaResult:
-        async with self.db_session_maker() as db_session:
-            stmt = (
-                select(db.Player)
-                .where(db.Player.auth_token == args.auth_token, db.Player.coins >= 100)
-                .limit(1)
-            )
-            result = await db_session.execute(stmt)
-
-            if (db_player := result.scalars().one_or_none()) is not None:
-                emote = await db_session.run_sync(
-                    lambda _: self._gacha(db_session, db_player)
-                )
-                await db_session.commit()
-                return models.GachaResult(
-                    await db_player.to_shared(db_session), models.EmoteVariantId(emote)
+        player = await self._player_get(args)
+        if player.coins < 100:
+            raise ResponseError("not_found", b"")
+        emote = self.rng.choice([*emote_type.EMOTE_VARIANTS.keys()])
+        self.write_behind.change(player.id, coins=-100, emotes=[emote])
+        return models.GachaResult(
+            self._player_cache_update(
+                replace(
+                    player, coins=player.coins - 100, emotes=[*player.emotes, emote]
                 )
-            else:
-                raise ResponseError("not_found", b"")
+            ),
+            models.EmoteVariantId(emote),
+        )
@@ -0,0 +1,113 @@
+import asyncio
+from collections.abc import Callable
+import contextlib
+from dataclasses import dataclass, field
+import logging
+import math
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(eq=False)
+class Timer:
+    expiry: int
+    callback: Callable[[], Any]
+    wheel: "TimerWheel"
+    slot: dict["Timer", None] | None = None
+
+    def cancel(self):
+        if self.slot is not None:
+            del self.slot[self]
+            self.slot = None
+            self.wheel.count -= 1
+
+
+@dataclass
+class TimerWheel:
+    # hierarchical wheel, level n holds timers due within slots ** (n + 1)
+    # ticks and is cascaded into the level below each time it comes around
+    tick: float = 0.1
+    slots: int = 64
+    levels: int = 4
+    wheels: list[list[dict[Timer, None]]] = field(init=False)
+    start: float | None = field(init=False, default=None)
+    now: int = field(init=False, default=0)
+    count: int = field(init=False, default=0)
+    task: asyncio.Task | None = field(init=False, default=None)
+
+    def __post_init__(self):
+        self.wheels = [[dict() for _ in range(self.slots)] for _ in range(self.levels)]
+
+    def _current_tick(self, loop: asyncio.AbstractEventLoop):
+        return int((loop.time() - self.start) / self.tick)
+
+    def _insert(self, timer: Timer):
+        delta = timer.expiry - self.now
+        span = 1
+        for wheel in self.wheels:
+            if delta < span * self.slots or wheel is self.wheels[-1]:
+                timer.slot = wheel[(timer.expiry // span) % self.slots]
+                timer.slot[timer] = None
+                return
+            span *= self.slots
+
+    def call_later(self, delay: float, callback: Callable[[], Any]) -> Timer:
+        loop = asyncio.get_running_loop()
+        if self.start is None:
+            self.start = loop.time()
+        if self.task is None:
+            if not self.count:
+                # nothing is pending, so skipping the idle ticks loses nothing
+                self.now = self._current_tick(loop)
+            self.task = asyncio.create_task(self.run())
+        # the first tick boundary at or after the deadline, never before it
+        expiry = math.ceil((loop.time() + delay - self.start) / self.tick)
+        max_expiry = self.now + self.slots**self.levels - 1
+        timer = Timer(min(max(expiry, self.now + 1), max_expiry), callback, self)
+        self._insert(timer)
+        self.count += 1
+        return timer
+
+    def _advance(self):
+        self.now += 1
+        span = self.slots
+        for wheel in self.wheels[1:]:
+            if self.now % span:
+                break
+            slot = wheel[(self.now // span) % self.slots]
+            timers = [*slot.keys()]
+            slot.clear()
+            for timer in timers:
+                self._insert(timer)
+            span *= self.slots
+        slot = self.wheels[0][self.now % self.slots]
+        while slot:
+            timer, _ = slot.popitem()
+            timer.slot = None
+            self.count -= 1
+            try:
+                timer.callback()
+            except Exception as err:  # pylint: disable=W0718
+                log.exception("%s", err)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self.count:
+                await asyncio.sleep(
+                    self.start + (self.now + 1) * self.tick - loop.time()
+                )
+                target = self._current_tick(loop)
+                while self.now < target:
+                    self._advance()
+        finally:
+            self.task = None
+
+    async def close(self):
+        if (task := self.task) is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            # a task cancelled before it first ran never clears itself
+            self.task = None
@@ -0,0 +1,107 @@
+from collections.abc import Collection
+from dataclasses import dataclass
+from uuid import UUID
+
+from .bitboard import BitBoard
+from ..shared import geometry, models, obstacle_type, ship_type
+
+BOARD_WIDTH = 8
+BOARD_HEIGHT = 8
+BOARD_OBSTACLES = 4
+
+
+class BoardInvalid(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class ShipPlacement:
+    locations: tuple[tuple[int, int], ...]
+    cells: tuple[int, ...]
+    mask: int
+
+
+def _ship_placements(footprint: geometry.Footprint):
+    # every anchor that keeps the whole footprint on the board, keyed by the
+    # location of the first offset since that is what tile_position starts with
+    placements = {}
+    for col in range(BOARD_WIDTH):
+        for row in range(BOARD_HEIGHT):
+            if not footprint.in_bounds((col, row), BOARD_WIDTH, BOARD_HEIGHT):
+                continue
+            locations = tuple(footprint.locations((col, row)))
+            cells = tuple(c * BOARD_HEIGHT + r for c, r in locations)
+            placements[locations[0]] = ShipPlacement(
+                locations, cells, sum(1 << cell for cell in cells)
+            )
+    return placements
+
+
+SHIP_PLACEMENTS = {
+    (variant_id, orientation): _ship_placements(footprint)
+    for variant_id, footprints in geometry.SHIP_FOOTPRINTS.items()
+    for orientation, footprint in enumerate(footprints)
+}
+
+# a board carries the whole fleet of one skin, sorted by variant so the order
+# the client lists them in does not matter
+SKIN_FLEETS = {
+    tuple(sorted(variant.id for variant in variants)): frozenset(
+        variant.id for variant in variants
+    )
+    for variants in ship_type.SHIP_SKIN_LOOKUP.values()
+}
+
+
+def board_check(board: models.Board, owned_ships: Collection[UUID]) -> BitBoard:
+    # raises BoardInvalid with the first problem found, otherwise returns the
+    # board ready to be played on
+    if len(board.grid) != BOARD_WIDTH or any(
+        len(tiles) != BOARD_HEIGHT for tiles in board.grid
+    ):
+        raise BoardInvalid("grid dimensions")
+    bitboard = BitBoard.from_board(board)
+    if bitboard.hits:
+        raise BoardInvalid("tile already hit")
+    if bitboard.mines:
+        raise BoardInvalid("mine placed")
+    if bitboard.obstacles.bit_count() != BOARD_OBSTACLES:
+        raise BoardInvalid("obstacle count")
+    if any(
+        obstacle.id not in obstacle_type.OBSTACLE_VARIANTS
+        for obstacle in bitboard.tile_obstacles.values()
+    ):
+        raise BoardInvalid("obstacle variant")
+
+    fleet = tuple(sorted(ship.ship_variant.id for ship in board.ship))
+    if (skin := SKIN_FLEETS.get(fleet, None)) is None:
+        raise BoardInvalid("fleet")
+    if skin.isdisjoint(owned_ships):
+        raise BoardInvalid("ship not owned")
+
+    ship_ids = set()
+    ships = 0
+    for ship in board.ship:
+        ship_id = models.ShipId.from_ship(ship)
+        if ship_id in ship_ids:
+            raise BoardInvalid("duplicate ship")
+        ship_ids.add(ship_id)
+        if not 0 <= ship.orientation < len(ship_type.ORIENTATIONS):
+            raise BoardInvalid("ship orientation")
+        if not ship.tile_position:
+            raise BoardInvalid("ship not placed")
+        placement = SHIP_PLACEMENTS[(ship.ship_variant.id, ship.orientation)].get(
+            ship.tile_position[0], None
+        )
+        if placement is None or tuple(ship.tile_position) != placement.locations:
+            raise BoardInvalid("ship footprint")
+        if ships & placement.mask:
+            raise BoardInvalid("ships overlap")
+        ships |= placement.mask
+        if any(
+            bitboard.tile_ships.get(cell, None) != ship_id for cell in placement.cells
+        ):
+            raise BoardInvalid("ship tiles")
+    if ships != bitboard.ships:
+        raise BoardInvalid("ship tiles")
+    return bitboard
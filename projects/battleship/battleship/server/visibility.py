@@ -0,0 +1,89 @@
+from collections import deque
+from dataclasses import dataclass, field, replace
+from itertools import islice
+
+from ..shared import models
+
+
+@dataclass
+class BoardView:
+    tiles: dict[
+        tuple[int, int],
+        models.EmptyTile | models.ShipTile | models.ObstacleTile | models.MineTile,
+    ] = field(default_factory=dict)
+    ships: dict[models.ShipId, models.Ship] = field(default_factory=dict)
+
+    def apply(self, result: models.ShotResult):
+        for reveal in result.reveal:
+            self.tiles[reveal.loc] = reveal.tile
+        for ship in result.reveal_ship:
+            self.ships[models.ShipId.from_ship(ship)] = ship
+
+    def copy(self):
+        return BoardView(dict(self.tiles), dict(self.ships))
+
+    def to_shared(self, board: models.BoardId, player: models.PlayerId):
+        return models.BoardView(
+            board,
+            player,
+            [models.Reveal(loc, tile) for loc, tile in self.tiles.items()],
+            [*self.ships.values()],
+        )
+
+
+@dataclass
+class VisibilityIndex:
+    # what every viewer has been shown of each board, folded in as results go
+    # out so a late joiner gets the current view without a replay. results sent
+    # to everyone update every view, the rest only the viewer they went to
+    history: int = 256
+    seq: int = field(init=False, default=0)
+    # the seq the current game started from, views from before it are gone
+    base: int = field(init=False, default=0)
+    public: dict[models.BoardId, BoardView] = field(init=False, default_factory=dict)
+    viewers: dict[models.PlayerId, dict[models.BoardId, BoardView]] = field(
+        init=False, default_factory=dict
+    )
+    log: deque[tuple[models.PlayerId | None, models.ShotResult]] = field(init=False)
+
+    def __post_init__(self):
+        self.log = deque(maxlen=self.history)
+
+    def reset(self):
+        self.public.clear()
+        self.viewers.clear()
+        self.log.clear()
+        self.base = self.seq
+
+    def views(self, viewer: models.PlayerId):
+        if (views := self.viewers.get(viewer, None)) is None:
+            return self.public
+        return views
+
+    def record(
+        self, result: models.ShotResult, viewer: models.PlayerId | None = None
+    ) -> models.ShotResult:
+        self.seq += 1
+        result = replace(result, seq=self.seq)
+        self.log.append((viewer, result))
+        if viewer is None:
+            for views in (self.public, *self.viewers.values()):
+                views.setdefault(result.board, BoardView()).apply(result)
+        else:
+            if (views := self.viewers.get(viewer, None)) is None:
+                views = self.viewers[viewer] = {
+                    board: view.copy() for board, view in self.public.items()
+                }
+            views.setdefault(result.board, BoardView()).apply(result)
+        return result
+
+    def since(self, viewer: models.PlayerId, seq: int):
+        # None once results after seq have dropped out of the log
+        oldest = self.seq - len(self.log)
+        if not max(oldest, self.base) <= seq <= self.seq:
+            return None
+        return [
+            result
+            for to, result in islice(self.log, seq - oldest, None)
+            if to is None or to == viewer
+        ]
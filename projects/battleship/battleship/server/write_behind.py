@@ -0,0 +1,191 @@
+import asyncio
+import contextlib
+from dataclasses import dataclass, field
+import logging
+from uuid import UUID
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from . import db
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class PlayerChanges:
+    rating: int = 0
+    coins: int = 0
+    avatar: UUID | None = None
+    emotes: list[UUID] = field(default_factory=list)
+
+    def merge(self, newer: "PlayerChanges"):
+        self.rating += newer.rating
+        self.coins += newer.coins
+        if newer.avatar is not None:
+            self.avatar = newer.avatar
+        self.emotes.extend(newer.emotes)
+
+
+@dataclass
+class PlayerWriteBehind:
+    # mutations are already applied to the players held in memory, this only
+    # coalesces them per player and writes them out in batches
+    db_session_maker: async_sessionmaker[AsyncSession]
+    flush_interval: float = 0.5
+    flush_threshold: int = 256
+    # changes that fail to write are kept and retried, waiting twice as long
+    # after every failure in a row up to this long
+    max_retry_delay: float = 30.0
+    failures: int = field(init=False, default=0)
+    pending: dict[UUID, PlayerChanges] = field(init=False, default_factory=dict)
+    lock: asyncio.Lock = field(init=False, default_factory=asyncio.Lock)
+    flush_task: asyncio.Task | None = field(init=False, default=None)
+
+    def change(
+        self,
+        player: UUID,
+        rating: int = 0,
+        coins: int = 0,
+        avatar: UUID | None = None,
+        emotes: list[UUID] | None = None,
+    ):
+        self.pending.setdefault(player, PlayerChanges()).merge(
+            PlayerChanges(rating, coins, avatar, emotes or [])
+        )
+        if len(self.pending) >= self.flush_threshold:
+            self._schedule(0)
+        elif self.flush_task is None:
+            self._schedule(self.flush_interval)
+
+    def _schedule(self, delay: float):
+        if self.flush_task is not None:
+            if delay:
+                return
+            self.flush_task.cancel()
+        self.flush_task = asyncio.create_task(self._flush_later(delay))
+
+    async def _flush_later(self, delay: float):
+        await asyncio.sleep(delay)
+        self.flush_task = None
+        try:
+            await self.flush()
+        except Exception as err:  # pylint: disable=W0718
+            log.exception(
+                "changes to %s players not written after %s failed flushes: %s",
+                len(self.pending),
+                self.failures,
+                err,
+            )
+            if self.flush_task is None:
+                self._schedule(self.retry_delay())
+
+    def retry_delay(self) -> float:
+        return min(
+            self.flush_interval * 2 ** max(self.failures - 1, 0),
+            self.max_retry_delay,
+        )
+
+    async def flush(self):
+        # batches are written one at a time in the order they were taken.
+        # nothing is ever dropped, whatever was not written goes back in front
+        # of anything queued meanwhile and the error is raised to the caller
+        async with self.lock:
+            batch, self.pending = self.pending, {}
+            try:
+                if batch:
+                    await self._write_all(batch)
+            except Exception:
+                self.failures += 1
+                raise
+            finally:
+                if batch:
+                    self._requeue(batch)
+            self.failures = 0
+
+    async def _write_all(self, batch: dict[UUID, PlayerChanges]):
+        # players are removed from the batch once their changes are written
+        try:
+            await self._write(batch)
+        except Exception:  # pylint: disable=W0718
+            if len(batch) == 1:
+                raise
+        else:
+            batch.clear()
+            return
+        # one bad row should not hold every other player back with it, so a
+        # failed batch is written again one player at a time
+        error = None
+        for player, changes in list(batch.items()):
+            try:
+                await self._write({player: changes})
+            except Exception as err:  # pylint: disable=W0718
+                error = error or err
+            else:
+                del batch[player]
+        if error is not None:
+            raise error
+
+    def _requeue(self, batch: dict[UUID, PlayerChanges]):
+        for player, changes in self.pending.items():
+            batch.setdefault(player, PlayerChanges()).merge(changes)
+        self.pending = batch
+
+    async def drop(self, player: UUID):
+        # for deleted players, whose changes have no row to go to. taken under
+        # the lock so a flush that is writing them cannot put them back
+        async with self.lock:
+            self.pending.pop(player, None)
+
+    async def _write(self, batch: dict[UUID, PlayerChanges]):
+        player_table = db.Player.__table__
+        stats = [
+            {"b_id": player, "b_rating": changes.rating, "b_coins": changes.coins}
+            for player, changes in batch.items()
+            if changes.rating or changes.coins
+        ]
+        avatars = [
+            {"b_id": player, "b_avatar": changes.avatar}
+            for player, changes in batch.items()
+            if changes.avatar is not None
+        ]
+        emotes = [
+            {"variant_id": emote, "owner_id": player}
+            for player, changes in batch.items()
+            for emote in changes.emotes
+        ]
+        async with self.db_session_maker() as db_session:
+            if stats:
+                await db_session.execute(
+                    update(player_table)
+                    .where(player_table.c.id == bindparam("b_id"))
+                    .values(
+                        rating=player_table.c.rating + bindparam("b_rating"),
+                        coins=player_table.c.coins + bindparam("b_coins"),
+                    ),
+                    stats,
+                )
+            if avatars:
+                await db_session.execute(
+                    update(player_table)
+                    .where(player_table.c.id == bindparam("b_id"))
+                    .values(avatar=bindparam("b_avatar")),
+                    avatars,
+                )
+            if emotes:
+                await db_session.execute(insert(db.Emote), emotes)
+            await db_session.commit()
+
+    async def close(self):
+        if (flush_task := self.flush_task) is not None:
+            flush_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await flush_task
+            self.flush_task = None
+        try:
+            await self.flush()
+        except Exception:
+            # the last chance to write these, leave enough in the log to
+            # apply them by hand
+            log.error("closing with unwritten player changes: %s", self.pending)
+            raise
@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from uuid import UUID
+
+from . import models, ship_type, shot_type
+from .utils import mat_mul_vec
+
+
+@dataclass(frozen=True, eq=False)
+class Footprint:
+    # placement_offsets of a variant already rotated into one orientation,
+    # the extents let a whole placement be bounds checked at once
+    offsets: tuple[tuple[int, int], ...]
+    sprites: tuple[list[str], ...]
+    min_col: int
+    max_col: int
+    min_row: int
+    max_row: int
+
+    @classmethod
+    def from_offsets(
+        cls,
+        placement_offsets: dict[tuple[int, int], list[str]],
+        orientation: tuple[tuple[int, int], ...],
+    ):
+        offsets = tuple(
+            mat_mul_vec(orientation, offset) for offset in placement_offsets.keys()
+        )
+        cols = [col for col, _ in offsets] or [0]
+        rows = [row for _, row in offsets] or [0]
+        return cls(
+            offsets,
+            tuple(placement_offsets.values()),
+            min(cols),
+            max(cols),
+            min(rows),
+            max(rows),
+        )
+
+    def locations(self, position: tuple[int, int]):
+        col, row = position
+        return [(col + c, row + r) for c, r in self.offsets]
+
+    def placement(self, position: tuple[int, int]):
+        col, row = position
+        return {
+            (col + c, row + r): sprite
+            for (c, r), sprite in zip(self.offsets, self.sprites)
+        }
+
+    def in_bounds(self, position: tuple[int, int], width: int, height: int):
+        col, row = position
+        return (
+            col + self.min_col >= 0
+            and col + self.max_col < width
+            and row + self.min_row >= 0
+            and row + self.max_row < height
+        )
+
+
+def _footprints(
+    variants: dict[UUID, shot_type.ShotVariant | ship_type.ShipVariant],
+    orientations: list[tuple[tuple[int, int], ...]],
+):
+    return {
+        variant_id: tuple(
+            Footprint.from_offsets(variant.placement_offsets, orientation)
+            for orientation in orientations
+        )
+        for variant_id, variant in variants.items()
+    }
+
+
+SHOT_FOOTPRINTS = _footprints(shot_type.SHOT_VARIANTS, shot_type.ORIENTATIONS)
+SHIP_FOOTPRINTS = _footprints(ship_type.SHIP_VARIANTS, ship_type.ORIENTATIONS)
+
+
+def shot_footprint(shot_variant: models.ShotVariantId, orientation: int):
+    return SHOT_FOOTPRINTS[shot_variant.id][orientation]
+
+
+def ship_footprint(ship_variant: models.ShipVariantId, orientation: int):
+    return SHIP_FOOTPRINTS[ship_variant.id][orientation]
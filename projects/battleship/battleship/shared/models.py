@@ -189,6 +189,15 @@ class ShotResult:
     hit: bool
     reveal: list[Reveal] = field(hash=False, compare=False)
     reveal_ship: list[Ship] = field(hash=False, compare=False)
+    seq: int = field(hash=False, compare=False, default=0)
+
+
+@dataclass(eq=True, frozen=True)
+class BoardView:
+    board: BoardId
+    player: PlayerId = field(hash=False)
+    reveal: list[Reveal] = field(hash=False, compare=False)
+    reveal_ship: list[Ship] = field(hash=False, compare=False)
 
 
 # API args below
@@ -245,6 +254,19 @@ class ShotSubmitArgs:
     shot: Shot
 
 
+@dataclass
+class GameViewArgs:
+    room: RoomId
+    since: int | None
+
+
+@dataclass
+class GameView:
+    seq: int
+    boards: list[BoardView] | None
+    shots: list[ShotResult]
+
+
 @dataclass
 class EmoteDisplayArgs:
     room: RoomId
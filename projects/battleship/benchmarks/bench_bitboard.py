@@ -0,0 +1,90 @@
+# cost of a shot and the loss check after it on the BitBoard against marking
+# the models.Board grid and scanning it the way do_shot_submit used to, over
+# games that shoot every tile of a board, and the cost of converting between
+# the two. run with `python benchmarks/bench_bitboard.py`
+import copy
+import random
+import timeit
+
+from battleship.server.bitboard import BitBoard
+from battleship.shared import models
+
+from bench_codec import sample_board
+
+GAMES = 2000
+ROUNDS = 20000
+
+
+def scan_game(board: models.Board, cells: list[tuple[int, int]]):
+    for col, row in cells:
+        board.grid[col][row].hit = True
+        if all(
+            t.hit or not isinstance(t, models.ShipTile)
+            for tiles in board.grid
+            for t in tiles
+        ):
+            return
+
+
+def bitboard_game(board: BitBoard, cells: list[tuple[int, int]]):
+    for col, row in cells:
+        board.hit(board.cell(col, row))
+        if board.lost:
+            return
+
+
+def main():
+    rng = random.Random(0)
+    board = sample_board()
+    cells = [(col, row) for col in range(8) for row in range(8)]
+    games = []
+    for _ in range(GAMES):
+        rng.shuffle(cells)
+        games.append([*cells])
+    boards = [copy.deepcopy(board) for _ in range(GAMES)]
+    bitboards = [BitBoard.from_board(board) for _ in range(GAMES)]
+    scan = timeit.timeit(
+        lambda: [scan_game(b, g) for b, g in zip(boards, games)], number=1
+    )
+    bits = timeit.timeit(
+        lambda: [bitboard_game(b, g) for b, g in zip(bitboards, games)], number=1
+    )
+    shots = sum(bin(b.hits).count("1") for b in bitboards)
+    assert all(b.lost for b in bitboards)
+    assert [b.to_board() for b in bitboards] == boards
+    print(
+        f"{shots} shots: grid scan {scan / shots * 1e6:6.2f}us "
+        f"bitboard {bits / shots * 1e6:6.2f}us per shot"
+    )
+    # late in a game the scan has to get past every sunk ship first
+    late = copy.deepcopy(board)
+    for tiles in late.grid:
+        for tile in tiles:
+            tile.hit = True
+    col, row = max(p for ship in late.ship for p in ship.tile_position)
+    late.grid[col][row].hit = False
+    late_bitboard = BitBoard.from_board(late)
+    scan_check = timeit.timeit(
+        lambda: all(
+            t.hit or not isinstance(t, models.ShipTile)
+            for tiles in late.grid
+            for t in tiles
+        ),
+        number=ROUNDS,
+    )
+    bits_check = timeit.timeit(lambda: late_bitboard.lost, number=ROUNDS)
+    print(
+        f"loss check on the last tile: grid scan {scan_check / ROUNDS * 1e6:6.2f}us "
+        f"bitboard {bits_check / ROUNDS * 1e6:6.2f}us"
+    )
+    from_board = timeit.timeit(lambda: BitBoard.from_board(board), number=ROUNDS)
+    bitboard = BitBoard.from_board(board)
+    to_board = timeit.timeit(bitboard.to_board, number=ROUNDS)
+    print(
+        f"from_board {from_board / ROUNDS * 1e6:6.1f}us "
+        f"to_board {to_board / ROUNDS * 1e6:6.1f}us"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# requests per second through the shared port as the cluster grows, with the
+# load coming from as many client processes as there are cores. needs SSL_CERT
+# and SSL_KEY like the cluster itself, run with
+# `python benchmarks/bench_cluster.py`
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+import ssl
+import tempfile
+import time
+
+from battleship.client.client import BattleshipClient
+from battleship.server.cluster import run_cluster
+from battleship.shared import models
+
+BASE_PORT = 41000
+CONNECTIONS = 16
+DURATION = 5.0
+
+
+def client_context():
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    context.load_verify_locations(os.environ["SSL_CERT"])
+    context.check_hostname = False
+    return context
+
+
+async def load_async(port: int, start: float) -> int:
+    context = client_context()
+    done = 0
+
+    async def connection(index: int):
+        nonlocal done
+        client = BattleshipClient()
+        await client.connect("127.0.0.1", port, ssl=context)
+        player = await client.player_create(models.PlayerCreateArgs(f"bench{index}"))
+        auth = models.BearingPlayerAuth.from_player(player)
+        await asyncio.sleep(start - time.time())
+        deadline = time.monotonic() + DURATION
+        while time.monotonic() < deadline:
+            await client.player_get(auth)
+            done += 1
+        await client.disconnect()
+
+    await asyncio.gather(*(connection(i) for i in range(CONNECTIONS)))
+    return done
+
+
+def load(port: int, start: float) -> int:
+    return asyncio.run(load_async(port, start))
+
+
+def run_cluster_process(workers: int, port: int, db_url: str):
+    asyncio.run(run_cluster(workers, "127.0.0.1", port, db_url))
+
+
+def wait_listening(port: int):
+    while True:
+        with socket.socket() as probe:
+            if probe.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+
+
+def measure(workers: int, clients: int) -> float:
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as path:
+        cluster = context.Process(
+            target=run_cluster_process,
+            args=(workers, BASE_PORT, f"sqlite+aiosqlite:///{path}/bench.db"),
+        )
+        cluster.start()
+        try:
+            for port in range(BASE_PORT, BASE_PORT + workers + 1):
+                wait_listening(port)
+            start = time.time() + 2
+            with context.Pool(clients) as pool:
+                done = sum(pool.starmap(load, [(BASE_PORT, start)] * clients))
+        finally:
+            # interrupting run_cluster terminates its workers too
+            os.kill(cluster.pid, signal.SIGINT)
+            cluster.join()
+    return done / DURATION
+
+
+def main():
+    cores = os.cpu_count() or 1
+    workers = 1
+    while True:
+        print(f"{workers:2} workers {measure(workers, cores):10.0f} requests/s")
+        if workers >= cores:
+            break
+        workers = min(workers * 2, cores)
+
+
+if __name__ == "__main__":
+    main()
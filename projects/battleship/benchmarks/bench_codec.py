@@ -0,0 +1,81 @@
+# size and speed of the payloads the game sends most, through every installed
+# codec. run with `python benchmarks/bench_codec.py`
+import timeit
+from uuid import uuid4
+
+from tsocket.codec import CODECS, make_dumps, make_loads
+
+from battleship.shared import avatar_type, geometry, models, obstacle_type, ship_type
+
+ROUNDS = 2000
+
+
+def sample_board() -> models.Board:
+    # a full navy fleet with the obstacles of a real game
+    grid = [[models.EmptyTile() for _ in range(8)] for _ in range(8)]
+    for col, row in [(0, 7), (3, 5), (6, 2), (7, 7)]:
+        grid[col][row] = models.ObstacleTile(
+            models.ObstacleVariantId(obstacle_type.ROCK_OBSTACLE_VARIANT.id)
+        )
+    ships = []
+    anchors = [(0, 0), (0, 2), (4, 0), (0, 4)]
+    for variant, anchor in zip(ship_type.SHIP_SKIN_LOOKUP["Navy"], anchors):
+        footprint = geometry.ship_footprint(variant, 0)
+        ship = models.Ship(
+            uuid4(), models.ShipVariantId(variant.id), footprint.locations(anchor), 0
+        )
+        for col, row in ship.tile_position:
+            grid[col][row] = models.ShipTile(models.ShipId.from_ship(ship))
+        ships.append(ship)
+    return models.Board(
+        uuid4(), models.PlayerId(uuid4()), models.RoomId(uuid4()), grid, ships
+    )
+
+
+def sample_shot_result(board: models.Board) -> models.ShotResult:
+    reveal = [
+        models.Reveal((col, row), board.grid[col][row])
+        for col in range(2)
+        for row in range(3)
+    ]
+    return models.ShotResult(
+        board.player, models.BoardId.from_board(board), True, reveal, board.ship[:1]
+    )
+
+
+def sample_player() -> models.Player:
+    return models.Player(
+        uuid4(),
+        "player",
+        1000,
+        models.AvatarVariantId(avatar_type.CAPTAIN_AVATAR_VARIANT.id),
+        False,
+        uuid4(),
+        None,
+        100,
+        [variant.id for variant in ship_type.SHIP_SKIN_LOOKUP["Navy"]],
+        [uuid4() for _ in range(4)],
+    )
+
+
+def main():
+    board = sample_board()
+    for obj in [board, sample_shot_result(board), sample_player()]:
+        dumps = make_dumps(type(obj))
+        loads = make_loads(type(obj))
+        for name in CODECS:
+            data = dumps[name](obj)
+            assert loads[name](memoryview(data)) == obj
+            dumps_us = timeit.timeit(lambda: dumps[name](obj), number=ROUNDS)
+            loads_us = timeit.timeit(
+                lambda: loads[name](memoryview(data)), number=ROUNDS
+            )
+            print(
+                f"{type(obj).__name__:10} {name:8} {len(data):5}B "
+                f"dumps {dumps_us / ROUNDS * 1e6:7.1f}us "
+                f"loads {loads_us / ROUNDS * 1e6:7.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
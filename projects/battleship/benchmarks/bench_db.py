@@ -0,0 +1,84 @@
+# concurrent reads and writes against the file engine, with its writer and
+# pool of readers, and the dev engine on the same kind of file and in memory.
+# every writer adds one coin per update, so the total shows updates that were
+# lost. run with `python benchmarks/bench_db.py`
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from battleship.server import db
+
+PLAYERS = 200
+READERS = 16
+WRITERS = [4, 16]
+OPERATIONS = 100
+
+
+async def reader(session_maker, player_ids):
+    for i in range(OPERATIONS):
+        async with session_maker() as db_session:
+            result = await db_session.execute(
+                select(db.Player)
+                .where(db.Player.id == player_ids[i % len(player_ids)])
+                .options(*db.PLAYER_LOAD_OPTIONS)
+            )
+            await result.scalars().one().to_shared(db_session)
+
+
+async def writer(session_maker, player_ids, offset: int):
+    for i in range(OPERATIONS):
+        async with session_maker() as db_session:
+            await db_session.execute(
+                update(db.Player)
+                .where(db.Player.id == player_ids[(offset + i) % len(player_ids)])
+                .values(coins=db.Player.coins + 1)
+            )
+            await db_session.commit()
+
+
+async def run(label: str, session_maker, writers: int):
+    async with session_maker() as db_session:
+        players = [db.Player(name=f"player{i}", coins=0) for i in range(PLAYERS)]
+        db_session.add_all(players)
+        await db_session.commit()
+        player_ids = [player.id for player in players]
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(READERS):
+            tg.create_task(reader(session_maker, player_ids))
+        for offset in range(writers):
+            tg.create_task(writer(session_maker, player_ids, offset * 7))
+    elapsed = time.perf_counter() - start
+    async with session_maker() as db_session:
+        coins = (await db_session.execute(select(func.sum(db.Player.coins)))).scalar()
+    operations = (READERS + writers) * OPERATIONS
+    print(
+        f"{label:12} {writers:2} writers: {operations / elapsed:7.0f} ops/s "
+        f"lost updates {writers * OPERATIONS - coins}"
+    )
+
+
+async def main():
+    for writers in WRITERS:
+        with tempfile.TemporaryDirectory() as directory:
+            url = f"sqlite+aiosqlite:///{os.path.join(directory, 'file.db')}"
+            await run("file", await db.create_file_session_maker(url), writers)
+            url = f"sqlite+aiosqlite:///{os.path.join(directory, 'dev.db')}"
+            engine = await db.create_dev_engine(url)
+            await run(
+                "dev file", async_sessionmaker(engine, expire_on_commit=False), writers
+            )
+            await engine.dispose()
+        engine = await db.create_dev_engine()
+        await run(
+            "dev memory", async_sessionmaker(engine, expire_on_commit=False), writers
+        )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
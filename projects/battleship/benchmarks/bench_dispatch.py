@@ -0,0 +1,61 @@
+# per call decode and encode cost of a few routes with the functions built when
+# the server class is made, against looking the types up and going through the
+# converter on every call. run with `python benchmarks/bench_dispatch.py`
+import inspect
+import timeit
+from uuid import uuid4
+
+from tsocket.codec import CODECS, DEFAULT_CODEC
+from tsocket.shared import Empty
+
+from battleship.server.server import BattleshipServer
+from battleship.shared import models, shot_type
+
+from bench_codec import sample_board, sample_player, sample_shot_result
+
+ROUNDS = 20000
+
+
+def per_call(func, data: bytes, result):
+    # what a route did before its types were resolved up front
+    codec = CODECS[DEFAULT_CODEC]
+    signature = inspect.signature(func)
+    arg_type = [*signature.parameters.values()][-1].annotation
+    codec.loads(data, arg_type)
+    return codec.dumps(result)
+
+
+def main():
+    board = sample_board()
+    shot = models.Shot(
+        models.ShotVariantId(next(iter(shot_type.SHOT_VARIANTS))),
+        (3, 4),
+        0,
+        models.BoardId.from_board(board),
+    )
+    calls = {
+        "ping": (Empty(), Empty()),
+        "player_get": (models.BearingPlayerAuth(uuid4()), sample_player()),
+        "shot_submit": (
+            models.ShotSubmitArgs(board.room, shot),
+            sample_shot_result(board),
+        ),
+    }
+    codec = CODECS[DEFAULT_CODEC]
+    for name, (args, result) in calls.items():
+        route = BattleshipServer._default_routes[name]  # pylint: disable=W0212
+        data = codec.dumps(args)
+        loads, dumps = route.loads[DEFAULT_CODEC], route.dumps[DEFAULT_CODEC]
+        assert loads(data) == args
+        prebuilt = timeit.timeit(lambda: (loads(data), dumps(result)), number=ROUNDS)
+        looked_up = timeit.timeit(
+            lambda: per_call(route.func, data, result), number=ROUNDS
+        )
+        print(
+            f"{name:12} prebuilt {prebuilt / ROUNDS * 1e6:6.1f}us "
+            f"per call lookup {looked_up / ROUNDS * 1e6:6.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
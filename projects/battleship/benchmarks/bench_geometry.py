@@ -0,0 +1,72 @@
+# shot resolution and hover placement through the footprint tables, against
+# rotating the placement offsets with the tuple helpers on every call the way
+# the room and the views used to. run with `python benchmarks/bench_geometry.py`
+import timeit
+
+from battleship.shared import geometry, ship_type, shot_type
+from battleship.shared.utils import add, mat_mul_vec
+
+ROUNDS = 20
+POSITIONS = [(col, row) for col in range(8) for row in range(8)]
+
+
+def rotated_locations(variant, orientation: int, position: tuple[int, int]):
+    return [
+        add(position, mat_mul_vec(shot_type.ORIENTATIONS[orientation], offset))
+        for offset in variant.placement_offsets.keys()
+    ]
+
+
+def rotated_hover(variant, orientation: int, position: tuple[int, int]):
+    placement = {
+        add(position, mat_mul_vec(ship_type.ORIENTATIONS[orientation], offset)): sprite
+        for offset, sprite in variant.placement_offsets.items()
+    }
+    legal = all(0 <= col < 8 and 0 <= row < 8 for col, row in placement.keys())
+    return placement, legal
+
+
+def table_locations(variant_id, orientation: int, position: tuple[int, int]):
+    return geometry.SHOT_FOOTPRINTS[variant_id][orientation].locations(position)
+
+
+def table_hover(variant_id, orientation: int, position: tuple[int, int]):
+    footprint = geometry.SHIP_FOOTPRINTS[variant_id][orientation]
+    return footprint.placement(position), footprint.in_bounds(position, 8, 8)
+
+
+def per_call(func, variants, orientations) -> float:
+    calls = [
+        (variant, orientation, position)
+        for variant in variants
+        for orientation in range(len(orientations))
+        for position in POSITIONS
+    ]
+    elapsed = timeit.timeit(lambda: [func(*call) for call in calls], number=ROUNDS)
+    return elapsed / (len(calls) * ROUNDS)
+
+
+def main():
+    shots = shot_type.SHOT_VARIANTS
+    ships = ship_type.SHIP_VARIANTS
+    cases = [
+        (
+            "shot resolution",
+            per_call(rotated_locations, shots.values(), shot_type.ORIENTATIONS),
+            per_call(table_locations, shots.keys(), shot_type.ORIENTATIONS),
+        ),
+        (
+            "hover placement",
+            per_call(rotated_hover, ships.values(), ship_type.ORIENTATIONS),
+            per_call(table_hover, ships.keys(), ship_type.ORIENTATIONS),
+        ),
+    ]
+    for label, rotated, table in cases:
+        print(
+            f"{label}: rotated {rotated * 1e6:5.2f}us tables {table * 1e6:5.2f}us"
+            f" per call"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# thousands of players queueing for rooms of 8 on a simulated clock, through
+# LocalRoomDirectory against taking any open room the way room_match used to.
+# shows the time per join and how far apart the players put together are.
+# run with `python benchmarks/bench_matchmaking.py`
+import asyncio
+import random
+import statistics
+import time
+from uuid import uuid4
+
+from battleship.server import directory as directory_module
+from battleship.server.directory import (
+    LocalRoomDirectory,
+    MatchMergeQuery,
+    MatchQuery,
+    MatchRoom,
+    RoomPlacement,
+)
+from battleship.shared import models
+
+PLAYERS = 20000
+ARRIVALS_PER_SECOND = [5, 50, 500]
+ROOM_SIZE = 8
+MERGE_INTERVAL = 2
+
+
+class SimulatedTime:
+    # stands in for the time module of the directory so rooms wait in
+    # simulated seconds
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class Rooms:
+    def __init__(self):
+        self.ratings: dict[models.RoomId, list[int]] = {}
+        self.filled: list[list[int]] = []
+
+    def join(self, room: models.RoomId, rating: int) -> MatchRoom | None:
+        ratings = self.ratings.setdefault(room, [])
+        ratings.append(rating)
+        if len(ratings) >= ROOM_SIZE:
+            self.filled.append(self.ratings.pop(room))
+            return None
+        return MatchRoom(
+            RoomPlacement(room, 0), sum(ratings) // len(ratings), len(ratings)
+        )
+
+    def spread(self) -> float:
+        return statistics.mean(max(r) - min(r) for r in self.filled)
+
+
+async def indexed(clock: SimulatedTime, ratings: list[int], rate: int) -> Rooms:
+    directory = LocalRoomDirectory()
+    rooms = Rooms()
+    next_merge = MERGE_INTERVAL
+    for rating in ratings:
+        clock.now += 1 / rate
+        if clock.now >= next_merge:
+            next_merge += MERGE_INTERVAL
+            for move in await directory.match_merge(MatchMergeQuery(0, ROOM_SIZE)):
+                into = move.into.placement.room
+                moved = rooms.ratings.pop(move.room.placement.room)
+                for moved_rating in moved[:-1]:
+                    rooms.ratings[into].append(moved_rating)
+                if (match_room := rooms.join(into, moved[-1])) is not None:
+                    await directory.match_put(match_room)
+        taken = await directory.match_take(MatchQuery(0, rating))
+        room = taken.placement.room if taken else models.RoomId(uuid4())
+        if (match_room := rooms.join(room, rating)) is not None:
+            await directory.match_put(match_room)
+    return rooms
+
+
+async def any_room(_clock: SimulatedTime, ratings: list[int], _rate: int) -> Rooms:
+    open_rooms: set[models.RoomId] = set()
+    rooms = Rooms()
+    for rating in ratings:
+        room = open_rooms.pop() if open_rooms else models.RoomId(uuid4())
+        if rooms.join(room, rating) is not None:
+            open_rooms.add(room)
+    return rooms
+
+
+async def main():
+    clock = SimulatedTime()
+    directory_module.time = clock
+    rng = random.Random(0)
+    ratings = [int(rng.gauss(1200, 300)) for _ in range(PLAYERS)]
+    for rate in ARRIVALS_PER_SECOND:
+        for label, simulate in [("indexed", indexed), ("any room", any_room)]:
+            clock.now = 0.0
+            start = time.perf_counter()
+            rooms = await simulate(clock, ratings, rate)
+            elapsed = time.perf_counter() - start
+            print(
+                f"{rate:4} joins/s {label:9} {elapsed / PLAYERS * 1e6:6.1f}us per join"
+                f" {len(rooms.filled):5} rooms filled,"
+                f" rating spread {rooms.spread():6.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
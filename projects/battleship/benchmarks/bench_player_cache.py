@@ -0,0 +1,99 @@
+# statements sent to the database and time per call for the routes that look
+# up the authenticated player, with the session's player cached and with the
+# cache emptied before every call. run with
+# `python benchmarks/bench_player_cache.py`
+import asyncio
+import contextlib
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from battleship.client.client import BattleshipClient
+from battleship.server import db
+from battleship.server.server import BattleshipServer
+from battleship.shared import avatar_type, models
+
+CALLS = 200
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        event.listen(Engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *_args):
+        self.count += 1
+
+
+async def leave(client: BattleshipClient, room: models.RoomInfo):
+    await client.room_leave(models.RoomId(room.id))
+
+
+def route_calls(client: BattleshipClient, player: models.Player):
+    # each route with whatever undoes it, which is not measured
+    auth = models.BearingPlayerAuth.from_player(player)
+    avatar = models.AvatarVariantId(avatar_type.CAPTAIN_AVATAR_VARIANT.id)
+    return {
+        "player_get": (lambda: client.player_get(auth), None),
+        "player_info_get": (
+            lambda: client.player_info_get(models.PlayerId.from_player(player)),
+            None,
+        ),
+        "player_avatar_set": (
+            lambda: client.player_avatar_set(
+                models.PlayerAvatarSetArgs(player.auth_token, avatar)
+            ),
+            None,
+        ),
+        "room_match": (
+            lambda: client.room_match(auth),
+            lambda room: leave(client, room),
+        ),
+        "private_room_create": (
+            lambda: client.private_room_create(auth),
+            lambda created: leave(client, created.room),
+        ),
+    }
+
+
+async def main():
+    counter = StatementCounter()
+    server = BattleshipServer(await db.create_session_maker())
+    listener = await server.listen("127.0.0.1", 0, None)
+    port = listener.sockets[0].getsockname()[1]
+    task = asyncio.create_task(server.serve(listener))
+
+    for cached in [True, False]:
+        print("cached" if cached else "uncached")
+        client = BattleshipClient()
+        await client.connect("127.0.0.1", port)
+        player = await client.player_create(models.PlayerCreateArgs("bench"))
+        await client.player_get(models.BearingPlayerAuth.from_player(player))
+        for name, (call, undo) in route_calls(client, player).items():
+            statements = 0
+            elapsed = 0.0
+            for _ in range(CALLS):
+                if not cached:
+                    server.player_cache.clear()
+                    server.player_cache_rev.clear()
+                counter.count = 0
+                start = time.perf_counter()
+                result = await call()
+                elapsed += time.perf_counter() - start
+                statements += counter.count
+                if undo is not None:
+                    await undo(result)
+            print(
+                f"  {name:20} {statements / CALLS:4.1f} statements "
+                f"{elapsed / CALLS * 1e6:8.1f}us per call"
+            )
+        await client.disconnect()
+
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+# rating changes for large synthetic tournaments, where 20000 players are
+# split into rooms of each size, through the rating systems against summing
+# PlayerInfo.rating_changes over every pair. run with
+# `python benchmarks/bench_rating.py`
+import random
+import time
+from uuid import uuid4
+
+from battleship.server.rating import EloRatingSystem, GlickoRatingSystem
+from battleship.shared import models
+
+PLAYERS = 20000
+ROOM_SIZES = [2, 8, 32, 128]
+
+
+def pairwise_elo(placement: list[models.PlayerInfo]) -> list[int]:
+    # the end of game loop before there was a rating system
+    return [
+        sum(
+            player.rating_changes(other, j < i)
+            for j, other in enumerate(placement)
+            if j != i
+        )
+        for i, player in enumerate(placement)
+    ]
+
+
+def tournament(rng: random.Random, size: int) -> list[list[models.PlayerInfo]]:
+    avatar = models.AvatarVariantId(uuid4())
+    players = [
+        models.PlayerInfo(uuid4(), f"player{i}", int(rng.gauss(1200, 300)), avatar)
+        for i in range(PLAYERS)
+    ]
+    return [players[i : i + size] for i in range(0, PLAYERS, size)]
+
+
+def main():
+    rng = random.Random(0)
+    systems = {
+        "pairwise": pairwise_elo,
+        "elo": EloRatingSystem().placement_changes,
+        "glicko": GlickoRatingSystem().placement_changes,
+    }
+    for size in ROOM_SIZES:
+        rooms = tournament(rng, size)
+        timings = []
+        for name, placement_changes in systems.items():
+            start = time.perf_counter()
+            for room in rooms:
+                placement_changes(room)
+            timings.append(f"{name} {(time.perf_counter() - start) * 1e3:7.1f}ms")
+        print(f"{len(rooms):5} rooms of {size:3}: " + "  ".join(timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# games per second read back from replay logs by simulate, on raw ids without
+# a room, against playing each log through a room with replay, and the cost
+# of loading a log from bytes. run with `python benchmarks/bench_replay.py`
+import asyncio
+from dataclasses import replace
+import random
+import time
+from uuid import uuid4
+
+from battleship.server.bitboard import BitBoard
+from battleship.server.models import Room
+from battleship.server.replay import ReplayLog
+from battleship.server.replay_engine import ReplayServer, replay_many, simulate
+from battleship.shared import models, shot_type
+
+from bench_codec import sample_board, sample_player
+
+LOGS = 50
+PLAYERS = 4
+GAMES = 3
+
+
+async def play_room(seed: int) -> ReplayLog:
+    # a few games in a row of random shots at random opponents
+    rng = random.Random(seed)
+    server = ReplayServer()
+    room = Room(uuid4(), server, False, seed=seed)
+    room_id = room.to_room_id()
+    server.rooms[room_id] = room
+    players = [
+        server.player_add(models.PlayerInfo.from_player(sample_player()))
+        for _ in range(PLAYERS)
+    ]
+    for player in players:
+        await room.add_player(player)
+    for _ in range(GAMES):
+        for player in players:
+            await room.add_ready(player)
+        for player in players:
+            board = replace(sample_board(), player=player, room=room_id)
+            await room.add_board_submit(BitBoard.from_board(board))
+        while room.alive_players:
+            await room.on_turn_start(room.turn)
+            player = models.PlayerId.from_player_info(room.alive_players[0])
+            board_id = rng.choice(
+                [
+                    board_id
+                    for board_id, board in room.boards.items()
+                    if board.player != player and not board.lost
+                ]
+            )
+            shot = models.Shot(
+                models.ShotVariantId(rng.choice([*shot_type.SHOT_VARIANTS])),
+                (rng.randrange(8), rng.randrange(8)),
+                rng.randrange(4),
+                board_id,
+            )
+            await room.do_shot_submit(player, shot)
+    return room.replay
+
+
+async def play_rooms():
+    return [await play_room(seed) for seed in range(LOGS)]
+
+
+def main():
+    data = [log.to_bytes() for log in asyncio.run(play_rooms())]
+    size = sum(map(len, data))
+    shots = games = 0
+
+    start = time.perf_counter()
+    logs = [ReplayLog.from_bytes(log) for log in data]
+    load = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for log in logs:
+        simulation = simulate(log)
+        games += len(simulation.games)
+        shots += sum(game.shots for game in simulation.games)
+    simulated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    rooms = asyncio.run(replay_many(logs))
+    replayed = time.perf_counter() - start
+    assert sum(room.lost_players != [] for room in rooms) == LOGS
+
+    print(
+        f"{LOGS} logs, {games} games, {shots} shots, "
+        f"{size / LOGS / 1024:.1f}KiB per log, load {load / LOGS * 1e6:.0f}us per log"
+    )
+    print(
+        f"simulate {games / simulated:8.0f} games/s "
+        f"replay {games / replayed:8.0f} games/s "
+        f"{replayed / simulated:.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# game end latency by room size, from the surrender that ends the game until
+# every player has their results, then the time to write the settled ratings
+# and coins out to a file backed database. run with
+# `python benchmarks/bench_settlement.py`
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+from battleship.client.client import BattleshipClient
+from battleship.server import db
+from battleship.server.server import BattleshipServer
+from battleship.shared import models
+
+ROOM_SIZES = [2, 4, 8, 16]
+GAMES = 20
+
+
+async def play(port: int, size: int) -> tuple[list[BattleshipClient], models.RoomId]:
+    clients = []
+    room = None
+    for i in range(size):
+        client = BattleshipClient()
+        await client.connect("127.0.0.1", port)
+        player = await client.player_create(models.PlayerCreateArgs(f"player{i}"))
+        room_info = await client.room_match(
+            models.BearingPlayerAuth.from_player(player)
+        )
+        room = models.RoomId(room_info.id)
+        clients.append(client)
+    assert room is not None
+    for client in clients:
+        await client.room_ready(room)
+    return clients, room
+
+
+async def main():
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        server = BattleshipServer(
+            await db.create_session_maker(url), match_room_size=max(ROOM_SIZES)
+        )
+        listener = await server.listen("127.0.0.1", 0, None)
+        port = listener.sockets[0].getsockname()[1]
+        task = asyncio.create_task(server.serve(listener))
+
+        for size in ROOM_SIZES:
+            ends = []
+            flushes = []
+            for _ in range(GAMES):
+                clients, room = await play(port, size)
+                for client in clients[1:-1]:
+                    await client.room_surrender(room)
+                start = time.perf_counter()
+                await clients[-1].room_surrender(room)
+                for client in clients:
+                    await anext(client.on_game_end())
+                ends.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                await server.write_behind.flush()
+                flushes.append(time.perf_counter() - start)
+                for client in clients:
+                    await client.disconnect()
+            print(
+                f"{size:3} players: game end {statistics.median(ends) * 1e3:6.2f}ms"
+                f" write {statistics.median(flushes) * 1e3:6.2f}ms"
+            )
+
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+# a room watched by up to a thousand spectators on localhost: how long a
+# player's emote takes to answer, and how long until every spectator has had
+# every emote. run with `python benchmarks/bench_spectators.py`
+import asyncio
+import contextlib
+import os
+import statistics
+import tempfile
+import time
+
+from battleship.client.client import BattleshipClient
+from battleship.server import db
+from battleship.server.server import BattleshipServer
+from battleship.shared import emote_type, models
+
+SPECTATORS = [0, 10, 100, 1000]
+EMOTES = 50
+
+
+async def connected(port: int, name: str) -> BattleshipClient:
+    client = BattleshipClient()
+    await client.connect("127.0.0.1", port)
+    player = await client.player_create(models.PlayerCreateArgs(name))
+    await client.player_get(models.BearingPlayerAuth.from_player(player))
+    return client
+
+
+async def receive_all(client: BattleshipClient):
+    stream = client.on_emote_display()
+    for _ in range(EMOTES):
+        await anext(stream)
+
+
+async def main():
+    # the in memory dev engine shares one connection between sessions, which
+    # a thousand players signing up at once do not survive
+    directory = tempfile.TemporaryDirectory()
+    url = f"sqlite+aiosqlite:///{os.path.join(directory.name, 'bench.db')}"
+    server = BattleshipServer(await db.create_session_maker(url))
+    listener = await server.listen("127.0.0.1", 0, None)
+    port = listener.sockets[0].getsockname()[1]
+    task = asyncio.create_task(server.serve(listener))
+    emote = models.EmoteVariantId(next(iter(emote_type.EMOTE_VARIANTS)))
+
+    for count in SPECTATORS:
+        player = BattleshipClient()
+        await player.connect("127.0.0.1", port)
+        created = await player.player_create(models.PlayerCreateArgs("player"))
+        room = await player.private_room_create(
+            models.BearingPlayerAuth.from_player(created)
+        )
+        room_id = models.RoomId(room.room.id)
+        spectators = await asyncio.gather(
+            *(connected(port, "spectator") for _ in range(count))
+        )
+        for spectator in spectators:
+            await spectator.room_spectate(room_id)
+
+        received = [asyncio.create_task(receive_all(s)) for s in spectators]
+        answers = []
+        start = time.perf_counter()
+        for _ in range(EMOTES):
+            sent = time.perf_counter()
+            await player.emote_display(models.EmoteDisplayArgs(room_id, emote))
+            answers.append(time.perf_counter() - sent)
+        await asyncio.gather(*received)
+        everyone = time.perf_counter() - start
+        print(
+            f"{count:5} spectators: emote answered in"
+            f" {statistics.median(answers) * 1e3:6.2f}ms, all"
+            f" {count * EMOTES:6} deliveries in {everyone * 1e3:8.1f}ms"
+        )
+        for client in [player, *spectators]:
+            await client.disconnect()
+
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await task
+    directory.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,84 @@
+# creating and cancelling a million turn timers the way rooms do on every
+# shot, through the timer wheel against loop.call_later handles and against
+# the task sleeping per turn that rooms used to start. run with
+# `python benchmarks/bench_timer.py`
+import asyncio
+import time
+
+from battleship.server.timer import TimerWheel
+
+TIMERS = 1_000_000
+TASKS = 100_000
+ROOMS = 1000
+TIMEOUT = 10
+
+
+def noop():
+    pass
+
+
+async def sleeper():
+    await asyncio.sleep(TIMEOUT)
+
+
+async def wheel_timers() -> float:
+    wheel = TimerWheel()
+    timers = [wheel.call_later(TIMEOUT, noop) for _ in range(ROOMS)]
+    start = time.perf_counter()
+    for i in range(TIMERS):
+        room = i % ROOMS
+        timers[room].cancel()
+        timers[room] = wheel.call_later(TIMEOUT, noop)
+    elapsed = time.perf_counter() - start
+    await wheel.close()
+    return elapsed
+
+
+async def handle_timers() -> float:
+    loop = asyncio.get_running_loop()
+    handles = [loop.call_later(TIMEOUT, noop) for _ in range(ROOMS)]
+    start = time.perf_counter()
+    for i in range(TIMERS):
+        room = i % ROOMS
+        handles[room].cancel()
+        handles[room] = loop.call_later(TIMEOUT, noop)
+    elapsed = time.perf_counter() - start
+    for handle in handles:
+        handle.cancel()
+    return elapsed
+
+
+async def task_timers() -> float:
+    # tasks only go away once the loop runs their cancellation, so the loop
+    # gets a turn every so often like it would between shots. these are slow
+    # enough that a tenth as many are run and the time scaled up
+    tasks = [asyncio.create_task(sleeper()) for _ in range(ROOMS)]
+    start = time.perf_counter()
+    for i in range(TASKS):
+        room = i % ROOMS
+        tasks[room].cancel()
+        tasks[room] = asyncio.create_task(sleeper())
+        if room == ROOMS - 1:
+            await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return elapsed * TIMERS / TASKS
+
+
+async def main():
+    for label, run in [
+        ("timer wheel", wheel_timers),
+        ("call_later", handle_timers),
+        ("tasks", task_timers),
+    ]:
+        elapsed = await run()
+        print(
+            f"{label:12} {elapsed:6.2f}s per million created and cancelled,"
+            f" {elapsed / TIMERS * 1e9:5.0f}ns each"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
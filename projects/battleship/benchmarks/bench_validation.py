@@ -0,0 +1,63 @@
+# cost of board_check on a legal board and on boards it turns away, and of the
+# BitBoard conversion it starts with. run with
+# `python benchmarks/bench_validation.py`
+from copy import deepcopy
+from dataclasses import replace
+import timeit
+
+from battleship.server.bitboard import BitBoard
+from battleship.server.validation import BoardInvalid, board_check
+from battleship.shared import models
+
+from bench_codec import sample_board
+
+ROUNDS = 20000
+
+
+def rejected(board: models.Board, owned: list) -> float:
+    def check():
+        try:
+            board_check(board, owned)
+        except BoardInvalid:
+            pass
+        else:
+            raise AssertionError("board was accepted")
+
+    return timeit.timeit(check, number=ROUNDS) / ROUNDS
+
+
+def main():
+    board = sample_board()
+    owned = [ship.ship_variant.id for ship in board.ship]
+    results = {
+        "BitBoard.from_board": timeit.timeit(
+            lambda: BitBoard.from_board(board), number=ROUNDS
+        )
+        / ROUNDS,
+        "legal": timeit.timeit(lambda: board_check(board, owned), number=ROUNDS)
+        / ROUNDS,
+    }
+
+    short = deepcopy(board)
+    short.grid.pop()
+    results["grid dimensions"] = rejected(short, owned)
+
+    results["ship not owned"] = rejected(board, [])
+
+    overlap = deepcopy(board)
+    overlap.ship[1] = replace(
+        overlap.ship[1], tile_position=board.ship[0].tile_position
+    )
+    results["ships overlap"] = rejected(overlap, owned)
+
+    stray = deepcopy(board)
+    col, row = stray.ship[-1].tile_position[-1]
+    stray.grid[col][row] = models.EmptyTile()
+    results["ship tiles"] = rejected(stray, owned)
+
+    for label, seconds in results.items():
+        print(f"{label:20} {seconds * 1e6:7.2f}us")
+
+
+if __name__ == "__main__":
+    main()
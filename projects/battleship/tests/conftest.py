@@ -0,0 +1,17 @@
+import asyncio
+import inspect
+
+import pytest
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem: pytest.Function):
+    # async tests get a fresh event loop each, without needing a plugin
+    if inspect.iscoroutinefunction(pyfuncitem.obj):
+        args = {
+            name: pyfuncitem.funcargs[name]
+            for name in pyfuncitem._fixtureinfo.argnames  # pylint: disable=W0212
+        }
+        asyncio.run(pyfuncitem.obj(**args))
+        return True
+    return None
@@ -0,0 +1,141 @@
+import asyncio
+from collections.abc import AsyncIterator, Iterator
+import contextlib
+import random
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from tsocket.server import Server
+
+from battleship.client.client import BattleshipClient
+from battleship.server import db
+from battleship.server.server import BattleshipServer
+from battleship.shared import geometry, models, obstacle_type, ship_type
+
+
+@contextlib.asynccontextmanager
+async def serving(server: Server, buffered: bool = False) -> AsyncIterator[int]:
+    # serves on a free localhost port for the length of the block
+    listener = await server.listen("127.0.0.1", 0, None, buffered=buffered)
+    port = listener.sockets[0].getsockname()[1]
+    task = asyncio.create_task(server.serve(listener))
+    try:
+        yield port
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+def legal_board(
+    rng: random.Random,
+    skin: str = "Navy",
+    player: models.PlayerId | None = None,
+    room: models.RoomId | None = None,
+) -> models.Board:
+    # obstacles and a whole fleet of one skin dropped anywhere they fit
+    while True:
+        grid: list[list[models.EmptyTile | models.ShipTile | models.ObstacleTile]]
+        grid = [[models.EmptyTile() for _ in range(8)] for _ in range(8)]
+        obstacles = set[tuple[int, int]]()
+        while len(obstacles) < 4:
+            obstacles.add((rng.randrange(8), rng.randrange(8)))
+        for col, row in obstacles:
+            grid[col][row] = models.ObstacleTile(
+                models.ObstacleVariantId(obstacle_type.ROCK_OBSTACLE_VARIANT.id)
+            )
+        ships = []
+        for variant in ship_type.SHIP_SKIN_LOOKUP[skin]:
+            for _ in range(50):
+                orientation = rng.randrange(len(ship_type.ORIENTATIONS))
+                footprint = geometry.ship_footprint(variant, orientation)
+                anchor = (rng.randrange(8), rng.randrange(8))
+                if footprint.in_bounds(anchor, 8, 8) and all(
+                    isinstance(grid[col][row], models.EmptyTile)
+                    for col, row in footprint.locations(anchor)
+                ):
+                    break
+            else:
+                break
+            ship = models.Ship(
+                uuid4(),
+                models.ShipVariantId(variant.id),
+                footprint.locations(anchor),
+                orientation,
+            )
+            for col, row in ship.tile_position:
+                grid[col][row] = models.ShipTile(models.ShipId.from_ship(ship))
+            ships.append(ship)
+        else:
+            return models.Board(
+                uuid4(),
+                player or models.PlayerId(uuid4()),
+                room or models.RoomId(uuid4()),
+                grid,
+                ships,
+            )
+
+
+@contextlib.asynccontextmanager
+async def battleship_server(**kwargs) -> AsyncIterator[tuple[BattleshipServer, int]]:
+    server = BattleshipServer(await db.create_session_maker(), **kwargs)
+    async with serving(server) as port:
+        yield server, port
+
+
+async def battleship_client(port: int) -> BattleshipClient:
+    client = BattleshipClient()
+    await client.connect("127.0.0.1", port)
+    return client
+
+
+@contextlib.contextmanager
+def counting_queries() -> Iterator[list[str]]:
+    # every statement any engine sends to the database inside the block
+    statements: list[str] = []
+
+    def on_execute(_conn, _cursor, statement, *_args):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", on_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(Engine, "before_cursor_execute", on_execute)
+
+
+async def ready_room(
+    port: int, count: int
+) -> tuple[list[BattleshipClient], list[models.Player], models.RoomId]:
+    # count new players matched into one room and readied, so it is setting up
+    clients = [await battleship_client(port) for _ in range(count)]
+    players = []
+    room = None
+    for i, client in enumerate(clients):
+        player = await client.player_create(models.PlayerCreateArgs(f"player{i}"))
+        players.append(player)
+        room_info = await client.room_match(
+            models.BearingPlayerAuth.from_player(player)
+        )
+        assert room is None or room_info.id == room.id
+        room = models.RoomId(room_info.id)
+    assert room is not None
+    for client in clients:
+        await client.room_ready(room)
+    return clients, players, room
+
+
+async def submit_boards(
+    clients: list[BattleshipClient], players: list[models.Player], room: models.RoomId
+) -> list[models.Board]:
+    # a legal board from every player of a ready room, which starts the game
+    rng = random.Random(0)
+    boards = []
+    for client, player in zip(clients, players):
+        board = legal_board(rng, player=models.PlayerId.from_player(player), room=room)
+        await client.board_submit(board)
+        boards.append(board)
+    for client in clients:
+        await asyncio.wait_for(anext(client.on_room_submit()), 1)
+    return boards
@@ -0,0 +1,91 @@
+import random
+from uuid import uuid4
+
+import pytest
+
+from battleship.server.bitboard import BitBoard
+from battleship.shared import models
+
+from support import legal_board
+
+
+def scattered(rng: random.Random) -> models.Board:
+    # a legal board with some mines and some tiles already hit
+    board = legal_board(rng)
+    mine = models.MineVariantId(uuid4())
+    for tiles in board.grid:
+        for row, tile in enumerate(tiles):
+            if isinstance(tile, models.EmptyTile) and rng.random() < 0.1:
+                tiles[row] = tile = models.MineTile(mine)
+            tile.hit = rng.random() < 0.2
+    return board
+
+
+def scan_lost(board: models.Board) -> bool:
+    # the check Room.do_shot_submit ran over the grid after every shot
+    return all(
+        t.hit or not isinstance(t, models.ShipTile)
+        for tiles in board.grid
+        for t in tiles
+    )
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_round_trip(seed: int):
+    board = scattered(random.Random(seed))
+    bitboard = BitBoard.from_board(board)
+    assert bitboard.to_board() == board
+    assert bitboard.lost == scan_lost(board)
+
+
+def test_round_trip_of_a_narrow_board():
+    ship = models.ShipId(uuid4())
+    grid = [
+        [models.ShipTile(ship), models.EmptyTile(), models.EmptyTile(True)],
+        [models.ShipTile(ship, True), models.EmptyTile(), models.EmptyTile()],
+    ]
+    board = models.Board(
+        uuid4(), models.PlayerId(uuid4()), models.RoomId(uuid4()), grid, []
+    )
+    bitboard = BitBoard.from_board(board)
+    assert (bitboard.width, bitboard.height) == (2, 3)
+    assert bitboard.cell(1, 2) == 5
+    assert bitboard.cell(2, 0) is None and bitboard.cell(0, 3) is None
+    assert bitboard.cell(-1, 0) is None
+    assert bitboard.to_board() == board
+    assert bitboard.remaining == 1
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_shots_agree_with_the_grid_scan(seed: int):
+    rng = random.Random(seed)
+    board = legal_board(rng)
+    bitboard = BitBoard.from_board(board)
+    cells = [(col, row) for col in range(8) for row in range(8)]
+    rng.shuffle(cells)
+    for col, row in cells + cells[:10]:
+        board.grid[col][row].hit = True
+        bitboard.hit(bitboard.cell(col, row))
+        assert bitboard.lost == scan_lost(board)
+        for ship in board.ship:
+            ship_id = models.ShipId.from_ship(ship)
+            assert bitboard.is_sunk(ship_id) == all(
+                board.grid[c][r].hit for c, r in ship.tile_position
+            )
+    assert bitboard.lost
+    assert bitboard.to_board() == board
+
+
+def test_hits_count_once():
+    board = legal_board(random.Random(0))
+    bitboard = BitBoard.from_board(board)
+    ship = board.ship[0]
+    ship_id = models.ShipId.from_ship(ship)
+    remaining = bitboard.remaining
+    col, row = ship.tile_position[0]
+    for _ in range(3):
+        bitboard.hit(bitboard.cell(col, row))
+    assert bitboard.remaining == remaining - 1
+    assert bitboard.ship_remaining[ship_id] == len(ship.tile_position) - 1
+    assert bitboard.is_hit(bitboard.cell(col, row))
+    assert not bitboard.is_sunk(ship_id)
@@ -0,0 +1,194 @@
+from collections.abc import Iterator
+import contextlib
+import os
+import shutil
+import signal
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from uuid import uuid4
+
+import pytest
+
+from battleship.client.client import BattleshipClient
+from battleship.server.cluster import (
+    Coordinator,
+    CoordinatorClient,
+    CoordinatorRoomDirectory,
+)
+from battleship.server.directory import (
+    MatchMergeQuery,
+    MatchQuery,
+    MatchRoom,
+    RoomPlacement,
+)
+from battleship.shared import models
+
+from support import serving
+
+WORKERS = 3
+
+
+def match_room(worker: int, rating: int, players: int = 1) -> MatchRoom:
+    return MatchRoom(RoomPlacement(models.RoomId(uuid4()), worker), rating, players)
+
+
+async def test_coordinator_directory_round_trip():
+    coordinator = Coordinator()
+    async with serving(coordinator) as port:
+        client = CoordinatorClient()
+        await client.connect("127.0.0.1", port)
+        directory = CoordinatorRoomDirectory(client)
+
+        assert await directory.match_take(MatchQuery(0, 1000)) is None
+        room = match_room(1, 1000)
+        await directory.match_put(room)
+        assert await directory.match_take(MatchQuery(0, 1050)) == room
+        assert await directory.match_take(MatchQuery(0, 1050)) is None
+
+        older, younger = match_room(0, 1000), match_room(0, 1010)
+        await directory.match_put(older)
+        await directory.match_put(younger)
+        (move,) = await directory.match_merge(MatchMergeQuery(0, 8))
+        assert (move.room, move.into) == (younger, older)
+
+        placement = RoomPlacement(models.RoomId(uuid4()), 2)
+        join_code = await directory.private_code_create(placement)
+        assert await directory.private_code_get(join_code) == placement
+        await directory.room_close(placement.room)
+        assert await directory.private_code_get(join_code) is None
+        await client.disconnect()
+
+
+def free_port_range(count: int) -> int:
+    # the cluster takes count ports in a row from the one it is given
+    for _ in range(100):
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            base = probe.getsockname()[1]
+        if base + count >= 65536:
+            continue
+        sockets = []
+        try:
+            for port in range(base, base + count):
+                sockets.append(socket.socket())
+                sockets[-1].bind(("127.0.0.1", port))
+        except OSError:
+            continue
+        finally:
+            for sock in sockets:
+                sock.close()
+        return base
+    raise RuntimeError("no free port range")
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory: pytest.TempPathFactory) -> tuple[str, str]:
+    if (openssl := shutil.which("openssl")) is None:
+        pytest.skip("openssl is needed to make a certificate")
+    path = tmp_path_factory.mktemp("cert")
+    cert, key = str(path / "cert.pem"), str(path / "key.pem")
+    subprocess.run(
+        [openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1"]
+        + ["-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True,
+        capture_output=True,
+    )
+    return cert, key
+
+
+@pytest.fixture(scope="module")
+def cluster(
+    certificate: tuple[str, str], tmp_path_factory: pytest.TempPathFactory
+) -> Iterator[tuple[int, ssl.SSLContext]]:
+    cert, key = certificate
+    port = free_port_range(WORKERS + 2)
+    db_url = f"sqlite+aiosqlite:///{tmp_path_factory.mktemp('db') / 'cluster.db'}"
+    code = (
+        "import asyncio\n"
+        "from battleship.server.cluster import run_cluster\n"
+        f"asyncio.run(run_cluster({WORKERS}, '127.0.0.1', {port}, {db_url!r}))\n"
+    )
+    process = subprocess.Popen(  # pylint: disable=R1732
+        [sys.executable, "-c", code],
+        env={**os.environ, "SSL_CERT": cert, "SSL_KEY": key},
+        start_new_session=True,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        worker_ports = range(port, port + WORKERS + 1)
+        while any(not port_open(p) for p in worker_ports):
+            if process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("cluster did not start")
+            time.sleep(0.1)
+        context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+        context.load_verify_locations(cert)
+        context.check_hostname = False
+        yield port, context
+    finally:
+        # interrupting run_cluster terminates the workers it started
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            pass
+        # and nothing the cluster started outlives the tests
+        with contextlib.suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def port_open(port: int) -> bool:
+    with socket.socket() as probe:
+        return probe.connect_ex(("127.0.0.1", port)) == 0
+
+
+def worker_port(client: BattleshipClient) -> int:
+    return client.session.session.writer.get_extra_info("peername")[1]
+
+
+async def test_matched_players_end_up_on_one_worker(
+    cluster: tuple[int, ssl.SSLContext]
+):
+    port, context = cluster
+    clients = []
+    for _ in range(12):
+        client = BattleshipClient()
+        await client.connect("127.0.0.1", port, ssl=context)
+        clients.append(client)
+    players = [
+        await client.player_create(models.PlayerCreateArgs(f"player{i}"))
+        for i, client in enumerate(clients)
+    ]
+    rooms: dict[models.RoomId, int] = {}
+    for client, player in zip(clients, players):
+        room = await client.room_match(models.BearingPlayerAuth.from_player(player))
+        room_id = models.RoomId.from_room_info(room)
+        rooms[room_id] = rooms.get(room_id, 0) + 1
+    # rooms fill up whichever worker the players landed on, whoever matched
+    # into a room on another worker was redirected to that worker's own port
+    assert sorted(rooms.values()) == [4, 8]
+    assert any(worker_port(client) != port for client in clients)
+    for client in clients:
+        await client.disconnect()
+
+
+async def test_private_room_join_follows_the_room(cluster: tuple[int, ssl.SSLContext]):
+    port, context = cluster
+    for _ in range(4):
+        owner, guest = BattleshipClient(), BattleshipClient()
+        await owner.connect("127.0.0.1", port, ssl=context)
+        await guest.connect("127.0.0.1", port, ssl=context)
+        owner_player = await owner.player_create(models.PlayerCreateArgs("owner"))
+        guest_player = await guest.player_create(models.PlayerCreateArgs("guest"))
+        created = await owner.private_room_create(
+            models.BearingPlayerAuth.from_player(owner_player)
+        )
+        joined = await guest.private_room_join(
+            models.PrivateRoomJoinArgs(guest_player.auth_token, created.join_code)
+        )
+        assert joined.id == created.room.id
+        await owner.disconnect()
+        await guest.disconnect()
@@ -0,0 +1,139 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import select, text, update
+from sqlalchemy.exc import OperationalError
+
+from battleship.server import db
+from battleship.shared.ship_type import NORMAL_NAVY_SHIP_VARIANT
+
+from support import counting_queries
+
+PLAYERS = 20
+
+
+async def make_players(session_maker, count: int):
+    async with session_maker() as db_session:
+        for i in range(count):
+            player = db.Player(name=f"player{i}")
+            player.ships = [db.Ship(variant_id=NORMAL_NAVY_SHIP_VARIANT.id)]
+            player.emotes = []
+            db_session.add(player)
+        await db_session.commit()
+
+
+async def test_eager_loaded_player_converts_without_queries():
+    session_maker = await db.create_session_maker()
+    await make_players(session_maker, 1)
+    async with session_maker() as db_session:
+        with counting_queries() as statements:
+            result = await db_session.execute(
+                select(db.Player).options(*db.PLAYER_LOAD_OPTIONS)
+            )
+            db_player = result.scalars().one()
+            # the player and one query per relationship
+            assert len(statements) == 3
+            player = await db_player.to_shared(db_session)
+        assert len(statements) == 3
+        assert player.ships == [NORMAL_NAVY_SHIP_VARIANT.id] and player.emotes == []
+
+
+async def test_lazy_player_still_converts():
+    session_maker = await db.create_session_maker()
+    await make_players(session_maker, 1)
+    async with session_maker() as db_session:
+        db_player = (await db_session.execute(select(db.Player))).scalars().one()
+        player = await db_player.to_shared(db_session)
+        assert player.ships == [NORMAL_NAVY_SHIP_VARIANT.id]
+
+
+async def test_to_shared_many_loads_relationships_once():
+    session_maker = await db.create_session_maker()
+    await make_players(session_maker, PLAYERS)
+    async with session_maker() as db_session:
+        db_players = (await db_session.execute(select(db.Player))).scalars().all()
+        with counting_queries() as statements:
+            players = await db.Player.to_shared_many(db_session, db_players)
+        assert len(statements) == 3
+        assert [p.id for p in players] == [p.id for p in db_players]
+        assert all(p.ships == [NORMAL_NAVY_SHIP_VARIANT.id] for p in players)
+
+        with counting_queries() as statements:
+            await db.Player.to_shared_many(db_session, db_players)
+        assert statements == []
+
+
+READERS = 3
+
+
+def file_url(path) -> str:
+    return f"sqlite+aiosqlite:///{path / 'battleship.db'}"
+
+
+def bound_pool_size(db_session) -> int:
+    # the writer has a pool of one, the readers one of READERS
+    return db_session.sync_session.get_bind().pool.size()
+
+
+def test_file_urls():
+    assert db.is_file_url("sqlite+aiosqlite:///battleship.db")
+    assert not db.is_file_url("sqlite+aiosqlite://")
+    assert not db.is_file_url("sqlite+aiosqlite:///:memory:")
+    assert not db.is_file_url("postgresql+asyncpg://localhost/battleship")
+
+
+async def test_reads_use_readers_until_the_session_writes(tmp_path):
+    session_maker = await db.create_file_session_maker(
+        file_url(tmp_path), readers=READERS
+    )
+    async with session_maker() as db_session:
+        assert bound_pool_size(db_session) == READERS
+        db_session.add(db.Player(name="writer"))
+        await db_session.flush()
+        assert bound_pool_size(db_session) == 1
+        # still on the writer, so it sees the row it has not committed yet
+        names = (await db_session.execute(select(db.Player.name))).scalars().all()
+        assert names == ["writer"]
+        await db_session.commit()
+
+    async with session_maker() as db_session:
+        names = (await db_session.execute(select(db.Player.name))).scalars().all()
+        assert names == ["writer"]
+        assert bound_pool_size(db_session) == READERS
+
+
+async def test_bulk_updates_go_to_the_writer(tmp_path):
+    session_maker = await db.create_file_session_maker(
+        file_url(tmp_path), readers=READERS
+    )
+    await make_players(session_maker, 2)
+    async with session_maker() as db_session:
+        await db_session.execute(update(db.Player).values(coins=db.Player.coins + 1))
+        assert bound_pool_size(db_session) == 1
+        await db_session.commit()
+    async with session_maker() as db_session:
+        coins = (await db_session.execute(select(db.Player.coins))).scalars().all()
+        assert coins == [1000001, 1000001]
+
+
+async def test_reader_connections_are_read_only(tmp_path):
+    session_maker = await db.create_file_session_maker(
+        file_url(tmp_path), readers=READERS
+    )
+    async with session_maker() as db_session:
+        journal_mode = (await db_session.execute(text("PRAGMA journal_mode"))).scalar()
+        assert journal_mode == "wal"
+        with pytest.raises(OperationalError):
+            await db_session.execute(
+                text("INSERT INTO player (id, name) VALUES ('x', 'x')")
+            )
+
+
+async def test_schema_check_refuses_an_old_database(tmp_path):
+    with pytest.raises(RuntimeError, match="'player'"):
+        await db.create_file_session_maker(file_url(tmp_path), create_all=False)
+    await db.create_file_session_maker(file_url(tmp_path))
+    with sqlite3.connect(tmp_path / "battleship.db") as connection:
+        connection.execute("ALTER TABLE player DROP COLUMN admin")
+    with pytest.raises(RuntimeError, match="player.admin"):
+        await db.create_file_session_maker(file_url(tmp_path), create_all=False)
@@ -0,0 +1,149 @@
+import random
+from uuid import uuid4
+
+import pytest
+
+from battleship.server import directory as directory_module
+from battleship.server.directory import (
+    LocalRoomDirectory,
+    MatchMergeQuery,
+    MatchMove,
+    MatchQuery,
+    MatchRoom,
+    RoomPlacement,
+)
+from battleship.shared import models
+
+from support import battleship_client, battleship_server
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(directory_module.time, "monotonic", clock)
+    return clock
+
+
+def match_room(rating: int, players: int = 1, worker: int = 0) -> MatchRoom:
+    return MatchRoom(RoomPlacement(models.RoomId(uuid4()), worker), rating, players)
+
+
+async def test_take_only_rooms_within_the_window(clock: Clock):
+    directory = LocalRoomDirectory()
+    assert await directory.match_take(MatchQuery(0, 1200)) is None
+    room = match_room(1500)
+    await directory.match_put(room)
+    assert await directory.match_take(MatchQuery(0, 1200)) is None
+    # 100 wide to start with and 20 wider for every second the room waits
+    clock.now += 9
+    assert await directory.match_take(MatchQuery(0, 1200)) is None
+    clock.now += 1
+    assert await directory.match_take(MatchQuery(0, 1200)) == room
+    assert await directory.match_take(MatchQuery(0, 1200)) is None
+
+
+async def test_window_stops_widening(clock: Clock):
+    directory = LocalRoomDirectory()
+    room = match_room(2100)
+    await directory.match_put(room)
+    clock.now += 3600
+    assert await directory.match_take(MatchQuery(0, 1200)) is None
+    assert await directory.match_take(MatchQuery(0, 1300)) == room
+
+
+async def test_take_prefers_near_then_full_then_old(clock: Clock):
+    directory = LocalRoomDirectory()
+    far = match_room(1390, players=7)
+    old = match_room(1210, players=3)
+    await directory.match_put(far)
+    await directory.match_put(old)
+    clock.now += 30
+    young = match_room(1250, players=3)
+    empty = match_room(1200, players=1)
+    await directory.match_put(young)
+    await directory.match_put(empty)
+    taken = [await directory.match_take(MatchQuery(0, 1220)) for _ in range(5)]
+    assert taken == [old, young, empty, far, None]
+
+
+async def test_put_again_keeps_the_wait(clock: Clock):
+    directory = LocalRoomDirectory()
+    room = match_room(1500)
+    await directory.match_put(room)
+    clock.now += 10
+    fuller = MatchRoom(room.placement, room.rating, 2)
+    await directory.match_put(fuller)
+    assert len(directory.match_rooms) == 1
+    assert await directory.match_take(MatchQuery(0, 1200)) == fuller
+
+
+async def test_closed_rooms_leave_the_index(clock: Clock):
+    directory = LocalRoomDirectory()
+    rooms = [match_room(rating) for rating in range(0, 3000, 50)]
+    for room in rooms:
+        await directory.match_put(room)
+    for room in rooms:
+        await directory.room_close(room.placement.room)
+    assert directory.match_rooms == {}
+    assert directory.match_buckets == {}
+    assert directory.match_bucket_keys == []
+    assert directory.match_opened == {}
+
+
+async def test_merge_waits_for_the_window(clock: Clock):
+    directory = LocalRoomDirectory()
+    older = match_room(1200, players=3)
+    await directory.match_put(older)
+    clock.now += 1
+    younger = match_room(1500, players=2)
+    other_worker = match_room(1200, players=1, worker=1)
+    await directory.match_put(younger)
+    await directory.match_put(other_worker)
+    assert await directory.match_merge(MatchMergeQuery(0, 8)) == []
+    clock.now += 9
+    assert await directory.match_merge(MatchMergeQuery(0, 8)) == [
+        MatchMove(younger, older)
+    ]
+    # both are out of matchmaking until the worker puts the result back
+    assert directory.match_rooms.keys() == {other_worker.placement.room}
+
+
+async def test_merge_keeps_rooms_within_size(clock: Clock):
+    directory = LocalRoomDirectory()
+    rooms = [match_room(1200, players=players) for players in [5, 4, 3, 1]]
+    for room in rooms:
+        await directory.match_put(room)
+        clock.now += 1
+    moves = await directory.match_merge(MatchMergeQuery(0, 8))
+    assert moves == [MatchMove(rooms[2], rooms[0]), MatchMove(rooms[3], rooms[1])]
+
+
+async def test_private_codes():
+    directory = LocalRoomDirectory(rng=random.Random(0))
+    placements = [RoomPlacement(models.RoomId(uuid4()), 0) for _ in range(100)]
+    codes = [await directory.private_code_create(p) for p in placements]
+    assert len(set(codes)) == len(codes)
+    for code, placement in zip(codes, placements):
+        assert await directory.private_code_get(code) == placement
+    await directory.room_close(placements[0].room)
+    assert await directory.private_code_get(codes[0]) is None
+
+
+async def test_rooms_leave_matchmaking_when_emptied():
+    async with battleship_server() as (server, port):
+        client = await battleship_client(port)
+        player = await client.player_create(models.PlayerCreateArgs("waiting"))
+        room = await client.room_match(models.BearingPlayerAuth.from_player(player))
+        assert models.RoomId(room.id) in server.directory.match_rooms
+        await client.room_leave(models.RoomId(room.id))
+        assert server.directory.match_rooms == {}
+        assert server.rooms == {}
+        await client.disconnect()
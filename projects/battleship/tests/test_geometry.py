@@ -0,0 +1,61 @@
+import pytest
+
+from battleship.shared import geometry, models, ship_type, shot_type
+from battleship.shared.utils import add, mat_mul_vec
+
+POSITIONS = [(col, row) for col in range(-3, 11) for row in range(-3, 11)]
+KINDS = [
+    (shot_type.SHOT_VARIANTS, shot_type.ORIENTATIONS, geometry.SHOT_FOOTPRINTS),
+    (ship_type.SHIP_VARIANTS, ship_type.ORIENTATIONS, geometry.SHIP_FOOTPRINTS),
+]
+
+
+def rotated(variant, orientation, position) -> dict[tuple[int, int], list[str]]:
+    # how the room and the views placed a footprint before the tables
+    return {
+        add(position, mat_mul_vec(orientation, offset)): sprite
+        for offset, sprite in variant.placement_offsets.items()
+    }
+
+
+@pytest.mark.parametrize("variants, orientations, footprints", KINDS)
+def test_tables_cover_every_variant_and_orientation(variants, orientations, footprints):
+    assert footprints.keys() == variants.keys()
+    for variant_footprints in footprints.values():
+        assert len(variant_footprints) == len(orientations)
+
+
+@pytest.mark.parametrize("variants, orientations, footprints", KINDS)
+def test_footprints_match_rotating_the_offsets(variants, orientations, footprints):
+    for variant_id, variant in variants.items():
+        for i, orientation in enumerate(orientations):
+            footprint = footprints[variant_id][i]
+            for position in POSITIONS:
+                expected = rotated(variant, orientation, position)
+                assert footprint.placement(position) == expected
+                assert footprint.locations(position) == [*expected.keys()]
+
+
+@pytest.mark.parametrize("variants, orientations, footprints", KINDS)
+@pytest.mark.parametrize("width, height", [(8, 8), (5, 9)])
+def test_in_bounds_matches_checking_every_tile(
+    variants, orientations, footprints, width: int, height: int
+):
+    for variant_id in variants:
+        for footprint in footprints[variant_id]:
+            for position in POSITIONS:
+                assert footprint.in_bounds(position, width, height) == all(
+                    0 <= col < width and 0 <= row < height
+                    for col, row in footprint.locations(position)
+                )
+
+
+def test_lookups_by_id():
+    shot_id = next(iter(shot_type.SHOT_VARIANTS))
+    ship_id, ship = next(iter(ship_type.SHIP_VARIANTS.items()))
+    assert geometry.shot_footprint(models.ShotVariantId(shot_id), 1) is (
+        geometry.SHOT_FOOTPRINTS[shot_id][1]
+    )
+    assert geometry.ship_footprint(models.ShipVariantId(ship_id), 2).placement(
+        (4, 4)
+    ) == rotated(ship, ship_type.ORIENTATIONS[2], (4, 4))
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+from tsocket.shared import ResponseError
+
+from battleship.shared import avatar_type, models
+
+from support import battleship_client, battleship_server, counting_queries
+
+
+async def test_authenticated_routes_skip_the_database():
+    async with battleship_server() as (_server, port):
+        client = await battleship_client(port)
+        player = await client.player_create(models.PlayerCreateArgs("cached"))
+        auth = models.BearingPlayerAuth.from_player(player)
+        await client.player_get(auth)
+        with counting_queries() as statements:
+            assert await client.player_get(auth) == player
+            await client.player_info_get(models.PlayerId.from_player(player))
+            await client.room_match(auth)
+            await client.private_room_create(auth)
+        assert statements == []
+        await client.disconnect()
+
+
+async def test_writes_update_the_cached_player():
+    async with battleship_server() as (_server, port):
+        client = await battleship_client(port)
+        player = await client.player_create(models.PlayerCreateArgs("cached"))
+        auth = models.BearingPlayerAuth.from_player(player)
+        avatar = avatar_type.GIGACHAD_AVATAR_VARIANT
+        updated = await client.player_avatar_set(
+            models.PlayerAvatarSetArgs(
+                player.auth_token, models.AvatarVariantId(avatar.id)
+            )
+        )
+        assert updated.avatar.id == avatar.id
+        assert await client.player_get(auth) == updated
+
+        result = await client.gacha(auth)
+        assert result.player.coins == player.coins - 100
+        assert await client.player_get(auth) == result.player
+        await client.disconnect()
+
+
+async def test_cache_entries_leave_with_their_session():
+    async with battleship_server() as (server, port):
+        client = await battleship_client(port)
+        player = await client.player_create(models.PlayerCreateArgs("cached"))
+        auth = models.BearingPlayerAuth.from_player(player)
+        await client.player_get(auth)
+        assert server.player_cache.keys() == {player.auth_token}
+
+        await client.player_delete(auth)
+        assert server.player_cache == {} and server.player_cache_rev == {}
+        with pytest.raises(ResponseError):
+            await client.player_get(auth)
+
+        other = await client.player_create(models.PlayerCreateArgs("other"))
+        await client.player_get(models.BearingPlayerAuth.from_player(other))
+        await client.disconnect()
+        for _ in range(100):
+            if not server.player_cache:
+                break
+            await asyncio.sleep(0.01)
+        assert server.player_cache == {} and server.player_cache_rev == {}
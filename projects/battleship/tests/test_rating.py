@@ -0,0 +1,77 @@
+import random
+from uuid import uuid4
+
+import pytest
+
+from battleship.server.rating import EloRatingSystem, GlickoRatingSystem
+from battleship.shared import models
+
+SYSTEMS = [EloRatingSystem(), GlickoRatingSystem()]
+
+
+def placement(*ratings: int) -> list[models.PlayerInfo]:
+    avatar = models.AvatarVariantId(uuid4())
+    return [
+        models.PlayerInfo(uuid4(), f"player{i}", rating, avatar)
+        for i, rating in enumerate(ratings)
+    ]
+
+
+def pairwise_elo(players: list[models.PlayerInfo]) -> list[int]:
+    # what the room summed up before there was a rating system
+    return [
+        sum(
+            player.rating_changes(other, j < i)
+            for j, other in enumerate(players)
+            if j != i
+        )
+        for i, player in enumerate(players)
+    ]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_elo_matches_pairwise_rating_changes(seed: int):
+    rng = random.Random(seed)
+    players = placement(*(rng.randrange(0, 3000) for _ in range(rng.randrange(2, 17))))
+    assert EloRatingSystem().placement_changes(players) == pairwise_elo(players)
+
+
+def test_elo_known_values():
+    elo = EloRatingSystem()
+    assert elo.placement_changes(placement(1200, 1200)) == [-16, 16]
+    assert elo.placement_changes(placement(1200, 1600)) == [-3, 3]
+    assert elo.placement_changes(placement(1600, 1200)) == [-29, 29]
+    assert elo.placement_changes(placement(1200, 1200, 1200)) == [-32, 0, 32]
+
+
+def test_glicko_known_values():
+    glicko = GlickoRatingSystem()
+    assert glicko.placement_changes(placement(1200, 1200)) == [-7, 7]
+    assert glicko.placement_changes(placement(1200, 1200, 1200)) == [-14, 0, 14]
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_nobody_to_play_changes_nothing(system):
+    assert system.placement_changes([]) == []
+    assert system.placement_changes(placement(1500)) == [0]
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_placement_orders_changes(system):
+    rng = random.Random(0)
+    for _ in range(50):
+        rating = rng.randrange(800, 2000)
+        changes = system.placement_changes(placement(*[rating] * 6))
+        # equal players move further the further they placed from the middle
+        assert changes == sorted(changes)
+        assert changes[0] < 0 < changes[-1]
+        assert changes == [-c for c in reversed(changes)]
+
+
+@pytest.mark.parametrize("system", SYSTEMS)
+def test_upsets_move_ratings_further(system):
+    (_, favourite_win), (_, underdog_win) = (
+        system.placement_changes(placement(1200, 1600)),
+        system.placement_changes(placement(1600, 1200)),
+    )
+    assert 0 < favourite_win < underdog_win
@@ -0,0 +1,196 @@
+import random
+from uuid import uuid4
+
+import pytest
+from tsocket.shared import Empty
+
+from battleship.server.bitboard import BitBoard
+from battleship.server.models import Room
+from battleship.server.replay import BoardRecord, ReplayEvent, ReplayLog, ShotRecord
+from battleship.server.replay_engine import (
+    ReplayMismatch,
+    ReplayServer,
+    replay,
+    simulate,
+)
+from battleship.shared import avatar_type, emote_type, models, shot_type
+
+from support import legal_board
+
+
+def player_info(name: str):
+    return models.PlayerInfo(
+        uuid4(),
+        name,
+        1000,
+        models.AvatarVariantId(avatar_type.CAPTAIN_AVATAR_VARIANT.id),
+    )
+
+
+async def play_game(seed: int, count: int = 3, games: int = 1) -> Room:
+    # a room driven the way its timers and players would drive it, on a
+    # ReplayServer, with random shots at random opponents until one is left
+    rng = random.Random(seed)
+    server = ReplayServer()
+    room = Room(uuid4(), server, False, seed=seed)
+    room_id = room.to_room_id()
+    server.rooms[room_id] = room
+    players = [server.player_add(player_info(f"player{i}")) for i in range(count)]
+    for player in players:
+        await room.add_player(player)
+    for _ in range(games):
+        for player in players:
+            await room.add_ready(player)
+        for player in players:
+            board = legal_board(rng, player=player, room=room_id)
+            await room.add_board_submit(BitBoard.from_board(board))
+        while room.alive_players:
+            await room.on_turn_start(room.turn)
+            player = models.PlayerId.from_player_info(room.alive_players[0])
+            if rng.random() < 0.05:
+                await room.on_turn_timeout(room.turn)
+                continue
+            if rng.random() < 0.05:
+                emote = models.EmoteVariantId(emote_type.HELLO_EMOTE_VARIANT.id)
+                await room.do_emote_display(player, emote)
+            board_id = rng.choice(
+                [
+                    board_id
+                    for board_id, board in room.boards.items()
+                    if board.player != player and not board.lost
+                ]
+            )
+            shot = models.Shot(
+                models.ShotVariantId(rng.choice([*shot_type.SHOT_VARIANTS])),
+                (rng.randrange(8), rng.randrange(8)),
+                rng.randrange(4),
+                board_id,
+            )
+            await room.do_shot_submit(player, shot)
+    return room
+
+
+def test_round_trip():
+    now = [0.0]
+    log = ReplayLog(uuid4(), True, 2**64 - 1, 12.5, clock=lambda: now[0])
+    info = player_info("player")
+    player = models.PlayerId.from_player_info(info)
+    board = BitBoard.from_board(legal_board(random.Random(1), player=player))
+    shot = models.Shot(
+        models.ShotVariantId(shot_type.NORMAL_SHOT_VARIANT.id),
+        (3, 4),
+        2,
+        models.BoardId.from_board(board),
+    )
+    emote = models.EmoteVariantId(emote_type.BRUH_EMOTE_VARIANT.id)
+    # ms since the start of the log, a clock running backwards adds nothing
+    events = [
+        (0.0, ReplayEvent.JOIN, info),
+        (0.2, ReplayEvent.READY, player),
+        (0.2, ReplayEvent.BOARD, BoardRecord.from_bitboard(board)),
+        (1.0, ReplayEvent.TURN_START, Empty()),
+        (0.5, ReplayEvent.SHOT, ShotRecord(player, shot)),
+        (300.0, ReplayEvent.EMOTE, models.EmoteDisplayData(player, emote)),
+        (300.0, ReplayEvent.TURN_TIMEOUT, Empty()),
+        (300.001, ReplayEvent.SURRENDER, player),
+        (300.001, ReplayEvent.LOST, player),
+        (300.001, ReplayEvent.LEAVE, player),
+    ]
+    for now[0], event, payload in events:
+        log.append(event, payload)
+
+    loaded = ReplayLog.from_bytes(log.to_bytes())
+    assert (loaded.room, loaded.start_private, loaded.seed, loaded.started) == (
+        log.room,
+        True,
+        2**64 - 1,
+        12.5,
+    )
+    assert [(event, payload) for _, event, payload in events] == [
+        (event, payload) for event, _, payload in loaded.events()
+    ]
+    assert [now for _, now, _ in loaded.records()] == [
+        0,
+        200,
+        200,
+        1000,
+        1000,
+        300000,
+        300000,
+        300001,
+        300001,
+        300001,
+    ]
+
+
+async def test_save_load(tmp_path):
+    room = await play_game(1)
+    path = str(tmp_path / f"{room.id}.replay")
+    room.replay.save(path)
+    loaded = ReplayLog.load(path)
+    assert loaded.to_bytes() == room.replay.to_bytes()
+    assert [*loaded.events()] == [*room.replay.events()]
+
+
+def test_not_a_replay_log():
+    data = bytearray(ReplayLog(uuid4(), False, 1).to_bytes())
+    data[0] ^= 0xFF
+    with pytest.raises(ValueError, match="not a replay log"):
+        ReplayLog.from_bytes(bytes(data))
+
+
+async def test_bad_records():
+    log = (await play_game(2)).replay
+    truncated = ReplayLog(log.room, False, log.seed, data=log.data[:-1])
+    with pytest.raises(ValueError, match="replay log truncated"):
+        [*truncated.records()]
+    unknown = ReplayLog(log.room, False, log.seed, data=bytearray([0]) + log.data)
+    with pytest.raises(ValueError, match="unknown replay event"):
+        [*unknown.records()]
+
+
+@pytest.mark.parametrize("seed, count, games", [(3, 2, 1), (4, 3, 1), (5, 4, 3)])
+async def test_replay_matches(seed: int, count: int, games: int):
+    room = await play_game(seed, count, games)
+    replayed = await replay(ReplayLog.from_bytes(room.replay.to_bytes()))
+    assert replayed.lost_players == room.lost_players
+    # the times are those of the log, a loss is logged in the same ms as the
+    # shot that caused it where the room may have ticked over in between
+    assert [(event, payload) for event, _, payload in replayed.replay.events()] == [
+        (event, payload) for event, _, payload in room.replay.events()
+    ]
+
+
+async def test_replay_mismatch():
+    # a log whose losses no longer follow from its shots
+    log = (await play_game(6)).replay
+    events = [*log.events()]
+    last_lost = max(
+        i for i, (event, _, _) in enumerate(events) if event == ReplayEvent.LOST
+    )
+    tampered = ReplayLog(log.room, False, log.seed)
+    for i, (event, _, payload) in enumerate(events):
+        if i != last_lost:
+            tampered.append(event, payload)
+    with pytest.raises(ReplayMismatch):
+        await replay(tampered)
+    with pytest.raises(ReplayMismatch):
+        simulate(tampered)
+
+
+@pytest.mark.parametrize("seed, count, games", [(7, 2, 1), (8, 3, 1), (9, 4, 3)])
+async def test_simulate(seed: int, count: int, games: int):
+    room = await play_game(seed, count, games)
+    simulation = simulate(ReplayLog.from_bytes(room.replay.to_bytes()))
+    assert len(simulation.games) == games
+    game = simulation.games[-1]
+    assert game.placement == [
+        models.PlayerId.from_player_info(player) for player in room.lost_players
+    ]
+    assert game.hits == sum(
+        board.ships.bit_count() - board.remaining for board in room.boards.values()
+    )
+    shots = [
+        event for event, _, _ in room.replay.records() if event == ReplayEvent.SHOT
+    ]
+    assert sum(game.shots for game in simulation.games) == len(shots)
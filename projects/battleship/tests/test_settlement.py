@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from battleship.server import db
+from battleship.shared import models
+
+from support import battleship_server, counting_queries, ready_room
+
+
+@pytest.mark.parametrize("count", [2, 8])
+async def test_game_end_settles_every_player_in_one_write(count: int):
+    async with battleship_server() as (server, port):
+        clients, players, room = await ready_room(port, count)
+        with counting_queries() as statements:
+            for client in clients[1:]:
+                await client.room_surrender(room)
+            ends = [
+                await asyncio.wait_for(anext(client.on_game_end()), 1)
+                for client in clients
+            ]
+        # every player was cached by their session, the database is untouched
+        assert statements == []
+        assert ends[0].win == models.PlayerId.from_player(players[0])
+        for player, end in zip(players, ends):
+            assert end.new_stat.rating == player.rating + end.rating_change
+            assert end.new_stat.coins == player.coins + end.coin_change
+        assert len(server.write_behind.pending) == count
+
+        with counting_queries() as statements:
+            await server.write_behind.flush()
+        assert len(statements) == 1
+        async with server.db_session_maker() as db_session:
+            stored = {
+                row.id: (row.rating, row.coins)
+                for row in (await db_session.execute(select(db.Player))).scalars()
+            }
+        assert stored == {
+            end.new_stat.id: (end.new_stat.rating, end.new_stat.coins) for end in ends
+        }
+        for client in clients:
+            await client.disconnect()
+
+
+async def test_settling_unloaded_players_loads_them_together():
+    async with battleship_server() as (server, port):
+        # the clients are held on to, a collected one leaves the room and
+        # loads its player in the middle of the settlement
+        clients, players, _ = await ready_room(port, 4)
+        server.player_cache.clear()
+        server.player_cache_rev.clear()
+        player_ids = [models.PlayerId.from_player(p) for p in players]
+        with counting_queries() as statements:
+            settled = await server._players_settle(  # pylint: disable=W0212
+                {player_id: 10 for player_id in player_ids}, {player_ids[0]: 5}
+            )
+        # the players and one query per relationship
+        assert len(statements) == 3
+        assert [settled[p].rating for p in player_ids] == [
+            p.rating + 10 for p in players
+        ]
+        assert settled[player_ids[0]].coins == players[0].coins + 5
+        for client in clients:
+            await client.disconnect()
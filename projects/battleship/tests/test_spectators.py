@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+from tsocket.shared import ResponseError
+
+from battleship.client.client import BattleshipClient
+from battleship.shared import emote_type, models
+
+from support import battleship_client, battleship_server, ready_room
+
+SPECTATORS = 200
+EMOTES = 20
+
+
+async def spectator(port: int, room: models.RoomId) -> BattleshipClient:
+    client = await battleship_client(port)
+    player = await client.player_create(models.PlayerCreateArgs("spectator"))
+    await client.player_get(models.BearingPlayerAuth.from_player(player))
+    await client.room_spectate(room)
+    return client
+
+
+async def test_many_spectators_share_one_encoding():
+    async with battleship_server() as (server, port):
+        players, _, room_id = await ready_room(port, 2)
+        spectators = await asyncio.gather(
+            *(spectator(port, room_id) for _ in range(SPECTATORS))
+        )
+        room = server.rooms[room_id]
+        assert len(room.spectators.subscribers) == SPECTATORS
+
+        emit = server.emits["on_emote_display"]
+        encodes = 0
+        dumps = emit.dumps
+
+        def counting(encode):
+            def counted(args):
+                nonlocal encodes
+                encodes += 1
+                return encode(args)
+
+            return counted
+
+        emit.dumps = {codec: counting(encode) for codec, encode in dumps.items()}
+        emotes = [models.EmoteVariantId(e) for e in [*emote_type.EMOTE_VARIANTS] * 4]
+        emotes = emotes[:EMOTES]
+        try:
+            start = time.perf_counter()
+            for emote in emotes:
+                await players[0].emote_display(models.EmoteDisplayArgs(room_id, emote))
+            # the room never waits on its spectators
+            sent = time.perf_counter() - start
+            streams = [client.on_emote_display() for client in spectators]
+            for stream in streams:
+                received = [
+                    (await asyncio.wait_for(anext(stream), 5)).emote for _ in emotes
+                ]
+                assert received == emotes
+        finally:
+            emit.dumps = dumps
+        assert encodes == EMOTES
+        assert sent < 1
+        for client in [*players, *spectators]:
+            await client.disconnect()
+
+
+async def test_spectators_leave_with_their_session_and_room():
+    async with battleship_server() as (server, port):
+        players, _, room_id = await ready_room(port, 2)
+        room = server.rooms[room_id]
+        spectators = [await spectator(port, room_id) for _ in range(3)]
+        await spectators[0].room_spectate_leave(room_id)
+        await spectators[1].disconnect()
+        for _ in range(100):
+            if len(room.spectators.subscribers) == 1:
+                break
+            await asyncio.sleep(0.01)
+        assert len(room.spectators.subscribers) == 1
+
+        # the game cannot go on with one player, which closes the room
+        await players[0].room_leave(room_id)
+        assert room_id not in server.rooms
+        await asyncio.wait_for(anext(spectators[2].on_room_delete()), 1)
+        assert room.spectators.subscribers == {}
+        for client in [*players, spectators[0], spectators[2]]:
+            await client.disconnect()
+
+
+async def test_players_cannot_spectate_their_own_room():
+    async with battleship_server() as (_server, port):
+        players, _, room_id = await ready_room(port, 2)
+        with pytest.raises(ResponseError) as err:
+            await players[0].room_spectate(room_id)
+        assert err.value.method == "not_found"
+        for client in players:
+            await client.disconnect()
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+
+import pytest
+
+from battleship.server.timer import TimerWheel
+
+
+def recorder(fired: list, key):
+    loop = asyncio.get_running_loop()
+    return lambda: fired.append((key, loop.time()))
+
+
+async def test_timers_fire_in_order_and_never_early():
+    wheel = TimerWheel(tick=0.01)
+    loop = asyncio.get_running_loop()
+    fired = []
+    start = loop.time()
+    delays = [0.05, 0.01, 0.03, 0.02, 0.05]
+    for i, delay in enumerate(delays):
+        wheel.call_later(delay, recorder(fired, i))
+    await asyncio.sleep(0.1)
+    assert [i for i, _ in fired] in ([1, 3, 2, 0, 4], [1, 3, 2, 4, 0])
+    for i, at in fired:
+        assert delays[i] <= at - start < delays[i] + 0.03
+    assert wheel.count == 0
+
+
+async def test_cancelled_timers_do_not_fire():
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+    timers = [wheel.call_later(0.02, recorder(fired, i)) for i in range(10)]
+    for timer in timers[::2]:
+        timer.cancel()
+    timers[0].cancel()
+    assert wheel.count == 5
+    await asyncio.sleep(0.05)
+    assert sorted(i for i, _ in fired) == [1, 3, 5, 7, 9]
+    for timer in timers:
+        timer.cancel()
+    assert wheel.count == 0
+
+
+async def test_long_timers_cascade_through_every_level():
+    # levels cover 4, 16 and 64 ticks, so these start out on each of them
+    wheel = TimerWheel(tick=0.01, slots=4, levels=3)
+    loop = asyncio.get_running_loop()
+    fired = []
+    start = loop.time()
+    delays = [0.02, 0.09, 0.35, 0.55]
+    for i, delay in enumerate(delays):
+        wheel.call_later(delay, recorder(fired, i))
+    assert [sum(map(len, level)) for level in wheel.wheels] == [1, 1, 2]
+    await asyncio.sleep(0.7)
+    assert [i for i, _ in fired] == [0, 1, 2, 3]
+    for i, at in fired:
+        assert delays[i] <= at - start < delays[i] + 0.05
+
+
+async def test_failing_callback_does_not_stop_the_wheel(caplog):
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+
+    def fail():
+        raise RuntimeError("timer failed")
+
+    wheel.call_later(0.01, fail)
+    wheel.call_later(0.03, recorder(fired, 0))
+    with caplog.at_level(logging.ERROR):
+        await asyncio.sleep(0.06)
+    assert "timer failed" in caplog.text
+    assert [i for i, _ in fired] == [0]
+
+
+async def test_idle_wheel_stops_and_restarts():
+    wheel = TimerWheel(tick=0.01)
+    loop = asyncio.get_running_loop()
+    fired = []
+    wheel.call_later(0.01, recorder(fired, 0))
+    await asyncio.sleep(0.05)
+    assert wheel.task is None
+    # the ticks that passed while idle are skipped, not run all at once
+    await asyncio.sleep(0.1)
+    start = loop.time()
+    wheel.call_later(0.03, recorder(fired, 1))
+    await asyncio.sleep(0.06)
+    assert [i for i, _ in fired] == [0, 1]
+    assert fired[1][1] - start >= 0.03
+
+
+async def test_close_stops_the_tick_task():
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+    wheel.call_later(0.05, recorder(fired, 0))
+    task = wheel.task
+    await wheel.close()
+    assert task is not None and task.cancelled()
+    assert wheel.task is None
+    await asyncio.sleep(0.08)
+    assert fired == []
+
+
+@pytest.mark.parametrize("delay", [0, -1])
+async def test_due_timers_wait_for_the_next_tick(delay: float):
+    wheel = TimerWheel(tick=0.01)
+    fired = []
+    wheel.call_later(delay, recorder(fired, 0))
+    assert fired == []
+    await asyncio.sleep(0.03)
+    assert len(fired) == 1
@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+import pytest
+
+from battleship.server import models as server_models
+from battleship.server.models import RoomPhase
+from battleship.shared import emote_type, models
+
+from support import battleship_server, ready_room, submit_boards
+
+
+async def test_room_answers_during_turn_transition():
+    async with battleship_server() as (server, port):
+        clients, players, room_id = await ready_room(port, 4)
+        await submit_boards(clients, players, room_id)
+        room = server.rooms[room_id]
+        assert room.phase == RoomPhase.TURN_TRANSITION
+        emote = models.EmoteVariantId(next(iter(emote_type.EMOTE_VARIANTS)))
+        start = time.perf_counter()
+        for client in clients:
+            await client.game_view_get(models.GameViewArgs(room_id, None))
+            await client.emote_display(models.EmoteDisplayArgs(room_id, emote))
+        # the leave goes through the room lock like every other change
+        await clients[-1].room_leave(room_id)
+        # nothing waits for the five seconds of the transition to pass
+        assert time.perf_counter() - start < 1
+        assert room.phase == RoomPhase.TURN_TRANSITION
+        assert len(room.alive_players) == 3
+        for client in clients:
+            await client.disconnect()
+        # the last players leaving end the game, which settles in the database
+        for _ in range(100):
+            if not server.rooms:
+                break
+            await asyncio.sleep(0.01)
+        assert not server.rooms
+
+
+async def test_turns_start_and_time_out(monkeypatch):
+    monkeypatch.setattr(server_models, "TURN_TRANSITION_DELAY", 0.2)
+    monkeypatch.setattr(server_models, "TURN_TIMEOUT", 0.3)
+    async with battleship_server() as (server, port):
+        clients, players, room_id = await ready_room(port, 2)
+        await submit_boards(clients, players, room_id)
+        room = server.rooms[room_id]
+        client = clients[0]
+        start = time.perf_counter()
+        first = await asyncio.wait_for(anext(client.on_game_turn_start()), 1)
+        started = time.perf_counter() - start
+        assert room.phase == RoomPhase.PLAYING
+        assert await asyncio.wait_for(anext(client.on_game_turn_end()), 1) == first
+        timed_out = time.perf_counter() - start
+        second = await asyncio.wait_for(anext(client.on_game_turn_start()), 1)
+        assert second != first
+        assert 0.2 <= started < 0.5
+        assert 0.5 <= timed_out < 0.9
+        for client in clients:
+            await client.disconnect()
+
+
+@pytest.mark.parametrize("phase", [RoomPhase.TURN_TRANSITION, RoomPhase.PLAYING])
+async def test_game_end_stops_the_turn_timer(monkeypatch, phase: RoomPhase):
+    monkeypatch.setattr(server_models, "TURN_TRANSITION_DELAY", 0.1)
+    async with battleship_server() as (server, port):
+        clients, players, room_id = await ready_room(port, 3)
+        await submit_boards(clients, players, room_id)
+        room = server.rooms[room_id]
+        if phase == RoomPhase.PLAYING:
+            await asyncio.wait_for(anext(clients[0].on_game_turn_start()), 1)
+        assert room.phase == phase and room.turn_timer is not None
+        await clients[1].room_surrender(room_id)
+        await clients[2].room_leave(room_id)
+        await asyncio.wait_for(anext(clients[0].on_game_end()), 1)
+        assert room.turn_timer is None
+        turn = room.turn
+        await asyncio.sleep(0.3)
+        assert room.turn == turn and room.phase == phase
+        for client in clients:
+            await client.disconnect()
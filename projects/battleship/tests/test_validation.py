@@ -0,0 +1,259 @@
+from collections.abc import Callable
+from copy import deepcopy
+from dataclasses import replace
+import random
+from uuid import UUID, uuid4
+
+import pytest
+from tsocket.shared import ResponseError
+
+from battleship.server.validation import BOARD_OBSTACLES, BoardInvalid, board_check
+from battleship.shared import geometry, models, obstacle_type, ship_type
+
+from support import battleship_client, battleship_server, legal_board
+
+NAVY = [ship_type.NORMAL_NAVY_SHIP_VARIANT.id] * 4
+
+
+def board_ok(board: models.Board, owned_ships: list[UUID]) -> bool:
+    # straightforward restatement of the rules to check board_check against
+    if len(board.grid) != 8 or any(len(tiles) != 8 for tiles in board.grid):
+        return False
+    tiles = [tile for tiles in board.grid for tile in tiles]
+    if any(tile.hit or isinstance(tile, models.MineTile) for tile in tiles):
+        return False
+    if sum(isinstance(t, models.ObstacleTile) for t in tiles) != BOARD_OBSTACLES:
+        return False
+    fleets = [
+        sorted(variant.id for variant in variants)
+        for variants in ship_type.SHIP_SKIN_LOOKUP.values()
+    ]
+    fleet = sorted(ship.ship_variant.id for ship in board.ship)
+    if fleet not in fleets or not set(fleet) & set(owned_ships):
+        return False
+    expected = {}
+    for ship in board.ship:
+        if not 0 <= ship.orientation < 4 or not ship.tile_position:
+            return False
+        footprint = geometry.ship_footprint(ship.ship_variant, ship.orientation)
+        first_col, first_row = footprint.offsets[0]
+        anchor = (
+            ship.tile_position[0][0] - first_col,
+            ship.tile_position[0][1] - first_row,
+        )
+        if not footprint.in_bounds(anchor, 8, 8):
+            return False
+        if footprint.locations(anchor) != list(ship.tile_position):
+            return False
+        for location in ship.tile_position:
+            if location in expected:
+                return False
+            expected[location] = models.ShipId.from_ship(ship)
+    for col in range(8):
+        for row in range(8):
+            tile = board.grid[col][row]
+            if isinstance(tile, models.ShipTile) != ((col, row) in expected):
+                return False
+            if isinstance(tile, models.ShipTile) and tile.ship != expected[col, row]:
+                return False
+    return True
+
+
+def mutate(rng: random.Random, board: models.Board) -> models.Board:
+    board = deepcopy(board)
+    if len(board.grid) != 8 or not board.ship:
+        return board
+    col, row = rng.randrange(8), rng.randrange(8)
+    index = rng.randrange(len(board.ship))
+    ship = board.ship[index]
+    match rng.randrange(10):
+        case 0:
+            board.grid[col][row] = models.ObstacleTile(
+                models.ObstacleVariantId(obstacle_type.ROCK_OBSTACLE_VARIANT.id)
+            )
+        case 1:
+            board.grid[col][row] = models.EmptyTile()
+        case 2:
+            board.grid[col][row].hit = True
+        case 3:
+            board.grid.pop()
+        case 4:
+            board.grid[col][row] = models.ShipTile(
+                models.ShipId.from_ship(rng.choice(board.ship))
+            )
+        case 5:
+            shift = rng.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
+            board.ship[index] = replace(
+                ship,
+                tile_position=[
+                    (c + shift[0], r + shift[1]) for c, r in ship.tile_position
+                ],
+            )
+        case 6:
+            board.ship[index] = replace(ship, orientation=rng.randrange(-1, 5))
+        case 7:
+            board.ship.pop(index)
+        case 8:
+            board.grid[col][row] = models.MineTile(models.MineVariantId(uuid4()))
+        case 9:
+            variant = rng.choice(list(ship_type.SHIP_VARIANTS))
+            board.ship[index] = replace(
+                ship, ship_variant=models.ShipVariantId(variant)
+            )
+    return board
+
+
+def test_legal_boards_pass():
+    rng = random.Random(1)
+    for skin in ship_type.SHIP_SKIN_LOOKUP:
+        owned = [ship_type.SHIP_SKIN_LOOKUP[skin][0].id]
+        for _ in range(200):
+            board = legal_board(rng, skin)
+            bitboard = board_check(board, owned)
+            assert bitboard.ships.bit_count() == sum(
+                len(ship.tile_position) for ship in board.ship
+            )
+
+
+def test_fuzz_matches_rules():
+    rng = random.Random(2)
+    accepted = rejected = 0
+    for _ in range(3000):
+        board = legal_board(rng)
+        for _ in range(rng.randrange(3)):
+            board = mutate(rng, board)
+        try:
+            board_check(board, NAVY)
+        except BoardInvalid:
+            ok = False
+        else:
+            ok = True
+        assert ok == board_ok(board, NAVY), board
+        accepted += ok
+        rejected += not ok
+    # both sides of the rules are actually exercised
+    assert accepted > 300 and rejected > 300
+
+
+def overlap(board: models.Board):
+    # the two straight ships of a navy fleet on the same tiles
+    board.ship[1] = replace(
+        board.ship[1],
+        tile_position=board.ship[0].tile_position,
+        orientation=board.ship[0].orientation,
+    )
+
+
+def out_of_bounds(board: models.Board):
+    ship = board.ship[0]
+    board.ship[0] = replace(
+        ship, tile_position=[(col + 8, row) for col, row in ship.tile_position]
+    )
+
+
+def wrong_variant(board: models.Board):
+    board.ship[0] = replace(
+        board.ship[0],
+        ship_variant=models.ShipVariantId(ship_type.NORMAL_PIRATE_SHIP_VARIANT.id),
+    )
+
+
+def missing_ship_tile(board: models.Board):
+    col, row = board.ship[0].tile_position[0]
+    board.grid[col][row] = models.EmptyTile()
+
+
+def foreign_ship_tile(board: models.Board):
+    col, row = board.ship[0].tile_position[0]
+    board.grid[col][row] = models.ShipTile(models.ShipId.from_ship(board.ship[1]))
+
+
+def stray_ship_tile(board: models.Board):
+    col, row = next(
+        (col, row)
+        for col in range(8)
+        for row in range(8)
+        if isinstance(board.grid[col][row], models.EmptyTile)
+    )
+    board.grid[col][row] = models.ShipTile(models.ShipId.from_ship(board.ship[0]))
+
+
+def extra_obstacle(board: models.Board):
+    col, row = board.ship[0].tile_position[0]
+    board.grid[col][row] = models.ObstacleTile(
+        models.ObstacleVariantId(obstacle_type.ROCK_OBSTACLE_VARIANT.id)
+    )
+
+
+def hit_tile(board: models.Board):
+    board.grid[0][0].hit = True
+
+
+def duplicate_ship(board: models.Board):
+    board.ship[1] = replace(board.ship[1], id=board.ship[0].id)
+
+
+@pytest.mark.parametrize(
+    "malform, reason",
+    [
+        (overlap, "ships overlap"),
+        (out_of_bounds, "ship footprint"),
+        (wrong_variant, "fleet"),
+        (lambda board: board.ship.pop(), "fleet"),
+        (missing_ship_tile, "ship tiles"),
+        (foreign_ship_tile, "ship tiles"),
+        (stray_ship_tile, "ship tiles"),
+        (extra_obstacle, "obstacle count"),
+        (hit_tile, "tile already hit"),
+        (duplicate_ship, "duplicate ship"),
+        (lambda board: board.grid.pop(), "grid dimensions"),
+    ],
+)
+def test_malformed_board(malform: Callable[[models.Board], None], reason: str):
+    rng = random.Random(3)
+    for _ in range(20):
+        board = legal_board(rng)
+        malform(board)
+        with pytest.raises(BoardInvalid) as err:
+            board_check(board, NAVY)
+        assert str(err.value) == reason
+
+
+def test_unowned_skin():
+    board = legal_board(random.Random(4), "Pirate")
+    with pytest.raises(BoardInvalid) as err:
+        board_check(board, NAVY)
+    assert str(err.value) == "ship not owned"
+
+
+async def test_board_submit_answers_invalid_board():
+    async with battleship_server() as (_server, port):
+        client = await battleship_client(port)
+        player = await client.player_create(models.PlayerCreateArgs("player"))
+        created = await client.private_room_create(
+            models.BearingPlayerAuth.from_player(player)
+        )
+        rng = random.Random(5)
+        for malform in [overlap, out_of_bounds, wrong_variant, missing_ship_tile]:
+            board = legal_board(
+                rng,
+                player=models.PlayerId.from_player(player),
+                room=models.RoomId.from_room_info(created.room),
+            )
+            malform(board)
+            with pytest.raises(ResponseError) as err:
+                await client.board_submit(board)
+            assert err.value.method == "invalid_board"
+        unowned = legal_board(
+            rng,
+            "Scout",
+            models.PlayerId.from_player(player),
+            models.RoomId.from_room_info(created.room),
+        )
+        with pytest.raises(ResponseError) as err:
+            await client.board_submit(unowned)
+        assert (err.value.method, err.value.content) == (
+            "invalid_board",
+            b"ship not owned",
+        )
+        await client.disconnect()
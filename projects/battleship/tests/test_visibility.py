@@ -0,0 +1,149 @@
+import asyncio
+from uuid import uuid4
+
+from battleship.client.client import BattleshipClient
+from battleship.server import models as server_models
+from battleship.server.visibility import VisibilityIndex
+from battleship.shared import models, shot_type
+
+from support import battleship_server, ready_room, submit_boards
+
+BOARD = models.BoardId(uuid4())
+OTHER_BOARD = models.BoardId(uuid4())
+ALICE = models.PlayerId(uuid4())
+BOB = models.PlayerId(uuid4())
+
+
+def shot(col: int, row: int, board: models.BoardId = BOARD) -> models.ShotResult:
+    return models.ShotResult(
+        ALICE, board, True, [models.Reveal((col, row), models.EmptyTile(True))], []
+    )
+
+
+def seqs(results: list[models.ShotResult] | None) -> list[int] | None:
+    # results compare without their seq
+    return None if results is None else [result.seq for result in results]
+
+
+def tiles(index: VisibilityIndex, viewer: models.PlayerId, board=BOARD):
+    return set(index.views(viewer)[board].tiles.keys())
+
+
+def test_since_returns_what_the_viewer_was_sent():
+    index = VisibilityIndex()
+    index.record(shot(0, 0))
+    index.record(shot(1, 0), ALICE)
+    index.record(shot(2, 0), BOB)
+    index.record(shot(3, 0))
+    assert seqs(index.since(ALICE, 0)) == [1, 2, 4]
+    assert seqs(index.since(BOB, 0)) == [1, 3, 4]
+    assert seqs(index.since(BOB, 3)) == [4]
+    assert seqs(index.since(BOB, 4)) == []
+    assert index.since(BOB, 5) is None
+
+
+def test_views_fork_from_public_and_keep_following_it():
+    index = VisibilityIndex()
+    index.record(shot(0, 0))
+    index.record(shot(1, 0), ALICE)
+    index.record(shot(2, 0))
+    index.record(shot(3, 0, OTHER_BOARD))
+    assert tiles(index, ALICE) == {(0, 0), (1, 0), (2, 0)}
+    assert tiles(index, BOB) == {(0, 0), (2, 0)}
+    assert tiles(index, ALICE, OTHER_BOARD) == {(3, 0)}
+    # a viewer who was never sent anything of their own shares the public view
+    assert index.views(BOB) is index.public
+
+
+def test_since_across_the_log_limit():
+    index = VisibilityIndex()
+    for i in range(300):
+        index.record(shot(i % 8, i // 8 % 8), ALICE if i % 2 else None)
+    oldest = 300 - index.history
+    assert seqs(index.since(ALICE, oldest)) == list(range(oldest + 1, 301))
+    assert seqs(index.since(BOB, 298)) == [299]
+    assert index.since(ALICE, oldest - 1) is None
+    # the views still hold everything, whatever fell out of the log
+    assert len(tiles(index, ALICE)) == 64
+    assert len(tiles(index, BOB)) == 32
+
+
+def test_since_does_not_reach_back_past_a_reset():
+    index = VisibilityIndex()
+    for i in range(10):
+        index.record(shot(i, 0))
+    index.reset()
+    assert index.seq == index.base == 10
+    assert index.views(ALICE) == {}
+    assert seqs(index.since(ALICE, 10)) == []
+    assert index.since(ALICE, 5) is None
+    index.record(shot(0, 1), BOB)
+    assert seqs(index.since(BOB, 10)) == [11]
+    assert seqs(index.since(ALICE, 10)) == []
+
+
+def test_reset_after_the_log_filled():
+    index = VisibilityIndex()
+    for i in range(index.history + 44):
+        index.record(shot(0, 0))
+    index.reset()
+    for i in range(3):
+        index.record(shot(i, 0))
+    assert seqs(index.since(ALICE, index.base)) == [301, 302, 303]
+    assert index.since(ALICE, index.base - 1) is None
+    assert tiles(index, ALICE) == {(0, 0), (1, 0), (2, 0)}
+
+
+def test_to_shared():
+    index = VisibilityIndex()
+    index.record(shot(4, 5), ALICE)
+    view = index.views(ALICE)[BOARD].to_shared(BOARD, BOB)
+    assert view.board == BOARD and view.player == BOB
+    assert [reveal.loc for reveal in view.reveal] == [(4, 5)]
+
+
+async def test_game_view_route_serves_snapshots_and_deltas(monkeypatch):
+    monkeypatch.setattr(server_models, "TURN_TRANSITION_DELAY", 0.05)
+    async with battleship_server() as (_server, port):
+        clients, players, room = await ready_room(port, 3)
+        boards = await submit_boards(clients, players, room)
+        by_player = {
+            models.PlayerId.from_player(p): (c, b)
+            for p, c, b in zip(players, clients, boards)
+        }
+        start = (await clients[0].game_view_get(models.GameViewArgs(room, None))).seq
+
+        async def shoot(variant) -> tuple[BattleshipClient, models.BoardId]:
+            turn = await asyncio.wait_for(anext(clients[0].on_game_turn_start()), 1)
+            shooter, own = by_player[models.PlayerId.from_player_info(turn)]
+            target = next(b for b in boards if b is not own)
+            await shooter.shot_submit(
+                models.ShotSubmitArgs(
+                    room,
+                    models.Shot(
+                        models.ShotVariantId(variant.id),
+                        (0, 0),
+                        0,
+                        models.BoardId.from_board(target),
+                    ),
+                )
+            )
+            return shooter, models.BoardId.from_board(target)
+
+        scanner, scanned = await shoot(shot_type.SCAN)
+        shooter, _ = await shoot(shot_type.NORMAL_SHOT_VARIANT)
+        expected = {id(scanner): [False, True], id(shooter): [True, True]}
+        for client in clients:
+            delta = await client.game_view_get(models.GameViewArgs(room, start))
+            assert delta.boards is None
+            # the scan went to the scanner alone, the shot went to everyone
+            # with the ship ids that only the shooter gets in a second result
+            assert [r.hit for r in delta.shots] == expected.get(id(client), [True])
+            assert start < seqs(delta.shots)[0] and seqs(delta.shots)[-1] <= delta.seq
+            snapshot = await client.game_view_get(models.GameViewArgs(room, None))
+            assert snapshot.seq == delta.seq and snapshot.shots == []
+            view = next(v for v in snapshot.boards if v.board == scanned)
+            if client is scanner:
+                assert any(r.loc == (0, 0) for r in view.reveal)
+        for client in clients:
+            await client.disconnect()
@@ -0,0 +1,137 @@
+import asyncio
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy import select
+
+from battleship.server import db
+from battleship.server.write_behind import PlayerChanges, PlayerWriteBehind
+
+
+class FailingWriteBehind(PlayerWriteBehind):
+    # fails every write that includes one of the players in `failing`
+    failing: set[UUID]
+    writes: int
+
+    async def _write(self, batch: dict[UUID, PlayerChanges]):
+        self.writes += 1
+        if not self.failing.isdisjoint(batch):
+            raise RuntimeError("write failed")
+        await super()._write(batch)
+
+
+async def make_players(count: int):
+    session_maker = await db.create_session_maker("sqlite+aiosqlite://")
+    async with session_maker() as db_session:
+        players = [db.Player(name=f"player{i}") for i in range(count)]
+        db_session.add_all(players)
+        await db_session.commit()
+    return session_maker, [player.id for player in players]
+
+
+async def stored(session_maker, player: UUID) -> tuple[int, int, int]:
+    async with session_maker() as db_session:
+        row = (
+            await db_session.execute(
+                select(db.Player)
+                .where(db.Player.id == player)
+                .options(*db.PLAYER_LOAD_OPTIONS)
+            )
+        ).scalar_one()
+        return row.rating, row.coins, len(row.emotes)
+
+
+def failing_write_behind(session_maker, failing: set[UUID]) -> FailingWriteBehind:
+    write_behind = FailingWriteBehind(session_maker, flush_interval=60)
+    write_behind.failing = failing
+    write_behind.writes = 0
+    return write_behind
+
+
+async def test_changes_coalesce_into_one_write():
+    session_maker, (player,) = await make_players(1)
+    write_behind = failing_write_behind(session_maker, set())
+    before = await stored(session_maker, player)
+    write_behind.change(player, rating=10)
+    write_behind.change(player, rating=-3, coins=-100, emotes=[uuid4()])
+    await write_behind.close()
+    assert write_behind.writes == 1
+    assert await stored(session_maker, player) == (
+        before[0] + 7,
+        before[1] - 100,
+        before[2] + 1,
+    )
+
+
+async def test_failing_player_does_not_block_or_lose_changes():
+    session_maker, (good, bad) = await make_players(2)
+    write_behind = failing_write_behind(session_maker, {bad})
+    before = await stored(session_maker, good)
+    write_behind.change(good, rating=5)
+    write_behind.change(bad, coins=7)
+
+    for _ in range(10):
+        with pytest.raises(RuntimeError):
+            await write_behind.flush()
+    # the good player was written the first time, the bad one is still kept
+    assert await stored(session_maker, good) == (before[0] + 5, *before[1:])
+    assert write_behind.failures == 10
+    assert write_behind.pending[bad].coins == 7
+
+    # changes made meanwhile are merged into what is being retried
+    write_behind.change(bad, coins=1)
+    write_behind.failing.clear()
+    bad_before = await stored(session_maker, bad)
+    await write_behind.flush()
+    assert write_behind.failures == 0
+    assert not write_behind.pending
+    assert await stored(session_maker, bad) == (
+        bad_before[0],
+        bad_before[1] + 8,
+        bad_before[2],
+    )
+
+
+async def test_cancelled_flush_keeps_changes():
+    session_maker, (player,) = await make_players(1)
+    write_behind = failing_write_behind(session_maker, set())
+
+    async def blocked_write(_batch):
+        await asyncio.Event().wait()
+
+    write_behind._write = blocked_write  # pylint: disable=W0212
+    write_behind.change(player, coins=3)
+    flush = asyncio.create_task(write_behind.flush())
+    await asyncio.sleep(0)
+    write_behind.change(player, coins=4)
+    flush.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await flush
+    assert write_behind.pending[player].coins == 7
+    assert write_behind.failures == 0
+    write_behind.flush_task.cancel()
+
+
+async def test_background_retry_backs_off_until_written():
+    session_maker, (player,) = await make_players(1)
+    write_behind = failing_write_behind(session_maker, {player})
+    write_behind.flush_interval = 0.01
+    before = await stored(session_maker, player)
+    write_behind.change(player, coins=5)
+    await asyncio.sleep(0.2)
+    # 0.01, 0.01, 0.02, 0.04, 0.08 apart
+    assert 3 <= write_behind.failures <= 6
+    assert write_behind.retry_delay() == 0.01 * 2 ** (write_behind.failures - 1)
+    write_behind.failing.clear()
+    while write_behind.pending:
+        await asyncio.sleep(0.05)
+    assert await stored(session_maker, player) == (before[0], before[1] + 5, before[2])
+
+
+def test_retry_delay_is_capped():
+    write_behind = PlayerWriteBehind(None, flush_interval=0.5, max_retry_delay=4)
+    delays = []
+    for failures in range(8):
+        write_behind.failures = failures
+        delays.append(write_behind.retry_delay())
+    assert delays == [0.5, 0.5, 1, 2, 4, 4, 4, 4]